@@ -0,0 +1,15 @@
+import os
+
+# the benchmark never uses real credentials, but the settings require them
+for name in ('VK_TOKEN', 'GPT_API_KEY', 'GPT_MODEL', 'GOOGLE_KEY_FILE'):
+    os.environ.setdefault(name, 'benchmark')
+
+from .fake_servers import FakeVKServer, FakeOpenAIServer
+from .fake_managers import FakeGoogleTableManager
+# ------------------------------------------------------------------------
+
+__all__ = [
+    'FakeVKServer',
+    'FakeOpenAIServer',
+    'FakeGoogleTableManager',
+]
@@ -0,0 +1,106 @@
+"""This file contains drop-in stand-ins for the managers which can't be
+replaced by a local HTTP server"""
+import random
+import re
+from threading import Lock
+from time import sleep
+from constants import PARSE_SHEET, URL_COLUMN
+# --------------------------------------------------------------------------
+
+RANGE_PATTERN = re.compile(r'^[A-Z]+(\d+):[A-Z]+(\d+)$')
+
+
+class FakeGoogleTableManager:
+    """The FakeGoogleTableManager class has the same interface as
+    GoogleTableManager and keeps a synthetic sheet in memory. The sheet
+    contains VK group urls in different forms (club, public, screen names,
+    links to the posts) and the configured share of duplicates"""
+    def __init__(
+            self, rows: int, duplicate_rate: float = 0.1,
+            latency: float = 0.2, error_rate: float = 0.0,
+            seed: int = 0) -> None:
+        """Initialization of the FakeGoogleTableManager class
+        :param rows: the number of rows in the sheet
+        :param duplicate_rate: the share of rows referring to the groups
+        from the previous rows
+        :param latency: the average number of seconds to answer a request
+        :param error_rate: the probability of a write request to fail
+        :param seed: the seed of the random sheet generator
+        """
+        self._latency = latency
+        self._error_rate = error_rate
+        self._urls = self._create_urls(rows, duplicate_rate, seed)
+        self._lock = Lock()
+        self.written_rows: set[int] = set()
+        self.stats = {'reads': 0, 'writes': 0, 'failed_writes': 0}
+
+    @staticmethod
+    def _create_urls(
+            rows: int, duplicate_rate: float, seed: int) -> list[str]:
+        """This method creates the urls of the sheet
+        :param rows: the number of rows
+        :param duplicate_rate: the share of duplicate rows
+        :param seed: the seed of the random generator
+        :return: a list of urls
+        """
+        generator = random.Random(seed)
+        templates = (
+            'https://vk.com/club{0}', 'https://vk.com/public{0}',
+            'vk.com/group_{0}', 'https://m.vk.com/wall-{0}_1')
+        urls = []
+        for row in range(rows):
+            if urls and generator.random() < duplicate_rate:
+                number = generator.randint(1, row)
+            else:
+                number = row + 1
+            urls.append(generator.choice(templates).format(number))
+
+        return urls
+
+    def _wait(self) -> None:
+        """This method simulates the latency of Google Sheets API"""
+        sleep(self._latency * random.uniform(0.5, 1.5))
+
+    def get_row_count(self, sheet_name: str = PARSE_SHEET) -> int | None:
+        return len(self._urls)
+
+    def get_by_column(
+            self, sheet_name: str = PARSE_SHEET, col_num: int = URL_COLUMN
+    ) -> list[str] | None:
+        self._wait()
+        return list(self._urls)
+
+    def get_ranges(
+            self, ranges: list[str], sheet_name: str = PARSE_SHEET
+    ) -> list[list[list[str]]] | None:
+        """This method returns the urls for the first range and empty result
+        cells for the other ones"""
+        self._wait()
+        self.stats['reads'] += 1
+        first_row, last_row = map(int, RANGE_PATTERN.match(ranges[0]).groups())
+        urls = [[url] for url in self._urls[first_row - 1:last_row]]
+
+        return [urls] + [[] for _ in ranges[1:]]
+
+    def upload_to_sheet(
+            self, col_range: str, data: list[list],
+            sheet_name: str = PARSE_SHEET) -> None:
+        self.batch_upload_to_sheet([(col_range, data)], sheet_name)
+
+    def batch_upload_to_sheet(
+            self, data: list[tuple[str, list[list]]],
+            sheet_name: str = PARSE_SHEET) -> bool:
+        """This method records the numbers of the written rows"""
+        self._wait()
+        with self._lock:
+            self.stats['writes'] += 1
+            if random.random() < self._error_rate:
+                self.stats['failed_writes'] += 1
+                return False
+
+            for col_range, values in data:
+                first_row = int(RANGE_PATTERN.match(col_range).group(1))
+                self.written_rows.update(
+                    range(first_row, first_row + len(values)))
+
+        return True
@@ -0,0 +1,318 @@
+"""This file contains in-process stand-ins for VK API and OpenAI API. They
+are real HTTP servers so the managers of the application are benchmarked
+together with their sessions, batching, rate limiting and retries"""
+import asyncio
+import json
+import random
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from time import monotonic
+from aiohttp import web
+from constants import FIELDS_TO_TEMPLATES, SCORE_RANGE
+# --------------------------------------------------------------------------
+
+WORDS = (
+    'новости', 'музыка', 'игры', 'юмор', 'путешествия', 'спорт', 'книги',
+    'кино', 'бизнес', 'психология', 'наука', 'искусство', 'мода', 'еда')
+WALL_GET_PATTERN = re.compile(r'API\.wall\.get\((\{.*?\})\)')
+GROUP_ID_PATTERN = re.compile(r'ID группы: (\S+)')
+
+
+def create_text(words_count: int) -> str:
+    """This function creates a random text of the provided size
+    :param words_count: the number of words in the text
+    :return: string representing the text
+    """
+    return ' '.join(random.choices(WORDS, k=words_count))
+
+
+class FakeServer(ABC):
+    """The FakeServer class is a base of the local HTTP stand-ins. Every
+    request waits for the configured latency, may be rejected by the rate
+    limit of the server and may fail with the configured probability. The
+    rate limit is applied to each token or API key separately"""
+    def __init__(
+            self, latency: float = 0.05, error_rate: float = 0.0,
+            rate_limit: float | None = None) -> None:
+        """Initialization of the FakeServer class
+        :param latency: the average number of seconds to answer a request
+        (the actual latency is random from 0.5 to 1.5 of it)
+        :param error_rate: the probability of a request to fail
+        :param rate_limit: the maximum number of requests per second of each
+        token or key (None - not limited)
+        """
+        self._latency = latency
+        self._error_rate = error_rate
+        self._rate_limit = rate_limit
+        self._requests_times: dict[str, deque[float]] = defaultdict(deque)
+        self._runner: web.AppRunner | None = None
+        self.url = ''
+        self.stats = {'requests': 0, 'throttled': 0, 'failed': 0}
+
+    async def start(self) -> None:
+        """This method starts the server on a free local port"""
+        app = web.Application()
+        self._add_routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = self._create_url(f'http://127.0.0.1:{port}')
+
+    async def stop(self) -> None:
+        """This method stops the server"""
+        if self._runner:
+            await self._runner.cleanup()
+
+    @abstractmethod
+    def _add_routes(self, app: web.Application) -> None:
+        """This method adds the request handlers of the server
+        :param app: the aiohttp application of the server
+        """
+
+    def _create_url(self, base_url: str) -> str:
+        """This method creates the URL the managers have to use
+        :param base_url: the URL of the server with the port
+        :return: string representing the URL
+        """
+        return base_url
+
+    async def _simulate(self, key: str = '') -> str | None:
+        """This method waits for the latency and decides if the request
+        has to fail
+        :param key: the token or API key of the request
+        :return: 'throttled' or 'failed' if the request has to fail and None
+        otherwise
+        """
+        self.stats['requests'] += 1
+        now = monotonic()
+        if self._rate_limit:
+            requests_times = self._requests_times[key]
+            while requests_times and requests_times[0] <= now - 1:
+                requests_times.popleft()
+            if len(requests_times) >= self._rate_limit:
+                self.stats['throttled'] += 1
+                return 'throttled'
+            requests_times.append(now)
+
+        await asyncio.sleep(self._latency * random.uniform(0.5, 1.5))
+        if random.random() < self._error_rate:
+            self.stats['failed'] += 1
+            return 'failed'
+
+        return None
+
+
+class FakeVKServer(FakeServer):
+    """The FakeVKServer class answers groups.getById, wall.getById and
+    execute (with wall.get calls) methods of VK API. The screen names like
+    group_123 are resolved to the id 123"""
+    def __init__(
+            self, latency: float = 0.05, error_rate: float = 0.0,
+            rate_limit: float | None = 3, description_words: int = 50
+    ) -> None:
+        """Initialization of the FakeVKServer class
+        :param latency: the average number of seconds to answer a request
+        :param error_rate: the probability of a request to fail with the
+        internal server error (code 10)
+        :param rate_limit: the maximum number of requests per second, the
+        requests above it fail with the throttling error (code 6)
+        :param description_words: the number of words in the group
+        descriptions and posts
+        """
+        super().__init__(latency, error_rate, rate_limit)
+        self._description_words = description_words
+
+    def _add_routes(self, app: web.Application) -> None:
+        app.router.add_post('/method/{method}', self._handle)
+
+    def _create_url(self, base_url: str) -> str:
+        return f'{base_url}/method/'
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        """This method answers a VK API method
+        :param request: the request to the method
+        :return: the JSON response of VK API
+        """
+        params = await request.post()
+        error = await self._simulate(params.get('access_token', ''))
+        if error == 'throttled':
+            return self._error(6, 'Too many requests per second')
+        if error == 'failed':
+            return self._error(10, 'Internal server error')
+
+        handler = {
+            'groups.getById': self._get_groups,
+            'wall.getById': self._get_posts_by_ids,
+            'execute': self._execute,
+        }.get(request.match_info['method'])
+        if not handler:
+            return self._error(3, 'Unknown method passed')
+
+        return web.json_response({'response': handler(params)})
+
+    @staticmethod
+    def _error(code: int, message: str) -> web.Response:
+        """This method creates the response with VK API error
+        :param code: the VK API error code
+        :param message: the VK API error message
+        :return: the JSON response with the error
+        """
+        return web.json_response(
+            {'error': {'error_code': code, 'error_msg': message}})
+
+    def _get_groups(self, params) -> list[dict]:
+        """This method answers groups.getById method"""
+        fields = params.get('fields', '').split(',')
+        groups = []
+        for group_id in params.get('group_ids', '').split(','):
+            number = group_id.removeprefix('group_')
+            if not number.isdigit():
+                continue
+            group = {
+                'id': int(number),
+                'screen_name': group_id if group_id != number
+                else f'club{number}',
+                'name': f'Группа {number}',
+            }
+            if 'description' in fields:
+                group['description'] = create_text(self._description_words)
+            if 'status' in fields:
+                group['status'] = create_text(5)
+            if 'fixed_post' in fields and int(number) % 2:
+                group['fixed_post'] = 1
+            groups.append(group)
+
+        return groups
+
+    def _get_posts_by_ids(self, params) -> list[dict]:
+        """This method answers wall.getById method"""
+        return [
+            {'owner_id': int(post_id.split('_')[0]),
+             'text': create_text(self._description_words)}
+            for post_id in params.get('posts', '').split(',') if post_id]
+
+    def _execute(self, params) -> list[dict]:
+        """This method answers execute method with wall.get calls"""
+        return [
+            {'count': 1, 'items': [{
+                'owner_id': json.loads(values)['owner_id'],
+                'text': create_text(self._description_words)}]}
+            for values in WALL_GET_PATTERN.findall(params.get('code', ''))]
+
+
+class FakeOpenAIServer(FakeServer):
+    """The FakeOpenAIServer class answers the chat completion requests. The
+    answer is chosen by the request template so it passes the validation of
+    the application (batched, combined, tags or a single score request)"""
+    def _add_routes(self, app: web.Application) -> None:
+        app.router.add_post('/v1/chat/completions', self._handle)
+
+    def _create_url(self, base_url: str) -> str:
+        return f'{base_url}/v1'
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        """This method answers the chat completion request
+        :param request: the request with the messages
+        :return: the JSON response of OpenAI API
+        """
+        error = await self._simulate(request.headers.get('Authorization', ''))
+        if error == 'throttled':
+            return web.json_response(
+                {'error': {'message': 'Rate limit reached',
+                           'type': 'requests'}}, status=429,
+                headers={'Retry-After': '1'})
+        if error == 'failed':
+            return web.json_response(
+                {'error': {'message': 'The server had an error',
+                           'type': 'server_error'}}, status=500)
+
+        data = await request.json()
+        prompt = ''.join(message['content'] for message in data['messages'])
+        content = self._create_answer(data['messages'][-1]['content'])
+        if data.get('stream'):
+            return await self._stream_answer(request, data, content)
+
+        return web.json_response({
+            'id': 'chatcmpl-benchmark',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': data.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt) // 3,
+                      'completion_tokens': len(content) // 3,
+                      'total_tokens': (len(prompt) + len(content)) // 3},
+        })
+
+    @staticmethod
+    async def _stream_answer(
+            request: web.Request, data: dict, content: str
+    ) -> web.StreamResponse:
+        """This method sends the answer as server-sent events by a character
+        per chunk like the streamed chat completion of OpenAI API
+        :param request: the request with the messages
+        :param data: the parameters of the request
+        :param content: the answer to send
+        :return: the streamed response
+        """
+        response = web.StreamResponse(
+            headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        try:
+            for char in content:
+                chunk = {
+                    'id': 'chatcmpl-benchmark',
+                    'object': 'chat.completion.chunk',
+                    'created': 0,
+                    'model': data.get('model'),
+                    'choices': [{
+                        'index': 0, 'delta': {'content': char},
+                        'finish_reason': None}]}
+                await response.write(
+                    f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'
+                    .encode())
+            await response.write(b'data: [DONE]\n\n')
+            await response.write_eof()
+
+        except ConnectionResetError:
+            pass
+
+        return response
+
+    @staticmethod
+    def _create_scores() -> dict:
+        """This method creates a random valid answer for a single group
+        :return: a dictionary with the scores and the tags
+        """
+        scores = {field: random.choice(SCORE_RANGE)
+                  for field in FIELDS_TO_TEMPLATES}
+        scores['tags'] = random.sample(WORDS, 2)
+
+        return scores
+
+    def _create_answer(self, request: str) -> str:
+        """This method creates the answer to the request
+        :param request: the text of the request
+        :return: string representing the answer of GPT chat
+        """
+        group_ids = GROUP_ID_PATTERN.findall(request)
+        if group_ids:
+            return json.dumps(
+                {group_id: self._create_scores() for group_id in group_ids},
+                ensure_ascii=False)
+
+        if any(field in request for field in FIELDS_TO_TEMPLATES):
+            return json.dumps(self._create_scores(), ensure_ascii=False)
+
+        if 'Список пабликов' in request:
+            return json.dumps(
+                [random.sample(WORDS, 2)
+                 for _ in range(request.count('Название группы:'))],
+                ensure_ascii=False)
+
+        return str(random.choice(SCORE_RANGE))
@@ -0,0 +1,291 @@
+"""This file runs the whole parsing pipeline against the local stand-ins of
+VK API, OpenAI API and Google Sheets and reports its throughput, the
+latencies of the stages and the peak memory. Run it from the project root:
+
+    python -m benchmarks.run_benchmark --rows 10000 --json result.json
+
+The result can be compared with a saved one to catch regressions:
+
+    python -m benchmarks.run_benchmark --rows 10000 --compare result.json
+"""
+import json
+import logging
+import sys
+import tracemalloc
+from os import path
+from tempfile import TemporaryDirectory
+from argparse import ArgumentParser, Namespace
+from asyncio import run
+from functools import wraps
+from inspect import iscoroutinefunction
+from resource import getrusage, RUSAGE_SELF
+from statistics import quantiles
+from time import perf_counter
+from benchmarks import FakeVKServer, FakeOpenAIServer, FakeGoogleTableManager
+from container import (
+    create_controller, create_vk_batch_limit, create_sheet_batch_limit)
+from controllers import VkGroupParseController
+from managers import (
+    AsyncVKGroupManager, ChatGPTManager, VKRateLimiter, CredentialPool)
+from metrics import metrics
+import main
+# --------------------------------------------------------------------------
+
+STAGES = {
+    'resolve': 'resolve_group_ids',
+    'vk': 'get_groups_by_ids',
+    'gpt': 'enrich_changed_groups',
+    'sheet': 'send_groups_to_google_table',
+}
+
+
+class StageTimer:
+    """The StageTimer class measures the duration of each call of the
+    controller methods representing the pipeline stages"""
+    def __init__(self) -> None:
+        """Initialization of the StageTimer class"""
+        self.durations: dict[str, list[float]] = {
+            stage: [] for stage in STAGES}
+
+    def instrument(self, controller: VkGroupParseController) -> None:
+        """This method replaces the stage methods of the controller instance
+        with the timed wrappers
+        :param controller: an instance of VkGroupParseController
+        """
+        for stage, name in STAGES.items():
+            setattr(controller, name, self._wrap(
+                getattr(controller, name), self.durations[stage]))
+
+    @staticmethod
+    def _wrap(method, durations: list[float]):
+        """This method creates a wrapper recording the duration of the calls
+        :param method: the bound method to wrap
+        :param durations: the list to add the durations to
+        :return: the wrapper of the method
+        """
+        if iscoroutinefunction(method):
+            @wraps(method)
+            async def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    durations.append(perf_counter() - start)
+        else:
+            @wraps(method)
+            def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    durations.append(perf_counter() - start)
+
+        return wrapper
+
+    def get_report(self) -> dict[str, dict]:
+        """This method returns the statistics of the stages
+        :return: a dictionary with stage names as keys and dictionaries with
+        the number of calls, p50 and p95 durations in seconds as values
+        """
+        report = {}
+        for stage, durations in self.durations.items():
+            if len(durations) > 1:
+                percentiles = quantiles(durations, n=100, method='inclusive')
+                p50, p95 = percentiles[49], percentiles[94]
+            else:
+                p50 = p95 = durations[0] if durations else 0.0
+            report[stage] = {
+                'calls': len(durations), 'p50': round(p50, 4),
+                'p95': round(p95, 4)}
+
+        return report
+
+
+def parse_args(args: list[str] = None) -> Namespace:
+    """This function parses the command line arguments
+    :param args: a list of arguments (sys.argv by default)
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument(
+        '--vk-tokens', type=int, default=1,
+        help='the number of VK tokens, the rate limit applies to each one')
+    parser.add_argument('--vk-latency', type=float, default=0.05)
+    parser.add_argument('--vk-error-rate', type=float, default=0.0)
+    parser.add_argument(
+        '--vk-rate-limit', type=float, default=100,
+        help='requests per second of a token accepted by the VK stand-in')
+    parser.add_argument(
+        '--vk-client-rate', type=float, default=None,
+        help='requests per second of the client rate limiter of a token '
+             '(the stand-in limit by default)')
+    parser.add_argument(
+        '--gpt-keys', type=int, default=1,
+        help='the number of OpenAI keys, the rate limit applies to each one')
+    parser.add_argument('--gpt-latency', type=float, default=0.5)
+    parser.add_argument('--gpt-error-rate', type=float, default=0.0)
+    parser.add_argument(
+        '--gpt-rate-limit', type=float, default=None,
+        help='requests per second of a key accepted by the OpenAI stand-in')
+    parser.add_argument('--sheet-latency', type=float, default=0.2)
+    parser.add_argument('--sheet-error-rate', type=float, default=0.0)
+    parser.add_argument('--no-dedup', action='store_true')
+    parser.add_argument(
+        '--no-adaptive', action='store_true',
+        help='keep the batch sizes and the concurrency fixed')
+    parser.add_argument(
+        '--sink', choices=('sheet', 'jsonl', 'csv', 'parquet'),
+        default='sheet',
+        help='the output of the enriched groups (the files are written to a '
+             'temporary directory)')
+    parser.add_argument(
+        '--trace-memory', action='store_true',
+        help='measure the peak of Python allocations by tracemalloc (slows '
+             'the pipeline down)')
+    parser.add_argument(
+        '--verbose', action='store_true',
+        help='show the log of the pipeline')
+    parser.add_argument('--json', help='the file to save the result to')
+    parser.add_argument(
+        '--compare', help='the file with a previous result to compare with')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help='the allowed relative drop of the throughput')
+
+    return parser.parse_args(args)
+
+
+async def run_benchmark(args: Namespace) -> dict:
+    """This function runs the pipeline against the stand-ins
+    :param args: the parsed command line arguments
+    :return: a dictionary with the result of the benchmark
+    """
+    vk_server = FakeVKServer(
+        args.vk_latency, args.vk_error_rate, args.vk_rate_limit)
+    gpt_server = FakeOpenAIServer(
+        args.gpt_latency, args.gpt_error_rate, args.gpt_rate_limit)
+    await vk_server.start()
+    await gpt_server.start()
+
+    table_manager = FakeGoogleTableManager(
+        args.rows, args.duplicate_rate, args.sheet_latency,
+        args.sheet_error_rate)
+    vk_tokens = CredentialPool(
+        'vk', [f'benchmark-{num}' for num in range(args.vk_tokens)],
+        lambda name: VKRateLimiter(
+            max_rate=args.vk_client_rate or args.vk_rate_limit, name=name))
+    gpt_keys = CredentialPool(
+        'openai', [f'benchmark-{num}' for num in range(args.gpt_keys)])
+    vk_manager = AsyncVKGroupManager(vk_tokens, api_url=vk_server.url)
+    gpt_manager = ChatGPTManager(
+        gpt_keys, 'gpt-3.5-turbo', api_url=gpt_server.url)
+    output_dir = TemporaryDirectory()
+    controller = create_controller(
+        vk_manager, table_manager, gpt_manager, checkpoint_file=None,
+        snapshot_file=None, deduplicate=not args.no_dedup,
+        output_sink=args.sink,
+        output_file=path.join(output_dir.name, 'groups'),
+        adaptive=not args.no_adaptive)
+    timer = StageTimer()
+    timer.instrument(controller)
+
+    start = perf_counter()
+    try:
+        await main.main(
+            controller, vk_manager, metrics_file=None, metrics_port=None,
+            vk_batch_limit=create_vk_batch_limit(not args.no_adaptive),
+            sheet_batch_limit=create_sheet_batch_limit(not args.no_adaptive))
+    finally:
+        elapsed = perf_counter() - start
+        await vk_server.stop()
+        await gpt_server.stop()
+        output_dir.cleanup()
+
+    if args.sink == 'sheet':
+        written = len(table_manager.written_rows)
+    else:
+        written = int(metrics.to_dict()['counters'].get(
+            'pipeline_rows_total{stage=sink}', 0))
+    return {
+        'rows': args.rows,
+        'written_rows': written,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(written / elapsed, 2),
+        'stages': timer.get_report(),
+        'vk_server': vk_server.stats,
+        'gpt_server': gpt_server.stats,
+        'sheet': table_manager.stats,
+        'metrics': metrics.to_dict(),
+    }
+
+
+def print_report(result: dict) -> None:
+    """This function prints the result of the benchmark
+    :param result: a dictionary with the result of the benchmark
+    """
+    print(f"Rows written: {result['written_rows']} of {result['rows']} in "
+          f"{result['seconds']} s ({result['rows_per_second']} rows/s)")
+    print(f"Peak memory: {result['peak_rss_mb']} MB RSS" + (
+        f", {result['peak_traced_mb']} MB traced"
+        if 'peak_traced_mb' in result else ''))
+    for stage, stats in result['stages'].items():
+        print(f"  {stage:<6} calls={stats['calls']:<6} "
+              f"p50={stats['p50']:.4f}s p95={stats['p95']:.4f}s")
+    for name in ('vk_server', 'gpt_server', 'sheet'):
+        print(f'  {name}: {result[name]}')
+
+
+def compare_results(result: dict, baseline: dict, tolerance: float) -> bool:
+    """This function checks the throughput has not dropped compared with
+    the baseline result
+    :param result: a dictionary with the result of the benchmark
+    :param baseline: a dictionary with the previous result
+    :param tolerance: the allowed relative drop of the throughput
+    :return: True if there is no regression and False otherwise
+    """
+    expected = baseline['rows_per_second'] * (1 - tolerance)
+    is_ok = (result['rows_per_second'] >= expected and
+             result['written_rows'] >= baseline['written_rows'])
+    print(f"Baseline: {baseline['rows_per_second']} rows/s, now: "
+          f"{result['rows_per_second']} rows/s - "
+          f"{'OK' if is_ok else 'REGRESSION'}")
+
+    return is_ok
+
+
+def main_benchmark(args: list[str] = None) -> int:
+    """This is a main function to run the benchmark
+    :param args: a list of command line arguments (sys.argv by default)
+    :return: the exit code
+    """
+    args = parse_args(args)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.CRITICAL,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.trace_memory:
+        tracemalloc.start()
+
+    result = run(run_benchmark(args))
+    result['peak_rss_mb'] = round(getrusage(RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if args.trace_memory:
+        result['peak_traced_mb'] = round(
+            tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            if not compare_results(result, json.load(file), args.tolerance):
+                return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_benchmark())
@@ -1,11 +1,14 @@
 """This file contains the Group classes serves as models to store, process
 and validate data"""
+from dataclasses import dataclass, fields
 from pydantic import BaseModel
 # --------------------------------------------------------------------------
 
 
-class Group(BaseModel):
-    """This class represents a VK group"""
+class GroupModel(BaseModel):
+    """This class represents a validated VK group. It's used only at the
+    boundaries of the pipeline (the data received from VK API and the data
+    sent to Google sheet)"""
     column_num: int | None = None
     id: str = ''
     name: str = ''
@@ -19,3 +22,49 @@ class Group(BaseModel):
 
     class Config:
         validate_assignment = True
+
+
+@dataclass(slots=True)
+class Group:
+    """This class represents a VK group inside the pipeline. It has no
+    per-instance dictionary and doesn't validate the assignments, call the
+    validate method to check the data against GroupModel"""
+    column_num: int | None = None
+    id: str = ''
+    name: str = ''
+    description: str = ''
+    fixed_post: str = ''
+    status: str = ''
+    tags: str = ''
+    user_solvency: int | None = None
+    user_progression: int | None = None
+    user_self_education: int | None = None
+
+    def dict(self, exclude: set[str] | None = None) -> dict:
+        """This method returns the group data as a dictionary
+        :param exclude: a set of field names to leave out
+        :return: a dictionary with field names as keys
+        """
+        exclude = exclude or set()
+        return {field: getattr(self, field) for field in self.__slots__
+                if field not in exclude}
+
+    def update(self, data: dict) -> None:
+        """This method sets the group fields from the provided dictionary,
+        the keys that aren't group fields are skipped
+        :param data: a dictionary with field names as keys
+        """
+        for key, value in data.items():
+            if key in GROUP_FIELDS:
+                setattr(self, key, value)
+
+    def validate(self) -> None:
+        """This method validates the group data by GroupModel and replaces
+        the fields by their coerced values (for instance, int id from VK API
+        turns into str)
+        :raises pydantic.ValidationError: if the data is invalid
+        """
+        self.update(GroupModel(**self.dict()).dict())
+
+
+GROUP_FIELDS = frozenset(field.name for field in fields(Group))
@@ -6,7 +6,9 @@ from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     VK_TOKEN: str
+    VK_TOKENS: list[str] = []
     GPT_API_KEY: str
+    GPT_API_KEYS: list[str] = []
     GPT_MODEL: str
     GOOGLE_KEY_FILE: str
 
@@ -18,26 +20,132 @@ env_sets = Settings()
 
 GOOGLE_AUTH_FILE = path.join('auth_data', env_sets.GOOGLE_KEY_FILE)
 VK_TOKEN = env_sets.VK_TOKEN
+VK_TOKENS = env_sets.VK_TOKENS or [VK_TOKEN]
 
 TABLE_NAME = 'vk parser'
 URL_COLUMN = 2
 PARSE_SHEET = 'вся база'
 MAX_GROUPS_PER_REQUEST = 100
 MAX_POST_PER_REQUEST = 50
+POST_TEXT_LIMIT = 500
 MAX_GROUPS_TO_SEND = 10
+SHEET_FLUSH_INTERVAL = 30
+VK_WORKERS = 2
+GPT_WORKERS = 10
+PIPELINE_QUEUE_SIZE = 10
+
+ADAPTIVE_TUNING = True
+ADAPTIVE_WINDOW = 20
+ADAPTIVE_DECREASE_FACTOR = 0.75
+ADAPTIVE_THROUGHPUT_TOLERANCE = 0.05
+ADAPTIVE_MIN_VK_BATCH = 10
+ADAPTIVE_VK_TARGET_LATENCY = 10
+ADAPTIVE_MIN_GPT_CONCURRENCY = 1
+ADAPTIVE_MAX_GPT_CONCURRENCY = 50
+ADAPTIVE_GPT_TARGET_LATENCY = 30
+ADAPTIVE_MIN_GROUPS_TO_SEND = 10
+ADAPTIVE_MAX_GROUPS_TO_SEND = 500
+ADAPTIVE_SHEET_TARGET_LATENCY = 10
+
+LOG_LEVEL = 'INFO'
+METRICS_FILE = 'metrics.json'
+METRICS_INTERVAL = 10
+METRICS_PORT = None
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
 DATA_COLUMNS_TEMPLATE = 'Q{0}:S{1}'
 UPLOAD_FIELDS = ('status', 'description', 'fixed_post', 'tags')
 
+OUTPUT_SINK = 'sheet'
+OUTPUT_FILE = 'enriched_groups'
+SINK_BUFFER_SIZE = 1000
+SINK_FILE_BUFFERING = 1024 * 1024
+PARQUET_ROW_GROUP_SIZE = 10000
+
+INPUT_SOURCE = 'sheet'
+INPUT_FILE = 'groups.csv'
+JSONL_URL_FIELD = 'url'
+
 PARSE_OFFSET = 0
 PARSE_LIMIT = None
+SHEET_PAGE_SIZE = 1000
+DEDUPLICATE_GROUPS = True
+
+USE_GROUP_SNAPSHOTS = True
+SNAPSHOT_FILE = 'group_snapshots.sqlite3'
+SNAPSHOT_TTL = 7 * 24 * 60 * 60
+
+USE_NEAR_DUPLICATES = True
+NEAR_DUPLICATE_THRESHOLD = 0.8
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 16
+MINHASH_SHINGLE_SIZE = 5
+MINHASH_MIN_SHINGLES = 20
+
+USE_LOCAL_CLASSIFIER = False
+CLASSIFIER_FEATURES = 2 ** 16
+CLASSIFIER_NGRAMS = (3, 4)
+CLASSIFIER_MIN_SAMPLES = 200
+CLASSIFIER_MIN_CONFIDENCE = 0.9
+CLASSIFIER_MIN_PRECISION = 0.9
+CLASSIFIER_TAG_MIN_PROBABILITY = 0.2
+
+RESUME_MODE = False
+CHECKPOINT_FILE = 'checkpoint.json'
+RESULT_COLUMNS = DATA_COLUMNS_TEMPLATE.format('', '')
 
 GET_POST_ATTEMPTS = 2
+VK_EXECUTE_LIMIT = 25
 GET_POST_TEXT = False
 
+USE_ASYNC_VK_CLIENT = True
+VK_API_URL = 'https://api.vk.com/method/'
+VK_API_VERSION = '5.131'
+VK_CONNECTION_LIMIT = 10
+VK_KEEPALIVE_TIMEOUT = 30
+VK_REQUEST_TIMEOUT = 30
+
+VK_REQUESTS_PER_SECOND = 3
+VK_MIN_REQUESTS_PER_SECOND = 0.2
+VK_RATE_BACKOFF_FACTOR = 0.5
+VK_RATE_RECOVERY_STEP = 0.05
+VK_MAX_ATTEMPTS = 5
+VK_RETRY_BASE_DELAY = 0.5
+VK_RETRY_MAX_DELAY = 30
+VK_THROTTLE_ERROR_CODES = (6, 9, 29)
+VK_TRANSIENT_ERROR_CODES = (1, 10)
+VK_INVALID_TOKEN_ERROR_CODES = (5,)
+
 GPT_API_KEY = env_sets.GPT_API_KEY
+GPT_API_KEYS = env_sets.GPT_API_KEYS or [GPT_API_KEY]
 GPT_MODEL = env_sets.GPT_MODEL
-GPT_GROUPS_LIMIT = 1
+GPT_GROUPS_LIMIT = 2
 MAX_GPT_ATTEMPTS = 10
+GPT_REQUEST_ATTEMPTS = 6
+GPT_RETRY_BASE_DELAY = 1
+GPT_RETRY_MAX_DELAY = 60
+GPT_REQUEST_TIMEOUT = 60
+GPT_GROUP_DEADLINE = 300
+GPT_BREAKER_THRESHOLD = 5
+GPT_BREAKER_RECOVERY_TIME = 5
+GPT_BREAKER_MAX_RECOVERY_TIME = 120
+GPT_SCORE_MAX_TOKENS = 3
+GPT_SCORE_TEMPERATURE = 0
+GPT_SCORE_LOGIT_BIAS = {}
+GPT_SCORE_STREAM = True
+GPT_CONCURRENCY_LIMIT = 10
+GPT_COMBINED_REQUEST = True
+GPT_COMBINED_WITH_TAGS = False
+SCORE_RANGE = range(-3, 4)
+
+USE_GPT_CACHE = True
+GPT_CACHE_FILE = 'gpt_cache.sqlite3'
+GPT_CACHE_TTL = 30 * 24 * 60 * 60
+GPT_CACHE_MAX_ENTRIES = 100000
+
+GPT_GROUP_TOKEN_BUDGET = 400
+CHARS_PER_TOKEN = 4
+NON_ASCII_CHARS_PER_TOKEN = 2
+PROMPT_CACHE_SIZE = 10000
 
 
 SYSTEM_ROLE = {
@@ -45,18 +153,7 @@ SYSTEM_ROLE = {
     'content': 'Ты - эксперт по социальным сетям и SMM'
 }
 
-GPT_REQUEST_TEMPLATE = '''Ты - эксперт по социальным сетям и SMM.
-Тебе необходимо классифицировать группы в социальной сети по их тематике.
-Для анализа у тебя есть следующие данные:
- - Название группы
- - Описание группы
- - Текст закрепленного поста
- - Статус группы (слоган)
-
-Некоторые данные могут отсутствовать.
-Для анализа ты можешь использовать только эти теги:
-
-мемы,инфлюенсер,юмор,развлечения,животные,новости,музыка,игры,психология,
+GPT_TAGS_VOCABULARY = '''мемы,инфлюенсер,юмор,развлечения,животные,новости,музыка,игры,психология,
 социальные сети,позитив,сообщество,творчество,цитаты,искусство,история,комиксы,
 аниме,блогер,кулинария,мода,женщины,жизнь,чп,информация,кино,красота,любовь,
 мотивация,отношения,поздравления,путешествия,рецепты,спорт,фотография,коты,
@@ -86,7 +183,20 @@ GPT_REQUEST_TEMPLATE = '''Ты - эксперт по социальным сет
 энергетика,рыбалка,гоночные автомобили,иностранные языки,шопинг,алкоголь,
 анимация,поэзия,разработка игр,социология,учебники,феминизм,права людей,
 профессиональное развитие,чтение,духовное развитие
+'''
+
+GPT_REQUEST_TEMPLATE = '''Ты - эксперт по социальным сетям и SMM.
+Тебе необходимо классифицировать группы в социальной сети по их тематике.
+Для анализа у тебя есть следующие данные:
+ - Название группы
+ - Описание группы
+ - Текст закрепленного поста
+ - Статус группы (слоган)
+
+Некоторые данные могут отсутствовать.
+Для анализа ты можешь использовать только эти теги:
 
+''' + GPT_TAGS_VOCABULARY + '''
 Для каждой группы нужно подобрать от 1 до 3 самых подходящих тега из списка выше
 Список пабликов:
 {0}
@@ -161,6 +271,68 @@ GPT_SELF_EDUCATION_TEMPLATE = '''
 твой ответ (строго только число):
 '''
 
+GPT_COMBINED_TEMPLATE = '''
+мы нашли в социальной сети комьюнити со следующими характеристиками:
+
+{0}
+===
+
+сделай предположения об участниках этого комьюнити по шкалам от -3 до 3, где
+0 – нет никаких оснований что аудитория этого паблика отличается от аудитории
+всей соцсети и страны в целом, то есть подписаны могут быть любые люди:
+
+user_solvency – платежеспособность: -3 – участники не имеют свободных денег и
+на всем экономят, 3 – у тебя сильные предположения, что аудитория
+платежеспособна и сама богата, а не просто смотрит за богачами
+user_progression – прогрессивность: -3 – участники избегают перемен и против
+новых идей, предпочитая известное и традиционное, 3 – аудитория открыта и
+гибка, умеет учиться и адаптироваться к изменениям
+user_self_education – склонность к самообразованию: -3 – участникам
+неинтересно узнавать что-то новое, 3 – аудитории интересно развитие, она
+читает книги и статьи, стремится к личностному росту
+{1}
+формат ответа: строго только JSON-объект с ключами {2}, значения оценок -
+целые числа от -3 до 3
+'''
+
+GPT_COMBINED_TAGS_TEMPLATE = '''tags – от 1 до 3 самых подходящих тегов в виде
+JSON-списка строк на русском языке, теги можно брать только из этого списка:
+''' + GPT_TAGS_VOCABULARY
+
+GPT_BATCH_TEMPLATE = '''
+мы нашли в социальной сети несколько комьюнити со следующими
+характеристиками:
+
+{0}
+===
+
+для каждого комьюнити сделай предположения о его участниках по шкалам от -3
+до 3, где 0 – нет никаких оснований что аудитория этого паблика отличается от
+аудитории всей соцсети и страны в целом, то есть подписаны могут быть любые
+люди:
+
+user_solvency – платежеспособность: -3 – участники не имеют свободных денег и
+на всем экономят, 3 – у тебя сильные предположения, что аудитория
+платежеспособна и сама богата, а не просто смотрит за богачами
+user_progression – прогрессивность: -3 – участники избегают перемен и против
+новых идей, предпочитая известное и традиционное, 3 – аудитория открыта и
+гибка, умеет учиться и адаптироваться к изменениям
+user_self_education – склонность к самообразованию: -3 – участникам
+неинтересно узнавать что-то новое, 3 – аудитории интересно развитие, она
+читает книги и статьи, стремится к личностному росту
+{1}
+формат ответа: строго только JSON-объект, ключи которого - ID групп из списка
+выше, а значения - JSON-объекты с ключами {2}, значения оценок - целые числа
+от -3 до 3
+'''
+
+GROUP_BATCH_DATA_TEMPLATE = '''
+ID группы: {1}
+Название группы: {2}
+Описание группы: {3}
+Статус группы: {4}
+'''
+
 GROUP_DATA_TEMPLATE = '''
 Название группы: {1}
 Описание группы: {2}
@@ -174,3 +346,5 @@ FIELDS_TO_TEMPLATES = {
 }
 
 VK_GROUP_FIELDS = ['name', 'description', 'status']
+GROUP_BATCH_FIELDS = ['id', *VK_GROUP_FIELDS]
+SNAPSHOT_FIELDS = [*VK_GROUP_FIELDS, 'fixed_post']
@@ -1,18 +1,234 @@
-"""The file serves to store class instances used in the application"""
-from managers import VKGroupManager, GoogleTableManager, ChatGPTManager
-from services import VKGroupService, GPTChatVKGroupService, GoogleTableService
+"""The file serves to create class instances used in the application. The
+managers working with the external services are created by create_managers
+and the rest of the application is wired around them by create_controller,
+so the managers can be replaced (for instance by the benchmark stand-ins)"""
+from managers import (
+    VKGroupManager, AsyncVKGroupManager, GoogleTableManager, ChatGPTManager,
+    GPTCacheManager, VKRateLimiter, CheckpointManager, GroupSnapshotManager,
+    GroupSimilarityManager, RetryPolicy, CircuitBreaker, CredentialPool,
+    AdaptiveLimit)
+from services import (
+    VKGroupService, GPTChatVKGroupService, GoogleTableService,
+    CheckpointService, GroupDedupService, GroupSnapshotService,
+    GroupClassifierService, GroupSimilarityService, PromptService)
 from controllers import VkGroupParseController
+from sinks import GroupSink, JSONLGroupSink, CSVGroupSink, ParquetGroupSink
+from sources import (
+    GroupSource, SheetGroupSource, TextGroupSource, CSVGroupSource,
+    JSONLGroupSource)
 from constants import (
-    TABLE_NAME, VK_TOKEN, GOOGLE_AUTH_FILE, GPT_API_KEY, GPT_MODEL)
+    TABLE_NAME, VK_TOKENS, GOOGLE_AUTH_FILE, GPT_API_KEYS, GPT_MODEL,
+    USE_GPT_CACHE, GPT_CACHE_FILE, USE_ASYNC_VK_CLIENT, RESUME_MODE,
+    CHECKPOINT_FILE, DEDUPLICATE_GROUPS, USE_GROUP_SNAPSHOTS, SNAPSHOT_FILE,
+    USE_LOCAL_CLASSIFIER, USE_NEAR_DUPLICATES, OUTPUT_SINK, OUTPUT_FILE,
+    INPUT_SOURCE, INPUT_FILE, ADAPTIVE_TUNING, MAX_GROUPS_PER_REQUEST,
+    ADAPTIVE_MIN_VK_BATCH, ADAPTIVE_VK_TARGET_LATENCY, GPT_CONCURRENCY_LIMIT,
+    ADAPTIVE_MIN_GPT_CONCURRENCY, ADAPTIVE_MAX_GPT_CONCURRENCY,
+    ADAPTIVE_GPT_TARGET_LATENCY, MAX_GROUPS_TO_SEND,
+    ADAPTIVE_MIN_GROUPS_TO_SEND, ADAPTIVE_MAX_GROUPS_TO_SEND,
+    ADAPTIVE_SHEET_TARGET_LATENCY)
 # --------------------------------------------------------------------------
 
-vk_manager = VKGroupManager(VK_TOKEN)
-google_table_manager = GoogleTableManager(GOOGLE_AUTH_FILE, TABLE_NAME)
-chat_gpt_manager = ChatGPTManager(GPT_API_KEY, GPT_MODEL)
 
-vk_group_service = VKGroupService(vk_manager)
-gpt_group_service = GPTChatVKGroupService(chat_gpt_manager)
-google_table_service = GoogleTableService(google_table_manager)
+def create_managers() -> tuple[
+        VKGroupManager | AsyncVKGroupManager, GoogleTableManager,
+        ChatGPTManager, GPTCacheManager | None]:
+    """This function creates the managers working with VK API, Google sheets
+    and OpenAI API
+    :return: a tuple with VK manager, Google table manager, GPT chat manager
+    and GPT cache manager (None if the cache is turned off)
+    """
+    vk_tokens = CredentialPool('vk', VK_TOKENS, VKRateLimiter)
+    if USE_ASYNC_VK_CLIENT:
+        vk_manager = AsyncVKGroupManager(vk_tokens)
+    else:
+        vk_manager = VKGroupManager(vk_tokens)
+    google_table_manager = GoogleTableManager(GOOGLE_AUTH_FILE, TABLE_NAME)
+    gpt_cache_manager = (
+        GPTCacheManager(GPT_CACHE_FILE) if USE_GPT_CACHE else None)
+    chat_gpt_manager = ChatGPTManager(
+        CredentialPool('openai', GPT_API_KEYS), GPT_MODEL,
+        cache=gpt_cache_manager,
+        retry_policy=RetryPolicy(), circuit_breaker=CircuitBreaker('openai'))
 
-vk_group_parse_controller = VkGroupParseController(
-    vk_group_service, google_table_service, gpt_group_service)
+    return (
+        vk_manager, google_table_manager, chat_gpt_manager, gpt_cache_manager)
+
+
+def create_controller(
+        vk_manager: VKGroupManager | AsyncVKGroupManager,
+        google_table_manager: GoogleTableManager,
+        chat_gpt_manager: ChatGPTManager,
+        checkpoint_file: str | None = (
+            CHECKPOINT_FILE if RESUME_MODE else None),
+        snapshot_file: str | None = (
+            SNAPSHOT_FILE if USE_GROUP_SNAPSHOTS else None),
+        deduplicate: bool = DEDUPLICATE_GROUPS,
+        use_classifier: bool = USE_LOCAL_CLASSIFIER,
+        use_near_duplicates: bool = USE_NEAR_DUPLICATES,
+        output_sink: str = OUTPUT_SINK,
+        output_file: str = OUTPUT_FILE,
+        input_source: str = INPUT_SOURCE,
+        input_file: str = INPUT_FILE,
+        adaptive: bool = ADAPTIVE_TUNING
+) -> VkGroupParseController:
+    """This function creates the services and the controller working with
+    the provided managers
+    :param vk_manager: an instance of VKGroupManager or AsyncVKGroupManager
+    :param google_table_manager: an instance of GoogleTableManager
+    :param chat_gpt_manager: an instance of ChatGPTManager
+    :param checkpoint_file: the checkpoint file to resume the parsing from
+    (None - the parsing is not resumed)
+    :param snapshot_file: the SQLite file to store the group snapshots in
+    (None - the snapshots are not used)
+    :param deduplicate: whether to parse each VK group once
+    :param use_classifier: whether to enrich the obvious groups by the local
+    classifier trained on the stored GPT enrichment (it needs the snapshots)
+    :param use_near_duplicates: whether to reuse the enrichment across the
+    near-duplicate groups (the index is kept in the snapshot file)
+    :param output_sink: the output the enriched groups are written to:
+    'sheet', 'jsonl', 'csv' or 'parquet'
+    :param output_file: the path to the output file of the sink without the
+    extension
+    :param input_source: the input the VK group URLs are read from: 'sheet',
+    'text', 'csv' or 'jsonl'
+    :param input_file: the path to the input file of the source
+    :param adaptive: whether to tune the GPT chat concurrency at runtime
+    :return: an instance of VkGroupParseController
+    """
+    table_service = GoogleTableService(google_table_manager)
+    source = create_source(input_source, input_file, table_service)
+    checkpoint_service = (
+        CheckpointService(CheckpointManager(checkpoint_file), source.key)
+        if checkpoint_file else None)
+    group_snapshot_service = (
+        GroupSnapshotService(GroupSnapshotManager(snapshot_file))
+        if snapshot_file else None)
+    group_classifier_service = None
+    if use_classifier and group_snapshot_service:
+        group_classifier_service = GroupClassifierService()
+        group_classifier_service.train(
+            (data, enrichment) for _, data, enrichment
+            in group_snapshot_service.iter_enriched_groups())
+    group_similarity_service = None
+    if use_near_duplicates and group_snapshot_service:
+        group_similarity_service = GroupSimilarityService(
+            GroupSimilarityManager(snapshot_file))
+        group_similarity_service.build_index(
+            group_snapshot_service.iter_enriched_groups())
+
+    return VkGroupParseController(
+        VKGroupService(vk_manager),
+        table_service,
+        GPTChatVKGroupService(chat_gpt_manager),
+        gpt_concurrency_limit=create_gpt_concurrency_limit(adaptive),
+        checkpoint_service=checkpoint_service,
+        dedup_service=GroupDedupService() if deduplicate else None,
+        snapshot_service=group_snapshot_service,
+        prompt_service=PromptService(),
+        classifier_service=group_classifier_service,
+        similarity_service=group_similarity_service,
+        sink=create_sink(output_sink, output_file),
+        source=source)
+
+
+def create_sink(
+        output_sink: str, output_file: str = OUTPUT_FILE) -> GroupSink | None:
+    """This function creates the sink the enriched groups are written to
+    :param output_sink: the name of the sink: 'sheet', 'jsonl', 'csv' or
+    'parquet'
+    :param output_file: the path to the output file without the extension
+    (the name of the sink is added)
+    :return: an instance of GroupSink or None if the groups are sent to the
+    Google sheet
+    """
+    sinks = {
+        'jsonl': JSONLGroupSink,
+        'csv': CSVGroupSink,
+        'parquet': ParquetGroupSink,
+    }
+    if output_sink == 'sheet':
+        return None
+    if output_sink not in sinks:
+        raise ValueError(f'Unknown output sink {output_sink!r}')
+
+    return sinks[output_sink](f'{output_file}.{output_sink}')
+
+
+def create_source(
+        input_source: str, input_file: str,
+        table_service: GoogleTableService) -> GroupSource:
+    """This function creates the source the VK group URLs are read from
+    :param input_source: the name of the source: 'sheet', 'text', 'csv' or
+    'jsonl'
+    :param input_file: the path to the input file
+    :param table_service: an instance of GoogleTableService to read the
+    Google sheet with
+    :return: an instance of GroupSource
+    """
+    sources = {
+        'text': TextGroupSource,
+        'csv': CSVGroupSource,
+        'jsonl': JSONLGroupSource,
+    }
+    if input_source == 'sheet':
+        return SheetGroupSource(table_service)
+    if input_source not in sources:
+        raise ValueError(f'Unknown input source {input_source!r}')
+
+    return sources[input_source](input_file)
+
+
+def create_vk_batch_limit(adaptive: bool = ADAPTIVE_TUNING) -> AdaptiveLimit:
+    """This function creates the limit of the number of groups requested
+    from VK API at once. It starts from the maximum and is decreased when VK
+    API throttles or fails the requests or responds slowly
+    :param adaptive: whether to tune the limit (it's fixed otherwise)
+    :return: an instance of AdaptiveLimit
+    """
+    return AdaptiveLimit(
+        'vk_batch', MAX_GROUPS_PER_REQUEST,
+        ADAPTIVE_MIN_VK_BATCH if adaptive else None, step=10,
+        target_latency=ADAPTIVE_VK_TARGET_LATENCY,
+        signals=[
+            ('credential_throttles_total', {'api': 'vk'}),
+            ('pipeline_failed_rows_total', {'stage': 'vk'})],
+        track_throughput=False)
+
+
+def create_gpt_concurrency_limit(
+        adaptive: bool = ADAPTIVE_TUNING) -> AdaptiveLimit:
+    """This function creates the limit of the number of GPT chat requests in
+    flight. It's increased while the throughput grows and decreased when
+    OpenAI API throttles or fails the requests or responds slowly
+    :param adaptive: whether to tune the limit (it's fixed otherwise)
+    :return: an instance of AdaptiveLimit
+    """
+    return AdaptiveLimit(
+        'gpt_concurrency', GPT_CONCURRENCY_LIMIT,
+        ADAPTIVE_MIN_GPT_CONCURRENCY if adaptive else None,
+        ADAPTIVE_MAX_GPT_CONCURRENCY if adaptive else None,
+        target_latency=ADAPTIVE_GPT_TARGET_LATENCY,
+        signals=[
+            ('credential_throttles_total', {'api': 'openai'}),
+            ('api_requests_total', {'api': 'openai', 'status': 'error'})])
+
+
+def create_sheet_batch_limit(
+        adaptive: bool = ADAPTIVE_TUNING) -> AdaptiveLimit:
+    """This function creates the limit of the number of groups sent to the
+    output at once. It's increased while the writes succeed quickly, so
+    fewer requests are sent, and decreased when they fail or are slow
+    :param adaptive: whether to tune the limit (it's fixed otherwise)
+    :return: an instance of AdaptiveLimit
+    """
+    return AdaptiveLimit(
+        'sheet_batch', MAX_GROUPS_TO_SEND,
+        ADAPTIVE_MIN_GROUPS_TO_SEND if adaptive else None,
+        ADAPTIVE_MAX_GROUPS_TO_SEND if adaptive else None, step=10,
+        target_latency=ADAPTIVE_SHEET_TARGET_LATENCY,
+        signals=[
+            ('pipeline_failed_rows_total', {'stage': 'sheet'}),
+            ('pipeline_failed_rows_total', {'stage': 'sink'}),
+            ('api_requests_total', {'api': 'sheets', 'status': 'error'})],
+        track_throughput=False, window=5)
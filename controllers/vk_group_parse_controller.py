@@ -1,15 +1,35 @@
 """This file contains a VkGroupParseController processing parsing process"""
-from typing import Iterable
+import logging
+from asyncio import gather
+from time import monotonic
+from typing import Awaitable, Callable, Iterable, Iterator
+from pydantic import ValidationError
 from constants import (
     GPT_REQUEST_TEMPLATE, UPLOAD_FIELDS, GROUP_DATA_TEMPLATE, VK_GROUP_FIELDS,
-    MAX_GPT_ATTEMPTS, SYSTEM_ROLE, DATA_COLUMNS_TEMPLATE, FIELDS_TO_TEMPLATES)
+    MAX_GPT_ATTEMPTS, SYSTEM_ROLE, DATA_COLUMNS_TEMPLATE, FIELDS_TO_TEMPLATES,
+    GPT_CONCURRENCY_LIMIT, GPT_COMBINED_TEMPLATE, GPT_COMBINED_TAGS_TEMPLATE,
+    GPT_COMBINED_WITH_TAGS, GPT_BATCH_TEMPLATE, GROUP_BATCH_DATA_TEMPLATE,
+    GROUP_BATCH_FIELDS, GPT_GROUPS_LIMIT, RESUME_MODE, RESULT_COLUMNS,
+    SHEET_PAGE_SIZE, GPT_GROUP_DEADLINE)
 from classes.group_classes import Group
-from utils import create_group_info
+from managers import GPTApiError, AdaptiveLimit, AdaptiveSemaphore
+from utils import split_data_list
 from services.vk_group_service import VKGroupService
 from services.google_table_service import GoogleTableService
 from services.gpt_chat_service import GPTChatVKGroupService
+from services.checkpoint_service import CheckpointService
+from services.group_dedup_service import GroupDedupService
+from services.group_snapshot_service import GroupSnapshotService
+from services.group_classifier_service import GroupClassifierService
+from services.group_similarity_service import GroupSimilarityService
+from services.prompt_service import PromptService
+from sinks import GroupSink
+from sources import GroupSource, SheetGroupSource
+from metrics import metrics
 # ---------------------------------------------------------------------------
 
+logger = logging.getLogger(__name__)
+
 
 class VkGroupParseController:
     """The VkGroupParseController class contains a logic to get data from
@@ -17,25 +37,78 @@ class VkGroupParseController:
     necessary data to the Google sheet"""
     def __init__(
             self, vk_service: VKGroupService, table_service: GoogleTableService,
-            gpt_service: GPTChatVKGroupService, group_model: type[Group] = Group
+            gpt_service: GPTChatVKGroupService, group_model: type[Group] = Group,
+            gpt_concurrency_limit: int | AdaptiveLimit = GPT_CONCURRENCY_LIMIT,
+            checkpoint_service: CheckpointService = None,
+            dedup_service: GroupDedupService = None,
+            snapshot_service: GroupSnapshotService = None,
+            prompt_service: PromptService = None,
+            classifier_service: GroupClassifierService = None,
+            similarity_service: GroupSimilarityService = None,
+            sink: GroupSink = None,
+            source: GroupSource = None
     ) -> None:
         """Initialize the VkGroupParseController class
         :param vk_service: an instance of VKGroupService class
         :param table_service: an instance of GoogleTableService class
         :param gpt_service: an instance of GPTChatVKGroupService class
         :param group_model: a class representing a model of VK group
+        :param gpt_concurrency_limit: the maximum number of GPT chat requests
+        in flight at the same time (shared by all the calls of the controller)
+        or an instance of AdaptiveLimit tuning it by the latency and the
+        throttling of the requests
+        :param checkpoint_service: an instance of CheckpointService class to
+        resume the parsing after restart (the progress is not saved if it's
+        not provided)
+        :param dedup_service: an instance of GroupDedupService class to parse
+        each VK group once (the groups are not deduplicated if it's not
+        provided)
+        :param snapshot_service: an instance of GroupSnapshotService class to
+        skip fetching and enriching unchanged groups (the groups are always
+        fetched and enriched if it's not provided)
+        :param prompt_service: an instance of PromptService class to render
+        the group data for GPT chat requests (a default one is created if
+        it's not provided)
+        :param classifier_service: an instance of GroupClassifierService
+        class to enrich the obvious groups locally (all the groups are
+        enriched by GPT chat if it's not provided)
+        :param similarity_service: an instance of GroupSimilarityService
+        class to reuse the enrichment across the near-duplicate groups (the
+        near duplicates are enriched separately if it's not provided)
+        :param sink: an instance of GroupSink class to write the enriched
+        groups to instead of the Google sheet (for instance a local JSONL
+        file)
+        :param source: an instance of GroupSource class to read the VK group
+        URLs from (the URL column of the Google sheet if it's not provided)
         """
         self._vk_service = vk_service
         self._table_service = table_service
         self._gpt_service = gpt_service
         self._model = group_model
+        if not isinstance(gpt_concurrency_limit, AdaptiveLimit):
+            gpt_concurrency_limit = AdaptiveLimit(
+                'gpt_concurrency', gpt_concurrency_limit)
+        self._gpt_semaphore = AdaptiveSemaphore(gpt_concurrency_limit)
+        self._checkpoint_service = checkpoint_service
+        self._dedup_service = dedup_service
+        self._snapshot_service = snapshot_service
+        self._prompt_service = prompt_service or PromptService()
+        self._classifier_service = classifier_service
+        self._similarity_service = similarity_service
+        self._sink = sink
+        # the rows passed to the sink but not written yet and the rows with
+        # incomplete enrichment (they are processed again after restart)
+        self._unwritten_rows: set[int] = set()
+        self._incomplete_rows: set[int] = set()
+        self._source = source or SheetGroupSource(table_service)
 
     async def add_tags_to_group_data(
             self, groups: list[Group],
             gpt_chat_request_template: str = GPT_REQUEST_TEMPLATE,
             group_info_template: str = GROUP_DATA_TEMPLATE,
             fields: list[str] = VK_GROUP_FIELDS,
-            additional_role: dict[str, str] = SYSTEM_ROLE
+            additional_role: dict[str, str] = SYSTEM_ROLE,
+            deadline: float = None
     ) -> list[Group]:
         """This method serves to generate tags by group data such as name,
         description, fixed post and add the tags to the group models
@@ -48,21 +121,34 @@ class VkGroupParseController:
         as system or assistant to change GPT chat behavior
         :param fields: a list of strings representing fields that should be
         added to group_info_template
+        :param deadline: the monotonic time the tags have to be generated by
+        (GPT_GROUP_DEADLINE seconds from now by default)
         :return: a list of dictionaries containing VK group data with added
         tags
         """
+        if deadline is None:
+            deadline = monotonic() + GPT_GROUP_DEADLINE
+        request = gpt_chat_request_template.format(
+            self._prompt_service.create_group_info(
+                groups, group_info_template, fields))
+
         for _ in range(MAX_GPT_ATTEMPTS):
             try:
-                request = gpt_chat_request_template.format(
-                    create_group_info(groups, group_info_template, fields))
-                result = await self._gpt_service.fill_group_tags_by_request(
-                    groups, request, additional_role)
+                async with self._gpt_semaphore.hold():
+                    result = await (
+                        self._gpt_service.fill_group_tags_by_request(
+                            groups, request, additional_role, deadline))
 
                 return result
 
+            except GPTApiError as e:
+                logger.warning(f'Failed to create tags: {e}')
+                break
+
             except Exception as e:
-                print(f'The was an error during creating tags: {e}. One more '
-                      f'attempt')
+                logger.warning(
+                    f'The was an error during creating tags: {e}. One more '
+                    f'attempt')
         return groups
 
     async def add_solvency_progression_education_to_group(
@@ -70,7 +156,8 @@ class VkGroupParseController:
             gpt_chat_request_templates: dict[str, str] = FIELDS_TO_TEMPLATES,
             group_info_template: str = GROUP_DATA_TEMPLATE,
             group_fields: list[str] = VK_GROUP_FIELDS,
-            additional_role: dict[str, str] = SYSTEM_ROLE
+            additional_role: dict[str, str] = SYSTEM_ROLE,
+            deadline: float = None
     ) -> list[Group]:
         """This method serves to generate different values for user's
         solvency, progression and self-education
@@ -83,73 +170,520 @@ class VkGroupParseController:
         as system or assistant to change GPT chat behavior
         :param group_fields: a list of strings representing fields that
         should be added to group_info_template
+        :param deadline: the monotonic time the fields have to be generated
+        by (GPT_GROUP_DEADLINE seconds from now by default)
         :return: a list of dictionaries containing VK group data with added
         tags
         """
+        if deadline is None:
+            deadline = monotonic() + GPT_GROUP_DEADLINE
+        jobs = [
+            (group, model_field, template)
+            for group in groups
+            for model_field, template in gpt_chat_request_templates.items()
+        ]
+        results = await gather(*[
+            self._fill_field_with_attempts(
+                group, model_field, template, group_info_template,
+                group_fields, additional_role, deadline)
+            for group, model_field, template in jobs])
 
-        for group in groups:
-            for model_field, template in gpt_chat_request_templates.items():
-                for _ in range(MAX_GPT_ATTEMPTS):
-                    try:
-                        request = template.format(
-                            create_group_info(
-                                [group], group_info_template, group_fields))
+        failed_jobs = [
+            (group.id, model_field)
+            for (group, model_field, _), is_filled in zip(jobs, results)
+            if not is_filled]
+        if failed_jobs:
+            logger.warning(
+                f'Failed to generate data for the fields: {failed_jobs}')
 
-                        result = await self._gpt_service.fill_field_by_request(
-                            group, request, model_field,
-                            additional_role)
-                        if not result:
-                            continue
+        return groups
+
+    async def add_all_fields_to_group(
+            self, groups: list[Group],
+            with_tags: bool = GPT_COMBINED_WITH_TAGS,
+            gpt_chat_request_template: str = GPT_COMBINED_TEMPLATE,
+            tags_request_template: str = GPT_COMBINED_TAGS_TEMPLATE,
+            gpt_chat_request_templates: dict[str, str] = FIELDS_TO_TEMPLATES,
+            group_info_template: str = GROUP_DATA_TEMPLATE,
+            group_fields: list[str] = VK_GROUP_FIELDS,
+            additional_role: dict[str, str] = SYSTEM_ROLE,
+            deadline: float = None
+    ) -> list[Group]:
+        """This method serves to generate user's solvency, progression,
+        self-education and optionally tags by a single request per group.
+        The fields failed validation are requested again one by one by using
+        their own templates
+        :param groups: a list of Group instances containing VK group data
+        :param with_tags: a boolean indicating if the tags should be
+        requested in the same request as well
+        :param gpt_chat_request_template: a string representing the template
+        for the combined GPT chat request
+        :param tags_request_template: a string representing the part of the
+        combined request asking for the tags
+        :param gpt_chat_request_templates: a dictionary with field names and
+        templates to request these fields one by one
+        :param group_info_template: A template to create a string
+        representing the group data
+        :param group_fields: a list of strings representing fields that
+        should be added to group_info_template
+        :param additional_role: a dictionary with additional role of GPT such
+        as system or assistant to change GPT chat behavior
+        :param deadline: the monotonic time the fields have to be generated
+        by (GPT_GROUP_DEADLINE seconds from now by default)
+        :return: a list of Group instances with filled fields
+        """
+        if deadline is None:
+            deadline = monotonic() + GPT_GROUP_DEADLINE
+        await gather(*[
+            self._fill_all_fields(
+                group, with_tags, gpt_chat_request_template,
+                tags_request_template, gpt_chat_request_templates,
+                group_info_template, group_fields, additional_role, deadline)
+            for group in groups])
+
+        return groups
+
+    async def add_all_fields_to_groups_batch(
+            self, groups: list[Group], batch_size: int = GPT_GROUPS_LIMIT,
+            with_tags: bool = GPT_COMBINED_WITH_TAGS,
+            gpt_chat_request_template: str = GPT_BATCH_TEMPLATE,
+            tags_request_template: str = GPT_COMBINED_TAGS_TEMPLATE,
+            gpt_chat_request_templates: dict[str, str] = FIELDS_TO_TEMPLATES,
+            group_info_template: str = GROUP_BATCH_DATA_TEMPLATE,
+            group_fields: list[str] = GROUP_BATCH_FIELDS,
+            additional_role: dict[str, str] = SYSTEM_ROLE,
+            deadline: float = None
+    ) -> list[Group]:
+        """This method serves to generate user's solvency, progression,
+        self-education and optionally tags for several groups per request.
+        The answer is matched with the groups by their ids, the groups missing
+        in the answer or failed validation are requested again in a batch of
+        half size. The groups left when the batch size reaches 1 are processed
+        by the add_all_fields_to_group method
+        :param groups: a list of Group instances containing VK group data
+        :param batch_size: the number of groups to send per single request
+        :param with_tags: a boolean indicating if the tags should be
+        requested in the same request as well
+        :param gpt_chat_request_template: a string representing the template
+        for the batched GPT chat request
+        :param tags_request_template: a string representing the part of the
+        request asking for the tags
+        :param gpt_chat_request_templates: a dictionary with field names and
+        templates to request these fields one by one
+        :param group_info_template: A template to create a string
+        representing the group data including its id
+        :param group_fields: a list of strings representing fields that
+        should be added to group_info_template
+        :param additional_role: a dictionary with additional role of GPT such
+        as system or assistant to change GPT chat behavior
+        :param deadline: the monotonic time the fields have to be generated
+        by (GPT_GROUP_DEADLINE seconds from now by default)
+        :return: a list of Group instances with filled fields
+        """
+        if deadline is None:
+            deadline = monotonic() + GPT_GROUP_DEADLINE
+        fields = list(gpt_chat_request_templates)
+        if with_tags:
+            fields.append('tags')
 
-                        break
+        pending = list(groups)
+        while pending and batch_size > 1:
+            results = await gather(*[
+                self._fill_batch_fields(
+                    batch, fields, gpt_chat_request_template,
+                    tags_request_template if with_tags else '',
+                    group_info_template, group_fields, additional_role,
+                    deadline)
+                for batch in split_data_list(pending, batch_size)])
+            pending = [group for failed in results for group in failed]
+            batch_size //= 2
 
-                    except Exception as e:
-                        print(f'The was an error while generating a field '
-                              f'data: {e}. One more attempt')
+        if pending:
+            await self.add_all_fields_to_group(
+                pending, with_tags,
+                gpt_chat_request_templates=gpt_chat_request_templates,
+                additional_role=additional_role, deadline=deadline)
 
         return groups
 
+    async def _fill_batch_fields(
+            self, groups: list[Group], fields: list[str],
+            gpt_chat_request_template: str, tags_request_template: str,
+            group_info_template: str, group_fields: list[str],
+            additional_role: dict[str, str], deadline: float
+    ) -> list[Group]:
+        """This method serves to fill the fields of a batch of groups by a
+        single request
+        :param groups: a list of Group instances containing VK group data
+        :param fields: the names of the fields to fill
+        :param gpt_chat_request_template: the template for the batched request
+        :param tags_request_template: the part of the request asking for tags
+        or an empty string if the tags are not requested
+        :param group_info_template: A template to create a string
+        representing the group data including its id
+        :param group_fields: a list of strings representing fields that
+        should be added to group_info_template
+        :param additional_role: a dictionary with additional role of GPT
+        :param deadline: the monotonic time the fields have to be generated by
+        :return: a list of Group instances that were not filled
+        """
+        request = gpt_chat_request_template.format(
+            self._prompt_service.create_group_info(
+                groups, group_info_template, group_fields),
+            tags_request_template, ', '.join(fields))
+
+        try:
+            async with self._gpt_semaphore.hold():
+                return await self._gpt_service.fill_groups_fields_by_request(
+                    groups, request, fields, additional_role, deadline)
+
+        except Exception as e:
+            logger.warning(
+                f'The was an error during the batched request: {e}. '
+                f'Requesting the groups again')
+            return groups
+
+    async def _fill_all_fields(
+            self, group: Group, with_tags: bool,
+            gpt_chat_request_template: str, tags_request_template: str,
+            gpt_chat_request_templates: dict[str, str],
+            group_info_template: str, group_fields: list[str],
+            additional_role: dict[str, str], deadline: float
+    ) -> None:
+        """This method serves to fill all the fields of a single group by the
+        combined request falling back to the separate requests for the fields
+        failed validation
+        :param group: a Group instance containing VK group data
+        :param with_tags: a boolean indicating if the tags should be filled
+        :param gpt_chat_request_template: the template for the combined request
+        :param tags_request_template: the part of the request asking for tags
+        :param gpt_chat_request_templates: a dictionary with field names and
+        templates to request these fields one by one
+        :param group_info_template: A template to create a string
+        representing the group data
+        :param group_fields: a list of strings representing fields that
+        should be added to group_info_template
+        :param additional_role: a dictionary with additional role of GPT
+        :param deadline: the monotonic time the fields have to be generated by
+        """
+        fields = list(gpt_chat_request_templates)
+        if with_tags:
+            fields.append('tags')
+        request = gpt_chat_request_template.format(
+            self._prompt_service.create_group_info(
+                [group], group_info_template, group_fields),
+            tags_request_template if with_tags else '', ', '.join(fields))
+
+        try:
+            async with self._gpt_semaphore.hold():
+                failed_fields = await self._gpt_service.fill_fields_by_request(
+                    group, request, fields, additional_role, deadline)
+
+        except Exception as e:
+            logger.warning(
+                f'The was an error during the combined request: {e}. '
+                f'Requesting the fields one by one')
+            failed_fields = fields
+
+        jobs = [
+            self._fill_field_with_attempts(
+                group, field, gpt_chat_request_templates[field],
+                group_info_template, group_fields, additional_role, deadline)
+            for field in failed_fields if field in gpt_chat_request_templates]
+        if 'tags' in failed_fields:
+            jobs.append(
+                self.add_tags_to_group_data([group], deadline=deadline))
+
+        await gather(*jobs)
+
+    async def _fill_field_with_attempts(
+            self, group: Group, model_field: str, template: str,
+            group_info_template: str, group_fields: list[str],
+            additional_role: dict[str, str], deadline: float
+    ) -> bool:
+        """This method serves to fill a single field of the group by GPT chat
+        making up to MAX_GPT_ATTEMPTS attempts to get a valid answer. Each
+        attempt waits for a free slot of the shared semaphore so the number
+        of requests in flight never exceeds the configured limit. The failed
+        requests are retried by ChatGPTManager, so the attempts stop if the
+        request fails anyway
+        :param group: a Group instance containing VK group data
+        :param model_field: the name of the field to fill
+        :param template: the template for GPT chat request
+        :param group_info_template: A template to create a string
+        representing the group data
+        :param group_fields: a list of strings representing fields that
+        should be added to group_info_template
+        :param additional_role: a dictionary with additional role of GPT
+        :param deadline: the monotonic time the field has to be generated by
+        :return: True if the field was filled and False otherwise
+        """
+        request = template.format(
+            self._prompt_service.create_group_info(
+                [group], group_info_template, group_fields))
+
+        for _ in range(MAX_GPT_ATTEMPTS):
+            try:
+                async with self._gpt_semaphore.hold():
+                    result = await self._gpt_service.fill_field_by_request(
+                        group, request, model_field, additional_role,
+                        deadline)
+                if result:
+                    return True
+
+            except GPTApiError as e:
+                logger.warning(
+                    f'Failed to generate the field {model_field}: {e}')
+                break
+
+            except Exception as e:
+                logger.warning(
+                    f'The was an error while generating a field '
+                    f'data: {e}. One more attempt')
+
+        return False
+
+    def iter_vk_ids(
+            self, offset: int = 0, limit: int = None, start_num: int = 1,
+            resume: bool = RESUME_MODE, result_columns: str = RESULT_COLUMNS,
+            page_size: int = SHEET_PAGE_SIZE
+    ) -> Iterator[list[Group]]:
+        """This method reads only the requested rows of the source (the
+        Google sheet by default) page by page and yields VK ids extracted
+        from urls of each page. The pages are read lazily, so the memory
+        doesn't depend on the size of the source
+        :param offset: the offset from the first row
+        :param limit: the maximum number of rows to read
+        :param start_num: the number of the first row
+        :param resume: a boolean indicating if the rows up to the checkpoint
+        (except the failed ones) and the rows with all the result cells
+        filled should be skipped
+        :param result_columns: the range of the result columns to check (for
+        instance 'Q:S')
+        :param page_size: the number of rows of a single page
+        :return: an iterator of lists of Group instances
+        """
+        start_row = start_num + offset
+        end_row = start_row + limit - 1 if limit else None
+        last_written_row, failed_rows = 0, set()
+        if resume and self._checkpoint_service:
+            last_written_row = self._checkpoint_service.last_written_row
+            failed_rows = self._checkpoint_service.failed_rows
+            # the reading starts from the first failed row, the finished rows
+            # before the checkpoint are filtered out
+            start_row = max(start_row, min(
+                failed_rows | {last_written_row + 1}))
+
+        pages = self._source.iter_pages(
+            start_row, end_row, page_size,
+            result_columns if resume else None)
+
+        for page in pages:
+            models = [
+                self._model(column_num=num, id=group_id)
+                for num, group_id in page
+                if num > last_written_row or num in failed_rows]
+            if not models:
+                continue
+            if self._checkpoint_service:
+                self._checkpoint_service.mark_dispatched(
+                    model.column_num for model in models)
+
+            yield models
+
     def get_vk_ids(
-            self, offset: int = 0, limit: int = None, start_num: int = 1
+            self, offset: int = 0, limit: int = None, start_num: int = 1,
+            resume: bool = RESUME_MODE, result_columns: str = RESULT_COLUMNS
     ) -> list[Group]:
         """This method returns a list of VK ids extracted from urls
         downloaded from the provided Google sheet
         :param limit: the maximum number of ids to return
         :param offset: the offset from the start of the ids list
         :param start_num: the first sheet row number to start enumeration with
+        :param resume: a boolean indicating if the rows up to the checkpoint
+        and the rows with all the result cells filled should be skipped
+        :param result_columns: the range of the result columns to check (for
+        instance 'Q:S')
         :return: a list of GroupId instances
         """
-        ids = self._table_service.get_vk_ids_from_sheet()
+        return [
+            model
+            for models in self.iter_vk_ids(
+                offset, limit, start_num, resume, result_columns)
+            for model in models]
 
-        if not limit:
-            limit = len(ids)
+    async def resolve_group_ids(self, groups: list[Group]) -> list[Group]:
+        """This method replaces VK screen names in the group ids with the
+        numeric ids by bulk requests to VK API
+        :param groups: a list of Group instances with ids or screen names
+        :return: a list of Group instances with numeric ids
+        """
+        return await self._vk_service.resolve_screen_names(groups)
+
+    def register_groups(
+            self, groups: list[Group]) -> tuple[list[Group], list[Group]]:
+        """This method splits the groups read from the sheet into the groups
+        to parse and the duplicates of already parsed groups
+        :param groups: a list of Group instances with ids and row numbers
+        :return: a tuple with a list of groups to parse and a list of groups
+        ready to be sent to the Google sheet
+        """
+        if not self._dedup_service:
+            return groups, []
+
+        return self._dedup_service.register_groups(groups)
+
+    def expand_duplicates(self, groups: list[Group]) -> list[Group]:
+        """This method adds the copies of the enriched groups for all the
+        sheet rows with the same VK group
+        :param groups: a list of enriched Group instances
+        :return: a list of Group instances to send to the Google sheet
+        """
+        if not self._dedup_service:
+            return groups
+
+        return self._dedup_service.expand_groups(groups)
+
+    def mark_failed_groups(self, groups: list[Group]) -> None:
+        """This method releases the groups failed in the middle of the run
+        (the request failed), their rows are processed again after restart
+        :param groups: a list of Group instances failed to be parsed
+        """
+        self._release_groups(groups, is_failed=True)
+
+    def mark_skipped_groups(self, groups: list[Group]) -> None:
+        """This method releases the groups that can't be parsed at all (VK
+        API doesn't return them or their data is invalid), their rows are
+        not processed again after restart
+        :param groups: a list of Group instances failed to be parsed
+        """
+        self._release_groups(groups, is_failed=False)
+
+    def _release_groups(self, groups: list[Group], is_failed: bool) -> None:
+        """This method forgets the groups failed to be parsed, so the next
+        rows with the same VK groups are parsed again, and finishes their
+        rows in the checkpoint. The duplicate rows registered so far are
+        counted as failed and are finished with the groups
+        :param groups: a list of Group instances failed to be parsed
+        :param is_failed: whether the rows have to be processed again after
+        restart
+        """
+        if not groups:
+            return
 
-        models = [
-            self._model(column_num=num, id=group_id)
-            for num, group_id in enumerate(ids, start_num)]
-        models = models[offset:offset + limit]
+        rows = [group.column_num for group in groups]
+        if self._dedup_service:
+            duplicate_rows = self._dedup_service.release(
+                group.id for group in groups if group.id)
+            metrics.inc(
+                'pipeline_failed_rows_total', len(duplicate_rows),
+                stage='dedup')
+            rows.extend(duplicate_rows)
 
-        return models
+        if not self._checkpoint_service:
+            return
+        if is_failed:
+            self._checkpoint_service.mark_failed(rows)
+        else:
+            self._checkpoint_service.mark_skipped(rows)
 
-    def get_groups_by_ids(
+    async def get_groups_by_ids(
             self, groups: list[Group], get_post_text: bool = True
     ) -> list[Group] | None:
-        """This method serves to get VK groups from official VK API by 
-        provided groups filled with ids
+        """This method serves to get VK groups from official VK API by
+        provided groups filled with ids. The groups VK API doesn't return
+        (deleted, banned or unresolved) and the groups with invalid data are
+        skipped, the groups of the failed request are marked as failed
         :param get_post_text: a boolean indicating if you need to turn VK
         post ids into its text
         :param groups: a list of strings representing VK group ids
-        :return: a list of dictionaries representing VK group data
+        :return: a list of Group instances with VK data or None if no group
+        is loaded
         """
-        result = self._vk_service.get_groups_by_ids(groups, get_post_text)
-        return result
+        stale_groups = groups
+        if self._snapshot_service:
+            stale_groups = self._snapshot_service.fill_fresh_groups(
+                groups, get_post_text)
+            if not stale_groups:
+                return groups
+
+        result = await self._vk_service.fetch_groups(
+            stale_groups, get_post_text)
+        found_groups = []
+        if result is None:
+            metrics.inc(
+                'pipeline_failed_rows_total', len(stale_groups), stage='vk')
+            self.mark_failed_groups(stale_groups)
+        else:
+            valid_groups, found_groups = result
+            if self._snapshot_service:
+                # the groups VK API didn't return are not saved, so they are
+                # requested again if they come back
+                self._snapshot_service.save_groups(
+                    found_groups, get_post_text)
+            metrics.inc(
+                'pipeline_failed_rows_total',
+                len(valid_groups) - len(found_groups), stage='missing')
+            found_ids = set(map(id, found_groups))
+            self.mark_skipped_groups([
+                group for group in stale_groups if id(group) not in found_ids])
+
+        dropped_ids = set(map(id, stale_groups)) - set(map(id, found_groups))
+        fetched_groups = [
+            group for group in groups if id(group) not in dropped_ids]
+
+        return fetched_groups or None
+
+    async def enrich_changed_groups(
+            self, groups: list[Group],
+            enrich: Callable[[list[Group]], Awaitable[list[Group]]]
+    ) -> list[Group]:
+        """This method serves to enrich only the groups whose content has
+        changed since their last enrichment, the other groups get the stored
+        enrichment. The changed groups nearly the same as the enriched ones
+        get their enrichment, a single group of each set of near duplicates
+        is enriched. The groups the local classifier is confident in are
+        enriched locally and the rest ones are sent to GPT chat. Only the
+        enrichment made by GPT chat is stored, so the classifier and the
+        near-duplicate index are never built from derived answers
+        :param groups: a list of Group instances containing VK group data
+        :param enrich: the method of the controller generating the data of
+        the groups by GPT chat (for instance add_all_fields_to_groups_batch)
+        :return: a list of enriched Group instances
+        """
+        if not (self._snapshot_service or self._classifier_service or
+                self._similarity_service):
+            return await enrich(groups)
+
+        changed_groups, duplicates = groups, []
+        if self._snapshot_service:
+            changed_groups = self._snapshot_service.fill_enrichment(groups)
+        if self._similarity_service:
+            changed_groups, duplicates = (
+                self._similarity_service.fill_near_duplicates(changed_groups))
+        if self._classifier_service:
+            changed_groups = self._classifier_service.classify(
+                changed_groups)
+
+        if changed_groups:
+            await enrich(changed_groups)
+            if self._snapshot_service:
+                self._snapshot_service.save_enrichment(changed_groups)
+        if self._similarity_service:
+            self._similarity_service.copy_enrichment(duplicates)
+            self._similarity_service.save_groups(changed_groups)
+
+        return groups
 
     def send_groups_to_google_table(
             self, groups: list[list[Group]],
             col_template: str = DATA_COLUMNS_TEMPLATE,
             fields: Iterable[str] = UPLOAD_FIELDS
     ) -> None:
-        """This method serves to send provided group data to Google sheet
+        """This method serves to send provided group data to Google sheet or
+        to the sink if it's provided. The rows don't have to be contiguous or
+        sorted. The rows with any of the fields missing are written but
+        they are processed again after restart
         :param groups: a list of Group instances representing the group data
         :param col_template: the string representing the template of columns to
          update data in (for instance 'A{0}:B{1}')
@@ -158,11 +692,109 @@ class VkGroupParseController:
         """
         prepared_groups = []
         [prepared_groups.extend(item) for item in groups]
+        fields = list(fields)
+        valid_groups = self._validate_groups(prepared_groups)
+        rows = [group.column_num for group in valid_groups]
+        if self._checkpoint_service:
+            self._checkpoint_service.mark_skipped(
+                {group.column_num for group in prepared_groups} - set(rows))
+            self._incomplete_rows.update(
+                group.column_num for group in valid_groups
+                if any(getattr(group, field, None) is None
+                       for field in fields))
+        prepared_groups = valid_groups
+        if not prepared_groups:
+            return
+
+        if self._sink:
+            if self._checkpoint_service:
+                self._unwritten_rows.update(rows)
+            self._mark_written_rows(
+                self._sink.write_groups(prepared_groups, fields),
+                len(prepared_groups))
+            return
 
-        col_range = col_template.format(
-            prepared_groups[0].column_num, prepared_groups[-1].column_num)
+        is_sent = self._table_service.send_groups_to_sheet(
+            prepared_groups, col_template, fields)
+        if not is_sent:
+            metrics.inc(
+                'pipeline_failed_rows_total', len(prepared_groups),
+                stage='sheet')
+            if self._checkpoint_service:
+                self._checkpoint_service.mark_failed(rows)
+            return
+
+        self._mark_checkpoint_rows(rows)
+        metrics.inc('pipeline_rows_total', len(prepared_groups), stage='sheet')
+        logger.info(
+            f'{len(prepared_groups)} groups sent to Google sheet successfully')
+
+    def close_sink(self) -> None:
+        """This method writes the groups left in the buffer of the sink and
+        closes it. It has to be called when the parsing is finished"""
+        if self._sink:
+            self._mark_written_rows(self._sink.close())
+
+    def _mark_written_rows(
+            self, rows: list[int] | None, count: int = 0) -> None:
+        """This method registers the rows written by the sink
+        :param rows: a list of the written row numbers or None if the
+        writing failed
+        :param count: the number of rows passed to the sink (used to count
+        the failed rows)
+        """
+        if rows is None:
+            metrics.inc('pipeline_failed_rows_total', count, stage='sink')
+            # the sink drops all the rows it hasn't written yet
+            if self._checkpoint_service:
+                self._checkpoint_service.mark_failed(self._unwritten_rows)
+                self._unwritten_rows = set()
+            return
+        if not rows:
+            return
+
+        self._unwritten_rows.difference_update(rows)
+        self._mark_checkpoint_rows(rows)
+        metrics.inc('pipeline_rows_total', len(rows), stage='sink')
+        logger.info(
+            f'{len(rows)} groups written to the {self._sink.name} sink')
+
+    def _mark_checkpoint_rows(self, rows: list[int]) -> None:
+        """This method registers the written rows in the checkpoint, the
+        rows with incomplete enrichment are marked as failed
+        :param rows: a list of the written row numbers
+        """
+        if not self._checkpoint_service:
+            return
+
+        incomplete_rows = self._incomplete_rows.intersection(rows)
+        self._incomplete_rows.difference_update(incomplete_rows)
+        if incomplete_rows:
+            logger.warning(
+                f'{len(incomplete_rows)} rows are written with incomplete '
+                f'data, they are processed again after restart')
+        self._checkpoint_service.mark_failed(incomplete_rows)
+        self._checkpoint_service.mark_written(
+            row for row in rows if row not in incomplete_rows)
+
+    @staticmethod
+    def _validate_groups(groups: list[Group]) -> list[Group]:
+        """This method validates the groups before sending them to Google
+        sheet. The invalid groups are skipped so their rows are parsed again
+        after restart
+        :param groups: a list of Group instances representing the group data
+        :return: a list of valid Group instances
+        """
+        valid_groups = []
+        for group in groups:
+            try:
+                group.validate()
+                valid_groups.append(group)
 
-        self._table_service.send_groups_to_sheet(
-            prepared_groups, col_range, fields)
+            except ValidationError as e:
+                logger.warning(
+                    f'Invalid data of the group in the row '
+                    f'{group.column_num}, the error: {e}')
+                metrics.inc('pipeline_failed_rows_total', stage='validation')
 
-        print(f'{prepared_groups}\nSent to Google sheet successfully')
+        return valid_groups
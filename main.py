@@ -1,40 +1,288 @@
-"""This is a main file to run the application"""
-from asyncio import run, create_task, gather
+"""This is a main file to run the application. The parsing is organized as a
+streaming pipeline: sheet reader -> VK fetchers -> GPT enrichers -> sheet
+writer. The stages are connected by bounded queues so all of them work at
+the same time and the fast stages wait for the slow ones"""
+import logging
+from asyncio import (
+    run, gather, to_thread, wait_for, sleep, create_task, Queue, TimeoutError)
+from time import monotonic
+from typing import Awaitable, Callable, Coroutine
+from classes.group_classes import Group
+from controllers import VkGroupParseController
 from constants import (
-    GPT_GROUPS_LIMIT, MAX_GROUPS_TO_SEND, PARSE_OFFSET, PARSE_LIMIT,
-    MAX_GROUPS_PER_REQUEST, FIELDS_TO_TEMPLATES, GET_POST_TEXT)
-from container import vk_group_parse_controller
+    GPT_GROUPS_LIMIT, PARSE_OFFSET, PARSE_LIMIT, FIELDS_TO_TEMPLATES,
+    GET_POST_TEXT,
+    GPT_COMBINED_REQUEST, VK_WORKERS, GPT_WORKERS, PIPELINE_QUEUE_SIZE,
+    SHEET_FLUSH_INTERVAL, LOG_LEVEL, METRICS_FILE, METRICS_INTERVAL,
+    METRICS_PORT)
+from container import (
+    create_managers, create_controller, create_vk_batch_limit,
+    create_sheet_batch_limit)
+from managers import (
+    GPTCacheManager, VKGroupManager, AsyncVKGroupManager, AdaptiveLimit)
+from metrics import metrics
+from utils import split_data_list
 # --------------------------------------------------------------------------
 
+logger = logging.getLogger(__name__)
 
-async def main():
-    """This is a main function to run the application"""
-    group_ids = vk_group_parse_controller.get_vk_ids(
+
+async def read_groups(
+        controller: VkGroupParseController, out_queue: Queue,
+        write_queue: Queue, chunk_size: AdaptiveLimit) -> None:
+    """This function reads group ids from the Google sheet page by page and
+    puts them to the queue by chunks. Each VK group is parsed once, the
+    duplicates of already parsed groups are sent to the writer directly
+    :param controller: an instance of VkGroupParseController
+    :param out_queue: the queue to put the chunks of groups to parse to
+    :param write_queue: the queue to put the duplicates ready to send to
+    :param chunk_size: the limit of the number of groups in a single chunk
+    (the groups of a chunk are requested from VK API at once)
+    """
+    pages = controller.iter_vk_ids(
         offset=PARSE_OFFSET, limit=PARSE_LIMIT)
-    tasks = []
-    groups = vk_group_parse_controller.get_groups_by_ids(
-        group_ids[:MAX_GROUPS_PER_REQUEST], get_post_text=GET_POST_TEXT)
-
-    while group_ids:
-        task = create_task(
-            (vk_group_parse_controller
-             .add_solvency_progression_education_to_group(
-              groups[:GPT_GROUPS_LIMIT])))
-        del groups[:GPT_GROUPS_LIMIT]
-        del group_ids[:GPT_GROUPS_LIMIT]
-        tasks.append(task)
-
-        if (len(tasks) * GPT_GROUPS_LIMIT >= MAX_GROUPS_TO_SEND or
-                not groups):
-            prepared_data = await gather(*tasks)
-            vk_group_parse_controller.send_groups_to_google_table(
-                prepared_data, fields=FIELDS_TO_TEMPLATES)
-            tasks.clear()
-
-        if not groups:
-            groups = vk_group_parse_controller.get_groups_by_ids(
-                group_ids[:MAX_GROUPS_PER_REQUEST], get_post_text=GET_POST_TEXT)
+
+    while (group_ids := await to_thread(next, pages, None)) is not None:
+        metrics.inc('pipeline_rows_total', len(group_ids), stage='read')
+        group_ids = await controller.resolve_group_ids(group_ids)
+        group_ids, ready_groups = controller.register_groups(group_ids)
+        if ready_groups:
+            await write_queue.put(ready_groups)
+
+        for groups in split_data_list(group_ids, chunk_size.value):
+            await out_queue.put(groups)
+
+
+async def fetch_groups(
+        controller: VkGroupParseController, in_queue: Queue,
+        out_queue: Queue, chunk_size: int, batch_limit: AdaptiveLimit
+) -> None:
+    """This function gets group data from VK API and puts the groups to the
+    queue by chunks to send to GPT chat
+    :param controller: an instance of VkGroupParseController
+    :param in_queue: the queue to get the chunks of groups with ids from
+    :param out_queue: the queue to put the chunks of groups with VK data to
+    :param chunk_size: the number of groups in a single chunk
+    :param batch_limit: the limit of the number of groups requested at once
+    to record the duration of the requests to
+    """
+    while (groups := await in_queue.get()) is not None:
+        start = monotonic()
+        fetched_groups = await controller.get_groups_by_ids(
+            groups, get_post_text=GET_POST_TEXT)
+        batch_limit.record(len(groups), monotonic() - start)
+        if not fetched_groups:
+            continue
+        metrics.inc('pipeline_rows_total', len(fetched_groups), stage='vk')
+        groups = fetched_groups
+
+        for chunk in split_data_list(groups, chunk_size):
+            await out_queue.put(chunk)
+
+
+async def enrich_groups(
+        controller: VkGroupParseController, in_queue: Queue, out_queue: Queue,
+        enrich: Callable[[list[Group]], Awaitable[list[Group]]]) -> None:
+    """This function generates the data of the groups by GPT chat
+    :param controller: an instance of VkGroupParseController
+    :param in_queue: the queue to get the chunks of groups with VK data from
+    :param out_queue: the queue to put the enriched groups to
+    :param enrich: the controller method to generate the data of the groups
+    """
+    while (groups := await in_queue.get()) is not None:
+        try:
+            groups = await controller.enrich_changed_groups(groups, enrich)
+
+        except Exception as e:
+            logger.error(f'Failed to generate data for the groups, error: {e}')
+            metrics.inc(
+                'pipeline_failed_rows_total', len(groups), stage='gpt')
+            controller.mark_failed_groups(groups)
+            continue
+
+        metrics.inc('pipeline_rows_total', len(groups), stage='gpt')
+        await out_queue.put(groups)
+
+
+async def write_groups(
+        controller: VkGroupParseController, in_queue: Queue,
+        batch_size: AdaptiveLimit, flush_interval: float) -> None:
+    """This function collects the enriched groups and sends them to the
+    Google sheet when the batch is full or the flush interval has passed
+    since the last sending. The groups can come in any order
+    :param controller: an instance of VkGroupParseController
+    :param in_queue: the queue to get the enriched groups from
+    :param batch_size: the limit of the number of groups to collect before
+    sending, the duration of the sending is recorded to it
+    :param flush_interval: the maximum number of seconds to keep the
+    collected groups before sending
+    """
+    buffer = []
+    flushed_at = monotonic()
+    while True:
+        timeout = max(0.0, flush_interval - (monotonic() - flushed_at))
+        try:
+            groups = await wait_for(in_queue.get(), timeout)
+        except TimeoutError:
+            groups = []
+
+        if groups is None:
+            break
+        buffer.extend(controller.expand_duplicates(groups))
+
+        if (len(buffer) >= batch_size.value or
+                monotonic() - flushed_at >= flush_interval):
+            if buffer:
+                start = monotonic()
+                await send_groups(controller, buffer)
+                batch_size.record(len(buffer), monotonic() - start)
+                buffer = []
+            flushed_at = monotonic()
+
+    if buffer:
+        await send_groups(controller, buffer)
+
+
+async def send_groups(
+        controller: VkGroupParseController, groups: list[Group]) -> None:
+    """This function sends the groups to the Google sheet without blocking
+    the other stages of the pipeline
+    :param controller: an instance of VkGroupParseController
+    :param groups: a list of Group instances to send
+    """
+    await to_thread(
+        controller.send_groups_to_google_table,
+        [groups], fields=FIELDS_TO_TEMPLATES)
+
+
+async def run_stage(
+        workers: list[Coroutine], out_queue: Queue, next_workers: int
+) -> None:
+    """This function runs the workers of a single stage and notifies the
+    workers of the next stage that there will be no more data
+    :param workers: the coroutines of the stage workers
+    :param out_queue: the queue the workers put the data to
+    :param next_workers: the number of the next stage workers
+    """
+    await gather(*workers)
+    for _ in range(next_workers):
+        await out_queue.put(None)
+
+
+async def monitor_pipeline(
+        queues: dict[str, Queue], metrics_file: str | None,
+        interval: float) -> None:
+    """This function updates the sizes of the pipeline queues every second
+    and writes the metrics to the file every interval
+    :param queues: a dictionary with queue names as keys and queues as values
+    :param metrics_file: the path to the metrics file (None - the metrics are
+    not written)
+    :param interval: the number of seconds between the writes of the file
+    """
+    written_at = monotonic()
+    while True:
+        for name, queue in queues.items():
+            metrics.set('pipeline_queue_size', queue.qsize(), queue=name)
+
+        if metrics_file and monotonic() - written_at >= interval:
+            await write_metrics(metrics_file)
+            written_at = monotonic()
+        await sleep(1)
+
+
+async def write_metrics(metrics_file: str) -> None:
+    """This function writes the metrics to the file without blocking the
+    pipeline
+    :param metrics_file: the path to the metrics file
+    """
+    try:
+        await to_thread(metrics.write_json, metrics_file)
+
+    except OSError as e:
+        logger.error(f'Unable to write the metrics, the error: {e}')
+
+
+async def main(
+        controller: VkGroupParseController,
+        vk_manager: VKGroupManager | AsyncVKGroupManager = None,
+        gpt_cache_manager: GPTCacheManager = None,
+        metrics_file: str | None = METRICS_FILE,
+        metrics_port: int | None = METRICS_PORT,
+        vk_batch_limit: AdaptiveLimit = None,
+        sheet_batch_limit: AdaptiveLimit = None) -> None:
+    """This is a main function to run the application
+    :param controller: an instance of VkGroupParseController
+    :param vk_manager: the VK manager to close when the parsing is finished
+    :param gpt_cache_manager: the GPT cache manager to print statistics of
+    :param metrics_file: the path to the file to write the metrics to (None
+    - the metrics are not written)
+    :param metrics_port: the port to expose the metrics in Prometheus text
+    format on (None - the metrics server is not started)
+    :param vk_batch_limit: the limit of the number of groups requested from
+    VK API at once (created by ADAPTIVE_TUNING settings if it's not
+    provided)
+    :param sheet_batch_limit: the limit of the number of groups sent to the
+    output at once (created by ADAPTIVE_TUNING settings if it's not
+    provided)
+    """
+    vk_batch_limit = vk_batch_limit or create_vk_batch_limit()
+    sheet_batch_limit = sheet_batch_limit or create_sheet_batch_limit()
+    if GPT_COMBINED_REQUEST:
+        enrich = controller.add_all_fields_to_groups_batch
+    else:
+        enrich = controller.add_solvency_progression_education_to_group
+
+    vk_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    gpt_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    write_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    metrics_server = None
+    if metrics_port:
+        metrics_server = await metrics.start_server(metrics_port)
+    monitor = create_task(monitor_pipeline(
+        {'vk': vk_queue, 'gpt': gpt_queue, 'write': write_queue},
+        metrics_file, METRICS_INTERVAL))
+
+    await gather(
+        run_stage(
+            [read_groups(controller, vk_queue, write_queue, vk_batch_limit)],
+            vk_queue, VK_WORKERS),
+        run_stage(
+            [fetch_groups(
+                controller, vk_queue, gpt_queue, GPT_GROUPS_LIMIT,
+                vk_batch_limit)
+             for _ in range(VK_WORKERS)],
+            gpt_queue, GPT_WORKERS),
+        run_stage(
+            [enrich_groups(controller, gpt_queue, write_queue, enrich)
+             for _ in range(GPT_WORKERS)],
+            write_queue, 1),
+        write_groups(
+            controller, write_queue, sheet_batch_limit,
+            SHEET_FLUSH_INTERVAL),
+    )
+
+    await to_thread(controller.close_sink)
+
+    monitor.cancel()
+    if metrics_file:
+        await write_metrics(metrics_file)
+    if metrics_server:
+        await metrics_server.cleanup()
+
+    if hasattr(vk_manager, 'close'):
+        await vk_manager.close()
+
+    if gpt_cache_manager:
+        logger.info(f'GPT cache statistics: {gpt_cache_manager.stats}')
 
 
 if __name__ == '__main__':
-    run(main())
+    logging.basicConfig(
+        level=LOG_LEVEL,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    vk_group_manager, table_manager, gpt_manager, cache_manager = (
+        create_managers())
+    run(main(
+        create_controller(vk_group_manager, table_manager, gpt_manager),
+        vk_group_manager, cache_manager))
@@ -1,10 +1,34 @@
 from .vk_api_manager import VKGroupManager
+from .async_vk_api_manager import AsyncVKGroupManager, VKApiError
 from .google_table_manager import GoogleTableManager
-from .chat_gpt_manager import ChatGPTManager
+from .chat_gpt_manager import ChatGPTManager, GPTApiError
+from .gpt_cache_manager import GPTCacheManager
+from .vk_rate_limiter import VKRateLimiter
+from .checkpoint_manager import CheckpointManager
+from .group_snapshot_manager import GroupSnapshotManager
+from .group_similarity_manager import GroupSimilarityManager
+from .retry_policy import RetryPolicy, VKRetryPolicy, CircuitBreaker
+from .credential_pool import CredentialPool, NoCredentialsError
+from .adaptive_limit import AdaptiveLimit, AdaptiveSemaphore
 
 __all__ = [
     'VKGroupManager',
+    'AsyncVKGroupManager',
+    'VKApiError',
     'GoogleTableManager',
     'ChatGPTManager',
+    'GPTApiError',
+    'GPTCacheManager',
+    'VKRateLimiter',
+    'CheckpointManager',
+    'GroupSnapshotManager',
+    'GroupSimilarityManager',
+    'RetryPolicy',
+    'VKRetryPolicy',
+    'CircuitBreaker',
+    'CredentialPool',
+    'NoCredentialsError',
+    'AdaptiveLimit',
+    'AdaptiveSemaphore',
 ]
 
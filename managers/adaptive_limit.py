@@ -0,0 +1,179 @@
+"""This file contains AdaptiveLimit and AdaptiveSemaphore to tune the batch
+sizes and the concurrency of the pipeline at runtime"""
+import logging
+from asyncio import Condition
+from contextlib import asynccontextmanager
+from statistics import quantiles
+from threading import Lock
+from time import monotonic
+from typing import AsyncIterator
+from constants import (
+    ADAPTIVE_WINDOW, ADAPTIVE_DECREASE_FACTOR, ADAPTIVE_THROUGHPUT_TOLERANCE)
+from metrics import metrics
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimit:
+    """The AdaptiveLimit class tunes a batch size or a concurrency limit by
+    AIMD. The calls using the limit are recorded and every window of calls
+    the limit is decreased multiplicatively if the API throttled or failed
+    the requests (the signal counters of the metrics grew) or the 95th
+    percentile of the latency exceeded the target. Otherwise the limit is
+    increased additively while the throughput holds and is stepped back only
+    when the last increase dropped the throughput (the throughput dropped
+    after a decrease means the demand fell, not the limit was too high). The
+    limit with equal bounds is fixed. The limit is thread safe"""
+    def __init__(
+            self, name: str, initial: int, min_value: int = None,
+            max_value: int = None, step: int = 1,
+            target_latency: float = None,
+            signals: list[tuple[str, dict]] = (),
+            track_throughput: bool = True,
+            window: int = ADAPTIVE_WINDOW,
+            decrease_factor: float = ADAPTIVE_DECREASE_FACTOR,
+            tolerance: float = ADAPTIVE_THROUGHPUT_TOLERANCE) -> None:
+        """Initialize the AdaptiveLimit class
+        :param name: the name of the limit used in logs and metrics
+        :param initial: the initial value of the limit
+        :param min_value: the minimum value of the limit (the initial value
+        by default)
+        :param max_value: the maximum value of the limit (the initial value
+        by default)
+        :param step: the value to add to the limit on increase
+        :param target_latency: the maximum 95th percentile of the latency of
+        the calls in seconds (None - the latency is not checked)
+        :param signals: a list of tuples with the name and the labels of the
+        counters showing throttled or failed requests
+        :param track_throughput: whether the limit is increased only while
+        the throughput grows (otherwise it's increased while there is no
+        throttling and the latency is fine)
+        :param window: the number of calls between the adjustments
+        :param decrease_factor: the factor to multiply the limit by on
+        decrease
+        :param tolerance: the relative drop of the throughput treated as
+        noise
+        """
+        self.name = name
+        self._min_value = min(initial, min_value or initial)
+        self._max_value = max(initial, max_value or initial)
+        self._value = initial
+        self._step = step
+        self._target_latency = target_latency
+        self._signals = signals
+        self._track_throughput = track_throughput
+        self._window = max(2, window)
+        self._decrease_factor = decrease_factor
+        self._tolerance = tolerance
+        self._lock = Lock()
+        self._latencies: list[float] = []
+        self._rows = 0
+        self._started_at = monotonic()
+        self._signal_total = self._get_signal_total()
+        self._last_throughput = 0.0
+        self._is_increased = False
+        metrics.set('adaptive_limit', self._value, limit=self.name)
+
+    @property
+    def value(self) -> int:
+        """This property returns the current value of the limit"""
+        return self._value
+
+    @property
+    def is_fixed(self) -> bool:
+        """This property checks if the limit can't change"""
+        return self._min_value == self._max_value
+
+    def record(self, rows: int, seconds: float) -> None:
+        """This method records a call using the limit and adjusts the limit
+        after every window of calls
+        :param rows: the number of rows processed by the call
+        :param seconds: the duration of the call
+        """
+        if self.is_fixed:
+            return
+
+        with self._lock:
+            self._rows += rows
+            self._latencies.append(seconds)
+            if len(self._latencies) >= self._window:
+                self._adjust()
+
+    def _adjust(self) -> None:
+        """This method changes the limit by the observations of the window
+        and starts the next window"""
+        throughput = self._rows / max(monotonic() - self._started_at, 1e-9)
+        latency = quantiles(self._latencies, n=20)[-1]
+        signal_total = self._get_signal_total()
+        signals = signal_total - self._signal_total
+
+        value = self._value
+        if signals:
+            value = int(value * self._decrease_factor)
+            reason = f'{signals:g} throttled or failed requests'
+        elif self._target_latency and latency > self._target_latency:
+            value = int(value * self._decrease_factor)
+            reason = (
+                f'p95 latency is above the target {self._target_latency}s')
+        elif (self._is_increased and self._track_throughput and
+              throughput < self._last_throughput * (1 - self._tolerance)):
+            value -= self._step
+            reason = 'the throughput dropped after the increase'
+        else:
+            value += self._step
+            reason = 'no throttling'
+        value = max(self._min_value, min(self._max_value, value))
+        self._is_increased = value > self._value
+
+        if value != self._value:
+            logger.info(
+                f'The {self.name} limit is changed from {self._value} to '
+                f'{value}: {reason} (throughput {throughput:.1f} rows/s, '
+                f'p95 latency {latency:.2f}s)')
+            self._value = value
+            metrics.set('adaptive_limit', value, limit=self.name)
+
+        self._latencies = []
+        self._rows = 0
+        self._started_at = monotonic()
+        self._signal_total = signal_total
+        self._last_throughput = throughput
+
+    def _get_signal_total(self) -> float:
+        """This method returns the sum of the signal counters"""
+        return sum(
+            metrics.get_total(name, **labels)
+            for name, labels in self._signals)
+
+
+class AdaptiveSemaphore:
+    """The AdaptiveSemaphore class limits the number of coroutines holding
+    it by the current value of AdaptiveLimit and records the duration of
+    each holding, so the limit is tuned by the latency of the calls made
+    inside"""
+    def __init__(self, limit: AdaptiveLimit) -> None:
+        """Initialize the AdaptiveSemaphore class
+        :param limit: an instance of AdaptiveLimit with the concurrency
+        """
+        self.limit = limit
+        self._in_flight = 0
+        self._condition = Condition()
+
+    @asynccontextmanager
+    async def hold(self) -> AsyncIterator[None]:
+        """This method waits until the number of the holders is below the
+        limit and holds the semaphore while the block is executed"""
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self._in_flight < self.limit.value)
+            self._in_flight += 1
+
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.limit.record(1, monotonic() - start)
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
@@ -0,0 +1,233 @@
+"""This file contains AsyncVKGroupManager to get data from VK API without
+blocking the event loop"""
+import logging
+from asyncio import sleep, TimeoutError
+from itertools import count
+from aiohttp import ClientSession, TCPConnector, ClientTimeout, ClientError
+from constants import (
+    MAX_GROUPS_PER_REQUEST, MAX_POST_PER_REQUEST, VK_GROUP_FIELDS,
+    GET_POST_ATTEMPTS, VK_EXECUTE_LIMIT, VK_API_URL, VK_API_VERSION,
+    VK_CONNECTION_LIMIT, VK_KEEPALIVE_TIMEOUT, VK_REQUEST_TIMEOUT,
+    VK_MAX_ATTEMPTS)
+from managers.credential_pool import CredentialPool
+from managers.retry_policy import VKRetryPolicy
+from managers.vk_rate_limiter import VKRateLimiter
+from metrics import metrics
+from utils import split_data_list, create_vk_execute_code
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class VKApiError(Exception):
+    """The exception raised when VK API returns an error"""
+    def __init__(self, code: int, message: str) -> None:
+        """Initialize the VKApiError class
+        :param code: the VK API error code
+        :param message: the VK API error message
+        """
+        super().__init__(f'[{code}] {message}')
+        self.code = code
+
+
+class AsyncVKGroupManager:
+    """The AsyncVKGroupManager class provides asynchronous access to the VK
+    API by using a pooled aiohttp session with keep-alive connections"""
+    def __init__(
+            self, vk_token: str | CredentialPool, api_url: str = VK_API_URL,
+            api_version: str = VK_API_VERSION,
+            connection_limit: int = VK_CONNECTION_LIMIT,
+            keepalive_timeout: float = VK_KEEPALIVE_TIMEOUT,
+            request_timeout: float = VK_REQUEST_TIMEOUT,
+            rate_limiter: VKRateLimiter = None) -> None:
+        """Initialize the AsyncVKGroupManager class
+        :param vk_token: The token to get access to the VK API or a
+        CredentialPool of several tokens with their own rate limiters
+        :param api_url: The base URL of the VK API methods
+        :param api_version: The version of the VK API
+        :param connection_limit: The maximum number of simultaneous
+        connections to the VK API
+        :param keepalive_timeout: The number of seconds to keep an idle
+        connection open
+        :param request_timeout: The total number of seconds for a request
+        :param rate_limiter: an instance of VKRateLimiter shared by all VK
+        API requests of the single token (a new one is created if it's not
+        provided)
+        """
+        self._tokens = vk_token if isinstance(
+            vk_token, CredentialPool) else CredentialPool(
+            'vk', [vk_token], lambda **_: rate_limiter or VKRateLimiter())
+        self._api_url = api_url
+        self._api_version = api_version
+        self._connection_limit = connection_limit
+        self._keepalive_timeout = keepalive_timeout
+        self._request_timeout = request_timeout
+        self._session: ClientSession | None = None
+
+    def _get_session(self) -> ClientSession:
+        """This method returns the aiohttp session creating it on the first
+        call (the session has to be created inside the running event loop)
+        :return: a ClientSession instance
+        """
+        if self._session is None or self._session.closed:
+            connector = TCPConnector(
+                limit=self._connection_limit,
+                keepalive_timeout=self._keepalive_timeout)
+            self._session = ClientSession(
+                connector=connector,
+                timeout=ClientTimeout(total=self._request_timeout))
+
+        return self._session
+
+    async def close(self) -> None:
+        """This method closes the aiohttp session and its connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def method(
+            self, method: str, values: dict = None,
+            max_attempts: int = VK_MAX_ATTEMPTS) -> dict | list:
+        """This method calls the VK API method within the rate limit of the
+        token picked from the pool. The errors are handled by VKRetryPolicy
+        :param method: the name of the VK API method (for instance
+        groups.getById)
+        :param values: a dictionary with parameters of the method
+        :param max_attempts: the maximum number of attempts
+        :return: the response of the VK API method
+        """
+        retry_policy = VKRetryPolicy(self._tokens, method, max_attempts)
+        for attempt in count():
+            token, wait = self._tokens.acquire()
+            await sleep(wait)
+            with metrics.track_request('vk', method) as request:
+                try:
+                    response = await self._request(method, values, token.value)
+                    self._tokens.on_success(token)
+                    return response
+
+                except VKApiError as e:
+                    delay = retry_policy.on_error(
+                        attempt, token, request, e, e.code)
+
+                except (ClientError, TimeoutError) as e:
+                    delay = retry_policy.on_error(attempt, token, request, e)
+
+            await sleep(delay)
+
+    async def _request(
+            self, method: str, values: dict, token: str) -> dict | list:
+        """This method sends a single request to the VK API method
+        :param method: the name of the VK API method
+        :param values: a dictionary with parameters of the method
+        :param token: the token to send the request with
+        :return: the response of the VK API method
+        """
+        params = dict(values or {})
+        params.update(access_token=token, v=self._api_version)
+
+        async with self._get_session().post(
+                f'{self._api_url}{method}', data=params) as response:
+            response.raise_for_status()
+            data = await response.json()
+
+        if 'error' in data:
+            raise VKApiError(
+                data['error'].get('error_code'),
+                data['error'].get('error_msg'))
+
+        return data['response']
+
+    async def get_groups_by_ids(
+            self, group_ids: list[str],
+            fields: list[str] = VK_GROUP_FIELDS,
+            max_per_request: int = MAX_GROUPS_PER_REQUEST
+    ) -> list[dict]:
+        """This method returns a list of groups data from VK API found by its
+        ids
+        :param group_ids: a list of group ids
+        :param fields: a list of fields of groups to return
+        :param max_per_request: an integer representing the maximum number of
+        groups per single request
+        :return: a list of dictionaries containing groups data
+        """
+        result = []
+        for ids in split_data_list(list(group_ids), max_per_request):
+            response = await self.method(
+                'groups.getById', values={
+                    'fields': ','.join(fields),
+                    'group_ids': ','.join(ids)
+                })
+            result.extend(response)
+
+        return result
+
+    async def get_post_text_by_group_id(
+            self, group_id: str | int, count: int = 1
+    ) -> list[dict] | None:
+        """This method returns a list of dictionaries representing the posts
+        of provided certain group
+        :param group_id: a string or integer representing the group id
+        :param count: an integer representing the number of posts to return
+        :return: a list of dictionaries representing the posts or None if
+        the posts were not received
+        """
+        try:
+            posts_data = await self.method(
+                'wall.get', values={
+                    'owner_id': f'-{group_id}',
+                    'filter': 'owner',
+                    'count': count,
+                }, max_attempts=GET_POST_ATTEMPTS)
+            return posts_data['items']
+
+        except Exception as e:
+            logger.warning(f'Failed to get post data from VK API, error: {e}')
+
+    async def get_first_posts_by_group_ids(
+            self, group_ids: list[str | int], count: int = 1,
+            max_per_request: int = VK_EXECUTE_LIMIT
+    ) -> dict[int, list[dict]]:
+        """This method returns the first posts of the provided groups. The
+        wall.get calls are sent in bulk by the execute method (up to
+        VK_EXECUTE_LIMIT calls per request) and the results are mapped back
+        to the groups by the owner_id of the posts
+        :param group_ids: a list of strings or integers representing the
+        group ids
+        :param count: an integer representing the number of posts to return
+        for each group
+        :param max_per_request: the maximum number of wall.get calls in a
+        single execute request
+        :return: a dictionary with group ids as keys and lists of
+        dictionaries representing the posts as values (the groups with empty
+        walls or failed calls are missing)
+        """
+        posts = {}
+        for ids in split_data_list(list(group_ids), max_per_request):
+            code = create_vk_execute_code('wall.get', [
+                {'owner_id': -int(group_id), 'filter': 'owner', 'count': count}
+                for group_id in ids])
+            response = await self.method('execute', values={'code': code})
+
+            for posts_data in response:
+                if not posts_data or not posts_data.get('items'):
+                    continue
+                items = posts_data['items']
+                posts[-items[0]['owner_id']] = items
+
+        return posts
+
+    async def get_fixed_posts(self, post_ids: list[str]) -> list[dict]:
+        """This method returns a list of dictionaries representing the fixed
+        posts found by its ids
+        :param post_ids: a list of strings representing the post ids
+        :return: a list of dictionaries representing the fixed posts
+        """
+        fixed_posts = []
+        for row in split_data_list(list(post_ids), MAX_POST_PER_REQUEST):
+            response = await self.method(
+                'wall.getById', values={
+                    'posts': ','.join(row)
+                })
+            fixed_posts.extend(response)
+
+        return fixed_posts
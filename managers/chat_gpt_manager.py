@@ -1,42 +1,342 @@
 """This file contains ChatGPTManager to get data from OpenAI API"""
+import logging
+from asyncio import sleep
+from time import monotonic
 import openai
+from openai.error import (
+    OpenAIError, APIError, APIConnectionError, RateLimitError, Timeout,
+    ServiceUnavailableError, TryAgain, AuthenticationError, PermissionError)
+from constants import (
+    GPT_REQUEST_TIMEOUT, GPT_SCORE_MAX_TOKENS, GPT_SCORE_TEMPERATURE,
+    GPT_SCORE_LOGIT_BIAS, GPT_SCORE_STREAM)
+from managers.credential_pool import (
+    Credential, CredentialPool, NoCredentialsError)
+from managers.gpt_cache_manager import GPTCacheManager
+from managers.retry_policy import (
+    RetryPolicy, CircuitBreaker, DeadlineExceededError)
+from metrics import metrics
+from utils import is_score_answered
 # -------------------------------------------------------------------------
 
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (
+    APIError, APIConnectionError, RateLimitError, Timeout,
+    ServiceUnavailableError, TryAgain)
+
+
+class GPTApiError(Exception):
+    """The exception raised when the completion can't be created: the error
+    is permanent, the attempts are exhausted or the deadline is passed"""
+
 
 class ChatGPTManager:
     """The ChatGPTManager class provides access to the OpenAI API"""
     def __init__(
-            self, api_key: str, gpt_model: str, api_url: str = None) -> None:
+            self, api_key: str | CredentialPool, gpt_model: str,
+            api_url: str = None,
+            cache: GPTCacheManager = None, retry_policy: RetryPolicy = None,
+            circuit_breaker: CircuitBreaker = None,
+            request_timeout: float = GPT_REQUEST_TIMEOUT,
+            score_params: dict = None,
+            stream_scores: bool = GPT_SCORE_STREAM) -> None:
         """Initialize the ChatGPTManager class
         :param api_key: The OpenAI secret key to get access to the OpenAI API
+        or a CredentialPool of several keys to spread the requests over
         :param gpt_model: The name of the neuro model to work with
+        :param cache: an instance of GPTCacheManager to store the answers in
+        (the answers are not cached if it's not provided)
+        :param retry_policy: an instance of RetryPolicy to retry the failed
+        requests (a default one is created if it's not provided)
+        :param circuit_breaker: an instance of CircuitBreaker shared by all
+        the requests (a default one is created if it's not provided)
+        :param request_timeout: the timeout of a single request in seconds
+        :param score_params: the parameters of the requests for a single
+        score such as max_tokens, temperature and logit_bias (created from
+        the GPT_SCORE_* settings if it's not provided)
+        :param stream_scores: whether to stream the answers for a single
+        score and to stop reading as soon as the number is received
         """
-        self._init_api(api_key, api_url)
+        self._init_api(api_url)
+        self._keys = api_key if isinstance(
+            api_key, CredentialPool) else CredentialPool('openai', [api_key])
         self._model = gpt_model
+        self._cache = cache
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._breaker = circuit_breaker or CircuitBreaker('openai')
+        self._request_timeout = request_timeout
+        self._stream_scores = stream_scores
+        self._score_params = score_params or {
+            'max_tokens': GPT_SCORE_MAX_TOKENS,
+            'temperature': GPT_SCORE_TEMPERATURE}
+        if score_params is None and GPT_SCORE_LOGIT_BIAS:
+            self._score_params['logit_bias'] = GPT_SCORE_LOGIT_BIAS
 
     @staticmethod
-    def _init_api(api_key: str, api_url: str) -> None:
-        """This method provides access to the OpenAI API
-        :param api_key: The OpenAI secret key
+    def _init_api(api_url: str) -> None:
+        """This method provides access to the OpenAI API (the key is sent
+        with each request)
+        :param api_url: The base URL of the OpenAI API
         """
-        openai.api_key = api_key
         if api_url:
             openai.api_base = api_url
 
     async def get_completion(
-            self, messages: list[dict]) -> str | None:
+            self, messages: list[dict], deadline: float = None,
+            is_score: bool = False) -> str | None:
         """This method serves to prepare provided request by GPT chat model
-        and to return requested data
+        and to return requested data. The requests are spread over the keys
+        of the pool: the throttled key is sidelined and the invalid one is
+        dropped. The request failed by the invalid key is retried with
+        another valid key (waiting for it if it's sidelined), the throttled
+        one - with another key at once if there is one available (it's
+        backed off otherwise). The other transient errors are retried with
+        exponential backoff honoring Retry-After of the API, the requests are
+        paused while the circuit breaker is open
+        :param messages: a list of dictionaries with GPT roles and content
+        :param deadline: the monotonic time the completion has to be created
+        by (None - there is no deadline)
+        :param is_score: whether the answer is a single score, such requests
+        are sent with the score parameters (a couple of tokens, zero
+        temperature) and are streamed until the number is received
+        :return: the string representing the requested data
+        :raises GPTApiError: if the error is permanent, the attempts are
+        exhausted or the deadline is passed
+        """
+        params = self._score_params if is_score else {}
+        cache_key = None
+        if self._cache:
+            cache_key = self._cache.create_key(
+                self._model, messages, **params)
+            cached_response = self._cache.get(cache_key)
+            metrics.inc(
+                'gpt_cache_requests_total',
+                result='miss' if cached_response is None else 'hit')
+            if cached_response is not None:
+                return cached_response
+
+        attempt = 0
+        while True:
+            try:
+                await self._breaker.wait(deadline)
+                key = await self._acquire_key(deadline)
+                if is_score and self._stream_scores:
+                    response = await self._stream_score(
+                        messages, key.value, params, deadline)
+                else:
+                    response = await self._create_completion(
+                        messages, key.value, params, deadline)
+                self._keys.on_success(key)
+                self._breaker.on_success()
+                break
+
+            except (DeadlineExceededError, NoCredentialsError) as e:
+                raise GPTApiError(str(e)) from e
+
+            except OpenAIError as e:
+                retry_after = self._get_retry_after(e)
+                delay = self._retry_policy.get_delay(attempt, retry_after)
+                is_key_error = self._is_key_error(e)
+                if is_key_error:
+                    self._keys.on_invalid(key)
+                elif isinstance(e, RateLimitError):
+                    # the key is sidelined for the backoff delay when the
+                    # API doesn't send Retry-After, so the request is
+                    # retried at once only if another key can be used now
+                    self._keys.on_throttle(key, retry_after or delay)
+
+                # the invalid key is replaced by any valid one (the request
+                # waits for it in _acquire_key if it's sidelined), the
+                # throttled key only by the one available right now
+                if ((is_key_error and self._keys.has_valid) or
+                        (isinstance(e, RateLimitError) and
+                         self._keys.has_available)):
+                    self._breaker.on_failure(False)
+                    delay = 0.0
+                else:
+                    is_transient = self._is_transient(e)
+                    self._breaker.on_failure(is_transient, retry_after)
+                    if not is_transient:
+                        raise GPTApiError(
+                            f'Failed to create completion, the error is '
+                            f'{e!r}') from e
+
+                if not self._retry_policy.can_retry(attempt, delay, deadline):
+                    raise GPTApiError(
+                        f'Failed to create completion in {attempt + 1} '
+                        f'attempts, the last error is {e!r}') from e
+                error = e
+
+            logger.warning(
+                f'Failed to create completion, the error is {error!r}. '
+                f'Retrying in {delay:.1f} seconds')
+            metrics.inc(
+                'api_retries_total', api='openai', method='chat.completions')
+            attempt += 1
+            await sleep(delay)
+
+        if cache_key and response is not None:
+            self._cache.set(cache_key, response)
+
+        return response
+
+    async def _acquire_key(self, deadline: float = None) -> Credential:
+        """This method picks the key for the next request waiting until it's
+        not sidelined
+        :param deadline: the monotonic time the completion has to be created
+        by (None - there is no deadline)
+        :return: the key picked from the pool
+        """
+        key, wait = self._keys.acquire()
+        if wait:
+            if deadline is not None and monotonic() + wait >= deadline:
+                raise DeadlineExceededError(
+                    'All the OpenAI keys are sidelined longer than the '
+                    'deadline of the request')
+            await sleep(wait)
+
+        return key
+
+    async def _create_completion(
+            self, messages: list[dict], api_key: str, params: dict,
+            deadline: float = None) -> str | None:
+        """This method sends a single request to the OpenAI API
         :param messages: a list of dictionaries with GPT roles and content
-        :return: the string representing the requested data or None if there
-        was any error during the processing of the request
+        :param api_key: the OpenAI secret key to send the request with
+        :param params: additional parameters of the request
+        :param deadline: the monotonic time the completion has to be created
+        by (None - there is no deadline)
+        :return: the content of the answer
+        """
+        with metrics.track_request('openai', 'chat.completions') as request:
+            try:
+                completion = await openai.ChatCompletion.acreate(
+                    model=self._model,
+                    messages=messages,
+                    api_key=api_key,
+                    request_timeout=self._get_timeout(deadline),
+                    **params,
+                )
+            except RateLimitError:
+                request['status'] = 'throttled'
+                raise
+
+        usage = completion.get('usage') or {}
+        for token_type in ('prompt_tokens', 'completion_tokens'):
+            metrics.inc(
+                'gpt_tokens_total', usage.get(token_type, 0), type=token_type)
+
+        return completion.choices[0].message.content
+
+    async def _stream_score(
+            self, messages: list[dict], api_key: str, params: dict,
+            deadline: float = None) -> str:
+        """This method streams the answer for a single score and stops
+        reading it as soon as it starts with a complete number
+        :param messages: a list of dictionaries with GPT roles and content
+        :param api_key: the OpenAI secret key to send the request with
+        :param params: additional parameters of the request
+        :param deadline: the monotonic time the completion has to be created
+        by (None - there is no deadline)
+        :return: the content of the answer received so far
+        """
+        content = ''
+        with metrics.track_request('openai', 'chat.completions') as request:
+            try:
+                chunks = await openai.ChatCompletion.acreate(
+                    model=self._model,
+                    messages=messages,
+                    api_key=api_key,
+                    request_timeout=self._get_timeout(deadline),
+                    stream=True,
+                    **params,
+                )
+            except RateLimitError:
+                request['status'] = 'throttled'
+                raise
+
+            try:
+                async for chunk in chunks:
+                    delta = chunk.choices[0].delta.get('content')
+                    if not delta:
+                        continue
+                    content += delta
+                    metrics.inc('gpt_tokens_total', type='completion_tokens')
+                    if is_score_answered(content):
+                        metrics.inc('gpt_stream_early_stops_total')
+                        break
+            finally:
+                await chunks.aclose()
+
+        return content
+
+    def _get_timeout(self, deadline: float = None) -> float:
+        """This method returns the timeout of the request which never exceeds
+        the time left to the deadline
+        :param deadline: the monotonic time the completion has to be created
+        by (None - there is no deadline)
+        :return: the timeout in seconds
+        """
+        if deadline is None:
+            return self._request_timeout
+
+        timeout = min(self._request_timeout, deadline - monotonic())
+        if timeout <= 0:
+            raise DeadlineExceededError(
+                'The deadline of the completion is passed')
+
+        return timeout
+
+    @staticmethod
+    def _is_key_error(error: OpenAIError) -> bool:
+        """This method checks if the request failed because of the key: it's
+        revoked, has no access to the model or its quota is exhausted
+        :param error: the error of the OpenAI API
+        :return: True if the key can't be used anymore and False otherwise
+        """
+        if isinstance(error, RateLimitError):
+            return getattr(error.error, 'code', None) == 'insufficient_quota'
+
+        return isinstance(error, (AuthenticationError, PermissionError))
+
+    @staticmethod
+    def _is_transient(error: OpenAIError) -> bool:
+        """This method checks if the request failed by the error can succeed
+        when it's retried later. The exhausted quota is reported as the rate
+        limit error but it's permanent
+        :param error: the error of the OpenAI API
+        :return: True if the error is transient and False otherwise
+        """
+        if isinstance(error, RateLimitError):
+            return getattr(error.error, 'code', None) != 'insufficient_quota'
+        if error.http_status in (408, 409, 429) or (
+                error.http_status or 500) >= 500:
+            return isinstance(error, TRANSIENT_ERRORS)
+
+        return False
+
+    @staticmethod
+    def _get_retry_after(error: OpenAIError) -> float | None:
+        """This method returns the number of seconds the API asked to wait
+        before the next request
+        :param error: the error of the OpenAI API
+        :return: the number of seconds from the Retry-After header or None
+        if there is no such header
         """
         try:
-            completion = await openai.ChatCompletion.acreate(
-                model=self._model,
-                messages=messages,
-            )
-            return completion.choices[0].message.content
-
-        except Exception as e:
-            print(f"Failed to create completion, the error is {e}")
\ No newline at end of file
+            return max(0.0, float(error.headers.get('retry-after')))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def discard_completion(
+            self, messages: list[dict], is_score: bool = False) -> None:
+        """This method removes the cached answer to the provided messages.
+        It should be called when the answer failed validation so the next
+        attempt gets a new answer from GPT chat
+        :param messages: a list of dictionaries with GPT roles and content
+        :param is_score: whether the answer was requested as a single score
+        """
+        if self._cache:
+            params = self._score_params if is_score else {}
+            self._cache.delete(
+                self._cache.create_key(self._model, messages, **params))
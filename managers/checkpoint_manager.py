@@ -0,0 +1,50 @@
+"""This file contains CheckpointManager to store the progress of the parsing
+in a local file"""
+import json
+import logging
+import os
+# -------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointManager:
+    """The CheckpointManager class provides access to the local checkpoint
+    file. The file is replaced atomically so it always contains either the
+    previous or the new checkpoint even if the application crashes"""
+    def __init__(self, checkpoint_file: str) -> None:
+        """Initialize the CheckpointManager class
+        :param checkpoint_file: The path to the checkpoint file
+        """
+        self._file = checkpoint_file
+
+    def load(self) -> dict:
+        """This method returns the saved checkpoint
+        :return: a dictionary with checkpoint data or an empty dictionary if
+        there is no checkpoint yet
+        """
+        try:
+            with open(self._file, encoding='utf-8') as file:
+                return json.load(file)
+
+        except FileNotFoundError:
+            return {}
+
+        except (OSError, ValueError) as e:
+            logger.error(f'Unable to load the checkpoint, the error: {e}')
+            return {}
+
+    def save(self, data: dict) -> None:
+        """This method saves the checkpoint to the file
+        :param data: a dictionary with checkpoint data
+        """
+        temp_file = f'{self._file}.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_file, self._file)
+
+        except OSError as e:
+            logger.error(f'Unable to save the checkpoint, the error: {e}')
@@ -0,0 +1,165 @@
+"""This file contains CredentialPool to spread the requests to the external
+APIs over several API keys or tokens"""
+import logging
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic
+from typing import Callable
+from managers.vk_rate_limiter import VKRateLimiter
+from metrics import metrics
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class NoCredentialsError(Exception):
+    """The exception raised when all the credentials of the pool are
+    invalid"""
+
+
+@dataclass(slots=True)
+class Credential:
+    """The Credential class represents a single API key or token of the pool.
+    The name is used in logs and metrics instead of the secret value"""
+    value: str
+    name: str
+    limiter: VKRateLimiter | None = None
+    sidelined_until: float = 0.0
+    last_used: float = 0.0
+    is_invalid: bool = False
+
+
+class CredentialPool:
+    """The CredentialPool class distributes the requests over the credentials
+    picking the one that can send the request the earliest. Each credential
+    can have its own rate limiter. The throttled credentials are slowed down
+    or sidelined for a while and the invalid ones are never used again. The
+    pool is thread safe so it can be shared by threads and coroutines"""
+    def __init__(
+            self, api: str, secrets: list[str],
+            limiter_factory: Callable[..., VKRateLimiter] = None) -> None:
+        """Initialize the CredentialPool class
+        :param api: the name of the API used in logs and metrics
+        :param secrets: a list of API keys or tokens (the duplicates are
+        dropped)
+        :param limiter_factory: a callable creating a rate limiter for each
+        credential by its name (the credentials are not rate limited if it's
+        not provided)
+        """
+        secrets = list(dict.fromkeys(secret for secret in secrets if secret))
+        if not secrets:
+            raise ValueError(f'No credentials are provided for {api}')
+
+        self._api = api
+        self._credentials = []
+        for num, secret in enumerate(secrets, 1):
+            name = f'{api}-{num}'
+            self._credentials.append(Credential(
+                secret, name,
+                limiter_factory(name=name) if limiter_factory else None))
+        self._lock = Lock()
+        self._update_metrics()
+
+    def __len__(self) -> int:
+        """This method returns the number of credentials in the pool"""
+        return len(self._credentials)
+
+    @property
+    def has_valid(self) -> bool:
+        """This property checks if any credential is still valid"""
+        return any(
+            not credential.is_invalid for credential in self._credentials)
+
+    @property
+    def has_available(self) -> bool:
+        """This property checks if any credential can be used right now"""
+        now = monotonic()
+        return any(
+            not credential.is_invalid and credential.sidelined_until <= now
+            for credential in self._credentials)
+
+    def acquire(self) -> tuple[Credential, float]:
+        """This method picks the credential for the next request and reserves
+        a slot of its rate limiter
+        :return: a tuple with the credential and the number of seconds to
+        wait before sending the request
+        :raises NoCredentialsError: if all the credentials are invalid
+        """
+        with self._lock:
+            now = monotonic()
+            valid = [
+                credential for credential in self._credentials
+                if not credential.is_invalid]
+            if not valid:
+                raise NoCredentialsError(
+                    f'All the {self._api} credentials are invalid')
+
+            credential = min(valid, key=lambda item: (
+                max(item.sidelined_until - now,
+                    item.limiter.get_wait() if item.limiter else 0.0),
+                item.last_used))
+            credential.last_used = now
+            wait = credential.sidelined_until - now
+            if credential.limiter:
+                wait = max(wait, credential.limiter.reserve())
+
+        metrics.inc(
+            'credential_requests_total', api=self._api,
+            credential=credential.name)
+        return credential, max(0.0, wait)
+
+    def on_success(self, credential: Credential) -> None:
+        """This method registers the successful request of the credential
+        :param credential: the credential used for the request
+        """
+        if credential.limiter:
+            credential.limiter.on_success()
+
+    def on_throttle(
+            self, credential: Credential, sideline_time: float = None
+    ) -> None:
+        """This method slows down the rate of the throttled credential and
+        sidelines it if the time is provided
+        :param credential: the credential used for the request
+        :param sideline_time: the number of seconds the credential must not
+        be used for (for instance Retry-After sent by the API)
+        """
+        metrics.inc(
+            'credential_throttles_total', api=self._api,
+            credential=credential.name)
+        if credential.limiter:
+            credential.limiter.on_throttle()
+        if sideline_time:
+            self._sideline(credential, sideline_time)
+
+    def on_invalid(self, credential: Credential) -> None:
+        """This method removes the invalid credential (revoked, without
+        access or with exhausted quota) from the rotation
+        :param credential: the credential used for the request
+        """
+        with self._lock:
+            if credential.is_invalid:
+                return
+            credential.is_invalid = True
+        logger.error(
+            f'The credential {credential.name} is invalid and is not used '
+            f'anymore')
+        self._update_metrics()
+
+    def _sideline(self, credential: Credential, seconds: float) -> None:
+        """This method stops using the credential for a while
+        :param credential: the credential to sideline
+        :param seconds: the number of seconds to sideline the credential for
+        """
+        with self._lock:
+            credential.sidelined_until = max(
+                credential.sidelined_until, monotonic() + seconds)
+        logger.warning(
+            f'The credential {credential.name} is throttled and sidelined '
+            f'for {seconds:.1f} seconds')
+
+    def _update_metrics(self) -> None:
+        """This method updates the number of valid credentials"""
+        metrics.set('credentials_valid', sum(
+            not credential.is_invalid for credential in self._credentials),
+            api=self._api)
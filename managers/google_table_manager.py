@@ -1,10 +1,15 @@
 """This file contains a GoogleTableManager implementation to work with Google
  spreadsheets"""
+import logging
 import gspread
-from gspread import Spreadsheet
+from gspread import Spreadsheet, Worksheet
+from gspread.utils import absolute_range_name
 from constants import PARSE_SHEET, URL_COLUMN
+from metrics import metrics
 # -------------------------------------------------------------------------
 
+logger = logging.getLogger(__name__)
+
 
 class GoogleTableManager:
     """This class provides functionality to work with Google Spreadsheets"""
@@ -15,6 +20,7 @@ class GoogleTableManager:
         """
         self._connection = gspread.service_account(auth_file)
         self._table = self._open_table(table_name)
+        self._worksheets: dict[str, Worksheet] = {}
 
     def _open_table(self, table_name: str) -> Spreadsheet:
         """This closed method serves to open the Google table
@@ -25,7 +31,30 @@ class GoogleTableManager:
             table = self._connection.open(table_name)
             return table
         except gspread.GSpreadException as e:
-            print(f"Unable to open table, the error: {e}")
+            logger.error(f"Unable to open table, the error: {e}")
+
+    def _get_worksheet(self, sheet_name: str) -> Worksheet:
+        """This closed method returns the worksheet by its name. The
+        worksheets are cached to avoid requesting the table metadata before
+        every read or write
+        :param sheet_name: The name of the Google sheet
+        :return: A Worksheet object
+        """
+        if sheet_name not in self._worksheets:
+            self._worksheets[sheet_name] = self._table.worksheet(sheet_name)
+
+        return self._worksheets[sheet_name]
+
+    def get_row_count(self, sheet_name: str = PARSE_SHEET) -> int | None:
+        """This method returns the number of rows in the sheet
+        :param sheet_name: The name of the Google sheet
+        :return: The number of rows or None if there was any error
+        """
+        try:
+            return self._get_worksheet(sheet_name).row_count
+
+        except gspread.GSpreadException as e:
+            logger.error(f"Unable to get the number of rows, the error: {e}")
 
     def get_by_column(
             self, sheet_name: str = PARSE_SHEET, col_num: int = URL_COLUMN
@@ -36,10 +65,32 @@ class GoogleTableManager:
         :return: A list of lists representing the columns of the Google sheet
         """
         try:
-            result = self._table.worksheet(sheet_name).col_values(col_num)
+            with metrics.track_request('sheets', 'values.get'):
+                result = self._get_worksheet(sheet_name).col_values(col_num)
+
+        except gspread.GSpreadException as e:
+            logger.error(f"Unable to get column value, the error: {e}")
+            result = None
+
+        return result
+
+    def get_ranges(
+            self, ranges: list[str], sheet_name: str = PARSE_SHEET
+    ) -> list[list[list[str]]] | None:
+        """This method returns the values of several ranges of the sheet by a
+        single request
+        :param ranges: a list of ranges to get (for example
+        ['B2:B1001', 'Q2:S1001'])
+        :param sheet_name: The name of the Google sheet
+        :return: A list with the rows of each range (the trailing empty
+        cells and rows are omitted by Google API)
+        """
+        try:
+            with metrics.track_request('sheets', 'values.batchGet'):
+                result = self._get_worksheet(sheet_name).batch_get(ranges)
 
         except gspread.GSpreadException as e:
-            print(f"Unable to get column value, the error: {e}")
+            logger.error(f"Unable to get ranges, the error: {e}")
             result = None
 
         return result
@@ -54,7 +105,34 @@ class GoogleTableManager:
         :param data: The data to upload
         """
         try:
-            self._table.worksheet(sheet_name).update(col_range, data)
+            with metrics.track_request('sheets', 'values.update'):
+                self._get_worksheet(sheet_name).update(col_range, data)
+
+        except gspread.GSpreadException as e:
+            logger.error(f"Unable to upload data, the error: {e}")
+
+    def batch_upload_to_sheet(
+            self, data: list[tuple[str, list[list]]],
+            sheet_name: str = PARSE_SHEET) -> bool:
+        """This method uploads the data to several ranges of the chosen Google
+        sheet by a single request
+        :param data: a list of tuples with the range of columns (for example
+        A2:B10) and the data to upload to this range
+        :param sheet_name: The name of the Google sheet
+        :return: True if the data was uploaded and False otherwise
+        """
+        body = {
+            'valueInputOption': 'RAW',
+            'data': [
+                {'range': absolute_range_name(sheet_name, col_range),
+                 'values': values}
+                for col_range, values in data]
+        }
+        try:
+            with metrics.track_request('sheets', 'values.batchUpdate'):
+                self._table.values_batch_update(body=body)
+            return True
 
         except gspread.GSpreadException as e:
-            print(f"Unable to upload data, the error: {e}")
+            logger.error(f"Unable to upload data, the error: {e}")
+            return False
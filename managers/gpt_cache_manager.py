@@ -0,0 +1,135 @@
+"""This file contains GPTCacheManager to store GPT chat answers on disk"""
+import hashlib
+import json
+import sqlite3
+from time import time
+from constants import GPT_CACHE_TTL, GPT_CACHE_MAX_ENTRIES
+# -------------------------------------------------------------------------
+
+
+class GPTCacheManager:
+    """The GPTCacheManager class provides a persistent SQLite cache of GPT
+    chat answers. The answers are keyed by a hash of the model, messages and
+    request parameters, expire after the TTL and the least recently used
+    answers are evicted when the cache exceeds the maximum size"""
+    def __init__(
+            self, db_file: str, ttl: float | None = GPT_CACHE_TTL,
+            max_entries: int = GPT_CACHE_MAX_ENTRIES) -> None:
+        """Initialize the GPTCacheManager class
+        :param db_file: The path to the SQLite file to store the answers in
+        :param ttl: The number of seconds the answer is valid for (None means
+        the answers never expire)
+        :param max_entries: The maximum number of answers to store
+        """
+        self._connection = sqlite3.connect(db_file, isolation_level=None)
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._init_db()
+        self._size = self._connection.execute(
+            'SELECT COUNT(*) FROM gpt_cache').fetchone()[0]
+
+    def _init_db(self) -> None:
+        """This method creates the cache table if it doesn't exist"""
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS gpt_cache ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS gpt_cache_accessed_at '
+            'ON gpt_cache (accessed_at)')
+
+    @staticmethod
+    def create_key(model: str, messages: list[dict], **params) -> str:
+        """This method creates a key of the cache entry
+        :param model: The name of the neuro model
+        :param messages: a list of dictionaries with GPT roles and content
+        :param params: additional parameters of the request affecting the
+        answer such as temperature or max_tokens
+        :return: a string representing the SHA-256 hash of the request
+        """
+        data = json.dumps(
+            {'model': model, 'messages': messages, 'params': params},
+            ensure_ascii=False, sort_keys=True)
+
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """This method returns the cached answer found by its key
+        :param key: a string representing the key of the answer
+        :return: the cached answer or None if it is missing or expired
+        """
+        row = self._connection.execute(
+            'SELECT response, created_at FROM gpt_cache WHERE key = ?',
+            (key,)).fetchone()
+        now = time()
+
+        if row is None or self._is_expired(row[1], now):
+            self.misses += 1
+            return None
+
+        self._connection.execute(
+            'UPDATE gpt_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        self.hits += 1
+
+        return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        """This method saves the answer to the cache evicting the least
+        recently used answers if the cache is full
+        :param key: a string representing the key of the answer
+        :param response: the answer to save
+        """
+        now = time()
+        is_new = self._connection.execute(
+            'SELECT 1 FROM gpt_cache WHERE key = ?', (key,)).fetchone() is None
+        self._connection.execute(
+            'INSERT OR REPLACE INTO gpt_cache VALUES (?, ?, ?, ?)',
+            (key, response, now, now))
+        self._size += is_new
+
+        if self._size > self._max_entries:
+            self._evict(now)
+
+    def delete(self, key: str) -> None:
+        """This method removes the answer from the cache
+        :param key: a string representing the key of the answer
+        """
+        cursor = self._connection.execute(
+            'DELETE FROM gpt_cache WHERE key = ?', (key,))
+        self._size -= cursor.rowcount
+
+    def _evict(self, now: float) -> None:
+        """This method removes expired answers and then the least recently
+        used ones until the cache fits the maximum size
+        :param now: the current timestamp
+        """
+        if self._ttl is not None:
+            cursor = self._connection.execute(
+                'DELETE FROM gpt_cache WHERE created_at < ?',
+                (now - self._ttl,))
+            self._size -= cursor.rowcount
+
+        excess = self._size - self._max_entries
+        if excess > 0:
+            cursor = self._connection.execute(
+                'DELETE FROM gpt_cache WHERE key IN (SELECT key FROM gpt_cache '
+                'ORDER BY accessed_at LIMIT ?)', (excess,))
+            self._size -= cursor.rowcount
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        """This method checks if the answer is expired
+        :param created_at: the timestamp the answer was saved at
+        :param now: the current timestamp
+        :return: True if the answer is expired and False otherwise
+        """
+        return self._ttl is not None and created_at < now - self._ttl
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """This property returns the cache statistics
+        :return: a dictionary with hits, misses and size of the cache
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': self._size}
@@ -0,0 +1,106 @@
+"""This file contains GroupSimilarityManager to store the LSH index of VK
+group signatures in a local SQLite file"""
+import json
+import sqlite3
+from typing import Iterable
+# -------------------------------------------------------------------------
+
+
+class GroupSimilarityManager:
+    """The GroupSimilarityManager class provides access to the local SQLite
+    index of the enriched VK groups: their MinHash signatures, enrichment and
+    LSH band keys. The index is kept on disk, so its size doesn't affect the
+    memory of the application"""
+    def __init__(self, db_file: str) -> None:
+        """Initialize the GroupSimilarityManager class
+        :param db_file: The path to the SQLite file to store the index in
+        """
+        self._connection = sqlite3.connect(db_file, isolation_level=None)
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """This method creates the index tables if they don't exist"""
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS group_signatures ('
+            'id TEXT PRIMARY KEY, signature BLOB NOT NULL, '
+            'enrichment TEXT NOT NULL)')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS group_bands ('
+            'band_key INTEGER NOT NULL, id TEXT NOT NULL, '
+            'PRIMARY KEY (band_key, id)) WITHOUT ROWID')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS group_bands_id ON group_bands (id)')
+
+    def is_empty(self) -> bool:
+        """This method checks if there are no groups in the index"""
+        return self._connection.execute(
+            'SELECT 1 FROM group_signatures LIMIT 1').fetchone() is None
+
+    def get_candidates(self, band_keys: Iterable[int]) -> dict[int, set[str]]:
+        """This method returns the groups sharing the provided band keys
+        :param band_keys: the LSH band keys
+        :return: a dictionary with band keys as keys and sets of group ids as
+        values (the keys without groups are missing)
+        """
+        band_keys = list(set(band_keys))
+        candidates = {}
+        for start in range(0, len(band_keys), 500):
+            part = band_keys[start:start + 500]
+            rows = self._connection.execute(
+                f'SELECT band_key, id FROM group_bands '
+                f'WHERE band_key IN ({",".join("?" * len(part))})', part)
+
+            for band_key, group_id in rows:
+                candidates.setdefault(band_key, set()).add(group_id)
+
+        return candidates
+
+    def get_signatures(
+            self, group_ids: Iterable[str]) -> dict[str, tuple[bytes, dict]]:
+        """This method returns the signatures and enrichment of the groups
+        :param group_ids: the ids of the groups
+        :return: a dictionary with group ids as keys and tuples with the
+        signature and the enrichment as values
+        """
+        group_ids = list(set(group_ids))
+        signatures = {}
+        for start in range(0, len(group_ids), 500):
+            part = group_ids[start:start + 500]
+            rows = self._connection.execute(
+                f'SELECT id, signature, enrichment FROM group_signatures '
+                f'WHERE id IN ({",".join("?" * len(part))})', part)
+
+            for group_id, signature, enrichment in rows:
+                signatures[group_id] = (signature, json.loads(enrichment))
+
+        return signatures
+
+    def save_signatures(
+            self, signatures: list[tuple[str, bytes, dict, list[int]]]
+    ) -> None:
+        """This method saves the groups replacing their previous signatures
+        :param signatures: a list of tuples with group id, its signature,
+        enrichment and LSH band keys
+        """
+        group_ids = [(group_id, ) for group_id, *_ in signatures]
+        self._connection.execute('BEGIN')
+        try:
+            self._connection.executemany(
+                'DELETE FROM group_bands WHERE id = ?', group_ids)
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO group_signatures '
+                '(id, signature, enrichment) VALUES (?, ?, ?)',
+                [(group_id, signature, json.dumps(
+                    enrichment, ensure_ascii=False))
+                 for group_id, signature, enrichment, _ in signatures])
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO group_bands (band_key, id) '
+                'VALUES (?, ?)',
+                [(band_key, group_id)
+                 for group_id, _, _, band_keys in signatures
+                 for band_key in band_keys])
+            self._connection.execute('COMMIT')
+        except sqlite3.Error:
+            self._connection.execute('ROLLBACK')
+            raise
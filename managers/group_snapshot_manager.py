@@ -0,0 +1,99 @@
+"""This file contains GroupSnapshotManager to store VK group snapshots in a
+local SQLite file"""
+import json
+import sqlite3
+from typing import Iterable, Iterator
+# -------------------------------------------------------------------------
+
+
+class GroupSnapshotManager:
+    """The GroupSnapshotManager class provides access to the local SQLite
+    store of VK group data, its content hashes and GPT enrichment"""
+    def __init__(self, db_file: str) -> None:
+        """Initialize the GroupSnapshotManager class
+        :param db_file: The path to the SQLite file to store the snapshots in
+        """
+        self._connection = sqlite3.connect(db_file, isolation_level=None)
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """This method creates the snapshot table if it doesn't exist"""
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS group_snapshots ('
+            'id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+            'content_hash TEXT NOT NULL, fetched_at REAL NOT NULL, '
+            'with_post_text INTEGER NOT NULL, enrichment TEXT, '
+            'enriched_hash TEXT)')
+
+    def get_snapshots(self, group_ids: Iterable[str]) -> dict[str, dict]:
+        """This method returns the snapshots of the provided groups
+        :param group_ids: the ids of the groups
+        :return: a dictionary with group ids as keys and dictionaries with
+        snapshot data as values (the groups without snapshots are missing)
+        """
+        group_ids = list(set(group_ids))
+        snapshots = {}
+        for start in range(0, len(group_ids), 500):
+            part = group_ids[start:start + 500]
+            rows = self._connection.execute(
+                f'SELECT id, data, content_hash, fetched_at, with_post_text, '
+                f'enrichment, enriched_hash FROM group_snapshots '
+                f'WHERE id IN ({",".join("?" * len(part))})', part)
+
+            for row in rows:
+                snapshots[row[0]] = {
+                    'data': json.loads(row[1]),
+                    'content_hash': row[2],
+                    'fetched_at': row[3],
+                    'with_post_text': bool(row[4]),
+                    'enrichment': json.loads(row[5]) if row[5] else None,
+                    'enriched_hash': row[6],
+                }
+
+        return snapshots
+
+    def save_snapshots(
+            self, snapshots: list[tuple[str, dict, str, float, bool]]
+    ) -> None:
+        """This method saves the group data keeping their enrichment
+        :param snapshots: a list of tuples with group id, group data, content
+        hash, the timestamp of fetching and the flag showing if the fixed
+        post contains the post text
+        """
+        self._connection.executemany(
+            'INSERT INTO group_snapshots '
+            '(id, data, content_hash, fetched_at, with_post_text) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET '
+            'data = excluded.data, content_hash = excluded.content_hash, '
+            'fetched_at = excluded.fetched_at, '
+            'with_post_text = excluded.with_post_text',
+            [(group_id, json.dumps(data, ensure_ascii=False), content_hash,
+              fetched_at, int(with_post_text))
+             for group_id, data, content_hash, fetched_at, with_post_text
+             in snapshots])
+
+    def save_enrichments(
+            self, enrichments: list[tuple[str, dict, str]]) -> None:
+        """This method saves the GPT enrichment of the groups
+        :param enrichments: a list of tuples with group id, a dictionary with
+        the enriched fields and the content hash the enrichment was made for
+        """
+        self._connection.executemany(
+            'UPDATE group_snapshots SET enrichment = ?, enriched_hash = ? '
+            'WHERE id = ?',
+            [(json.dumps(enrichment, ensure_ascii=False), content_hash,
+              group_id)
+             for group_id, enrichment, content_hash in enrichments])
+
+    def iter_enrichments(self) -> Iterator[tuple[str, dict, dict]]:
+        """This method iterates over the groups which enrichment was made for
+        their current content
+        :return: an iterator of tuples with the group id, its data and
+        enrichment
+        """
+        rows = self._connection.execute(
+            'SELECT id, data, enrichment FROM group_snapshots '
+            'WHERE enrichment IS NOT NULL AND enriched_hash = content_hash')
+        for group_id, data, enrichment in rows:
+            yield group_id, json.loads(data), json.loads(enrichment)
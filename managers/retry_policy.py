@@ -0,0 +1,241 @@
+"""This file contains RetryPolicy, VKRetryPolicy and CircuitBreaker to retry
+the requests to the external APIs without making their throttling worse"""
+import logging
+from asyncio import sleep
+from random import uniform
+from time import monotonic
+from constants import (
+    GPT_REQUEST_ATTEMPTS, GPT_RETRY_BASE_DELAY, GPT_RETRY_MAX_DELAY,
+    GPT_BREAKER_THRESHOLD, GPT_BREAKER_RECOVERY_TIME,
+    GPT_BREAKER_MAX_RECOVERY_TIME, GPT_REQUEST_TIMEOUT, VK_MAX_ATTEMPTS,
+    VK_THROTTLE_ERROR_CODES, VK_TRANSIENT_ERROR_CODES,
+    VK_INVALID_TOKEN_ERROR_CODES)
+from managers.credential_pool import Credential, CredentialPool
+from metrics import metrics
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceededError(Exception):
+    """The exception raised when the request can't be finished before its
+    deadline"""
+
+
+class RetryPolicy:
+    """The RetryPolicy class decides if the failed request has to be
+    retried and how long to wait before the retry. The delay grows
+    exponentially with full jitter and is never shorter than the time the
+    API asked to wait (Retry-After)"""
+    def __init__(
+            self, max_attempts: int = GPT_REQUEST_ATTEMPTS,
+            base_delay: float = GPT_RETRY_BASE_DELAY,
+            max_delay: float = GPT_RETRY_MAX_DELAY) -> None:
+        """Initialize the RetryPolicy class
+        :param max_attempts: the maximum number of attempts of a request
+        :param base_delay: the base delay in seconds before the retry
+        :param max_delay: the maximum delay in seconds before the retry
+        """
+        self.max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+
+    def get_delay(self, attempt: int, retry_after: float = None) -> float:
+        """This method returns the delay before the next attempt
+        :param attempt: the number of the failed attempt starting from 0
+        :param retry_after: the number of seconds the API asked to wait
+        :return: the number of seconds to wait
+        """
+        delay = uniform(
+            0, min(self._max_delay, self._base_delay * 2 ** attempt))
+
+        return max(delay, retry_after or 0)
+
+    def can_retry(
+            self, attempt: int, delay: float, deadline: float = None
+    ) -> bool:
+        """This method checks if the request can be retried
+        :param attempt: the number of the failed attempt starting from 0
+        :param delay: the number of seconds to wait before the retry
+        :param deadline: the monotonic time the request has to be finished
+        by (None - there is no deadline)
+        :return: True if the request can be retried and False otherwise
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+
+        return deadline is None or monotonic() + delay < deadline
+
+
+class VKRetryPolicy:
+    """The VKRetryPolicy class makes the retry decisions of a VK API method
+    call for both the sync and the async clients, so they differ only in
+    the way they wait. The throttling errors decrease the rate of the token
+    and together with the other transient errors are retried with
+    exponential backoff. The invalid token is removed from the pool and the
+    request is retried with another one"""
+    def __init__(
+            self, tokens: CredentialPool, method: str,
+            max_attempts: int = VK_MAX_ATTEMPTS) -> None:
+        """Initialize the VKRetryPolicy class
+        :param tokens: the pool of the VK tokens the request is sent with
+        :param method: the name of the VK API method (for instance
+        groups.getById)
+        :param max_attempts: the maximum number of attempts
+        :raises ValueError: if the number of attempts is not positive
+        """
+        if max_attempts < 1:
+            raise ValueError(
+                f'The number of attempts must be positive, got '
+                f'{max_attempts}')
+
+        self._tokens = tokens
+        self._method = method
+        self._max_attempts = max_attempts
+
+    def on_error(
+            self, attempt: int, token: Credential, request: dict,
+            error: Exception, code: int = None) -> float:
+        """This method handles the failed attempt: gives the feedback to
+        the token pool, sets the status of the tracked request and decides
+        if the request has to be retried
+        :param attempt: the number of the failed attempt starting from 0
+        :param token: the token the request was sent with
+        :param request: the dictionary with the status of the tracked
+        request
+        :param error: the error the attempt failed with
+        :param code: the VK API error code (None - the request failed by the
+        network or HTTP error, it's transient)
+        :return: the number of seconds to wait before the next attempt
+        :raises Exception: the error if it's permanent, there is no valid
+        token left or the attempts are exhausted
+        """
+        if code in VK_THROTTLE_ERROR_CODES:
+            self._tokens.on_throttle(token)
+            request['status'] = 'throttled'
+        elif code in VK_INVALID_TOKEN_ERROR_CODES:
+            self._tokens.on_invalid(token)
+            request['status'] = 'error'
+            if not self._tokens.has_valid:
+                raise error
+        elif code is not None and code not in VK_TRANSIENT_ERROR_CODES:
+            raise error
+        else:
+            request['status'] = 'error'
+
+        logger.warning(
+            f'VK API method {self._method} failed, error: {error!r}. '
+            f'Attempt {attempt + 1} of {self._max_attempts}')
+        if attempt + 1 >= self._max_attempts:
+            raise error
+
+        metrics.inc('api_retries_total', api='vk', method=self._method)
+        return token.limiter.get_retry_delay(attempt)
+
+
+class CircuitBreaker:
+    """The CircuitBreaker class pauses all the requests to the API while it
+    keeps rejecting them. The circuit opens after several transient
+    failures in a row or when the API asks to wait (Retry-After). When the
+    pause is over a single probe request is let through, the other requests
+    wait for its result: the success closes the circuit and the failure
+    opens it again for a twice longer pause"""
+    def __init__(
+            self, name: str, failure_threshold: int = GPT_BREAKER_THRESHOLD,
+            recovery_time: float = GPT_BREAKER_RECOVERY_TIME,
+            max_recovery_time: float = GPT_BREAKER_MAX_RECOVERY_TIME,
+            probe_timeout: float = GPT_REQUEST_TIMEOUT) -> None:
+        """Initialize the CircuitBreaker class
+        :param name: the name of the API used in logs and metrics
+        :param failure_threshold: the number of transient failures in a row
+        to open the circuit
+        :param recovery_time: the number of seconds of the first pause
+        :param max_recovery_time: the maximum number of seconds of the pause
+        :param probe_timeout: the number of seconds to wait for the result
+        of the probe request before letting another one through
+        """
+        self._name = name
+        self._failure_threshold = failure_threshold
+        self._recovery_time = recovery_time
+        self._max_recovery_time = max_recovery_time
+        self._probe_timeout = probe_timeout
+        self._failures = 0
+        self._trips = 0
+        self._is_open = False
+        self._open_until = 0.0
+        self._probe_until = 0.0
+
+    async def wait(self, deadline: float = None) -> None:
+        """This method waits until the request can be sent
+        :param deadline: the monotonic time the request has to be finished
+        by (None - there is no deadline)
+        :raises DeadlineExceededError: if the circuit stays open longer than
+        the deadline
+        """
+        while self._is_open:
+            now = monotonic()
+            if self._open_until > now:
+                wait_until = self._open_until
+            elif self._probe_until > now:
+                wait_until = min(self._probe_until, now + 1)
+            else:
+                self._probe_until = now + self._probe_timeout
+                return
+
+            if deadline is not None and wait_until >= deadline:
+                raise DeadlineExceededError(
+                    f'The {self._name} circuit is open longer than the '
+                    f'deadline of the request')
+            await sleep(wait_until - now)
+
+    def on_success(self) -> None:
+        """This method closes the circuit after the successful request"""
+        if self._is_open:
+            logger.info(f'The {self._name} circuit is closed')
+            metrics.set('circuit_open', 0, api=self._name)
+        self._failures = 0
+        self._trips = 0
+        self._is_open = False
+        self._probe_until = 0.0
+
+    def on_failure(self, is_transient: bool, retry_after: float = None
+                   ) -> None:
+        """This method registers the failed request and opens the circuit if
+        the API keeps rejecting the requests. The failures of the requests
+        sent before the circuit opened only extend the pause up to their
+        Retry-After
+        :param is_transient: whether the error is transient (the permanent
+        errors don't say anything about the state of the API)
+        :param retry_after: the number of seconds the API asked to wait
+        """
+        now = monotonic()
+        was_probing = self._probe_until > now
+        self._probe_until = 0.0
+        if not is_transient:
+            return
+
+        if self._is_open and not was_probing:
+            if retry_after:
+                self._open_until = max(self._open_until, now + retry_after)
+            return
+
+        self._failures += 1
+        if (was_probing or retry_after or
+                self._failures >= self._failure_threshold):
+            self._open(retry_after)
+
+    def _open(self, retry_after: float = None) -> None:
+        """This method opens the circuit for the time the API asked to wait
+        or for the exponentially growing pause if it didn't ask
+        :param retry_after: the number of seconds the API asked to wait
+        """
+        pause = retry_after or min(
+            self._max_recovery_time, self._recovery_time * 2 ** self._trips)
+        self._trips += 1
+        self._is_open = True
+        self._open_until = monotonic() + pause
+        metrics.inc('circuit_trips_total', api=self._name)
+        metrics.set('circuit_open', 1, api=self._name)
+        logger.warning(
+            f'The {self._name} circuit is open, the requests are paused for '
+            f'{pause:.1f} seconds')
@@ -1,85 +1,162 @@
 """This file contains VKAPIManager to get data from VK API"""
-import sys
+import logging
+from itertools import count
 from time import sleep
+from requests import RequestException
 from vk_api import VkApi
+from vk_api.exceptions import ApiError, ApiHttpError
 from constants import (
     MAX_GROUPS_PER_REQUEST, MAX_POST_PER_REQUEST, VK_GROUP_FIELDS,
-    GET_POST_ATTEMPTS)
-from utils import split_data_list
+    GET_POST_ATTEMPTS, VK_EXECUTE_LIMIT, VK_MAX_ATTEMPTS)
+from managers.credential_pool import CredentialPool
+from managers.retry_policy import VKRetryPolicy
+from managers.vk_rate_limiter import VKRateLimiter
+from metrics import metrics
+from utils import split_data_list, create_vk_execute_code
 # --------------------------------------------------------------------------
 
+logger = logging.getLogger(__name__)
+
 
 class VKGroupManager:
     """The VKAPIManager class provides access to the VK API"""
-    def __init__(self, vk_token: str) -> None:
+    def __init__(
+            self, vk_token: str | CredentialPool,
+            rate_limiter: VKRateLimiter = None) -> None:
         """Initialize the VKAPIManager class
-        :param vk_token: The token to get access to the VK API
+        :param vk_token: The token to get access to the VK API or a
+        CredentialPool of several tokens with their own rate limiters
+        :param rate_limiter: an instance of VKRateLimiter shared by all VK
+        API requests of the single token (a new one is created if it's not
+        provided)
+        """
+        self._tokens = vk_token if isinstance(
+            vk_token, CredentialPool) else CredentialPool(
+            'vk', [vk_token], lambda **_: rate_limiter or VKRateLimiter())
+        self._clients: dict[str, VkApi] = {}
+
+    def _get_client(self, token: str) -> VkApi:
+        """This method returns the VK API client of the token creating it on
+        the first call
+        :param token: the token to get access to the VK API
+        :return: a VkApi instance
+        """
+        if token not in self._clients:
+            self._clients[token] = VkApi(token=token)
+
+        return self._clients[token]
+
+    def method(
+            self, method: str, values: dict = None,
+            max_attempts: int = VK_MAX_ATTEMPTS) -> dict | list:
+        """This method calls the VK API method within the rate limit of the
+        token picked from the pool. The errors are handled by VKRetryPolicy
+        :param method: the name of the VK API method (for instance
+        groups.getById)
+        :param values: a dictionary with parameters of the method
+        :param max_attempts: the maximum number of attempts
+        :return: the response of the VK API method
         """
-        self._client = VkApi(token=vk_token)
+        retry_policy = VKRetryPolicy(self._tokens, method, max_attempts)
+        for attempt in count():
+            token, wait = self._tokens.acquire()
+            sleep(wait)
+            with metrics.track_request('vk', method) as request:
+                try:
+                    response = self._get_client(token.value).method(
+                        method, values)
+                    self._tokens.on_success(token)
+                    return response
+
+                except ApiError as e:
+                    delay = retry_policy.on_error(
+                        attempt, token, request, e, e.code)
+
+                except (ApiHttpError, RequestException) as e:
+                    delay = retry_policy.on_error(attempt, token, request, e)
+
+            sleep(delay)
 
     def get_groups_by_ids(
-            self, group_ids: list[str], delay: float = None,
+            self, group_ids: list[str],
             fields: list[str] = VK_GROUP_FIELDS,
             max_per_request: int = MAX_GROUPS_PER_REQUEST
     ) -> list[dict]:
         """This method returns a list of groups data from VK API found by its
         ids
         :param group_ids: a list of group ids
-        :param delay: a float representing the amount of time to wait before
-        returning the next part of groups (can be useful because of VK API
-        restrictions on the number of requests per second)
         :param fields: a list of fields of groups to return
         :param max_per_request: an integer representing the maximum number of
         groups per single request (500 by default)
         :return: a list of dictionaries containing groups data
         """
-        try:
-            split_ids_list = split_data_list(
-                group_ids, max_per_request)
-            result = []
-            for ids in split_ids_list:
-                response = self._client.method(
-                    'groups.getById', values={
-                        'fields': ','.join(fields),
-                        'group_ids': ','.join(ids)
-                    })
-                result.extend(response)
-                if delay is not None:
-                    sleep(delay)
-
-            return result
+        split_ids_list = split_data_list(
+            list(group_ids), max_per_request)
+        result = []
+        for ids in split_ids_list:
+            response = self.method(
+                'groups.getById', values={
+                    'fields': ','.join(fields),
+                    'group_ids': ','.join(ids)
+                })
+            result.extend(response)
 
-        except Exception as e:
-            sys.exit(f'Failed to get groups data from VK API, error: {e}')
+        return result
 
     def get_post_text_by_group_id(
-            self, group_id: str | int, count: int = 1, delay: float = 0.5
-    ) -> list[dict]:
+            self, group_id: str | int, count: int = 1
+    ) -> list[dict] | None:
         """This method returns a list of dictionaries representing the posts
         of provided certain group
         :param group_id: a string or integer representing the group id
         :param count: an integer representing the number of posts to return
-        :param delay: a float representing the seconds to wait before the
-        next attempt to send request to the VK API. May be useful because of
-        the limit of the number of requests per second
-        :return: a list of strings representing the post texts
+        :return: a list of strings representing the post texts or None if
+        the posts were not received
+        """
+        try:
+            posts_data = self.method(
+                'wall.get', values={
+                    'owner_id': f'-{group_id}',
+                    'filter': 'owner',
+                    'count': count,
+                }, max_attempts=GET_POST_ATTEMPTS)
+            return posts_data['items']
+
+        except Exception as e:
+            logger.warning(f'Failed to get post data from VK API, error: {e}')
+
+    def get_first_posts_by_group_ids(
+            self, group_ids: list[str | int], count: int = 1,
+            max_per_request: int = VK_EXECUTE_LIMIT
+    ) -> dict[int, list[dict]]:
+        """This method returns the first posts of the provided groups. The
+        wall.get calls are sent in bulk by the execute method (up to
+        VK_EXECUTE_LIMIT calls per request) and the results are mapped back
+        to the groups by the owner_id of the posts
+        :param group_ids: a list of strings or integers representing the
+        group ids
+        :param count: an integer representing the number of posts to return
+        for each group
+        :param max_per_request: the maximum number of wall.get calls in a
+        single execute request
+        :return: a dictionary with group ids as keys and lists of
+        dictionaries representing the posts as values (the groups with empty
+        walls or failed calls are missing)
         """
-        for _ in range(GET_POST_ATTEMPTS):
-            try:
-                posts_data = self._client.method(
-                    'wall.get', values={
-                        'owner_id': f'-{group_id}',
-                        'filter': 'owner',
-                        'count': count,
-                    }
-                )
-                posts_details = posts_data['items']
-
-                return posts_details
-
-            except Exception as e:
-                print(f'Failed to get post data from VK API, error: {e}')
-                sleep(delay)
+        posts = {}
+        for ids in split_data_list(list(group_ids), max_per_request):
+            code = create_vk_execute_code('wall.get', [
+                {'owner_id': -int(group_id), 'filter': 'owner', 'count': count}
+                for group_id in ids])
+            response = self.method('execute', values={'code': code})
+
+            for posts_data in response:
+                if not posts_data or not posts_data.get('items'):
+                    continue
+                items = posts_data['items']
+                posts[-items[0]['owner_id']] = items
+
+        return posts
 
     def get_fixed_posts(self, post_ids: list[str]) -> list[dict]:
         """This method returns a list of dictionaries representing the fixed
@@ -91,7 +168,7 @@ class VKGroupManager:
         split_post_ids_list = split_data_list(
             list(post_ids), MAX_POST_PER_REQUEST)
         for row in split_post_ids_list:
-            response = self._client.method(
+            response = self.method(
                 'wall.getById', values={
                     'posts': ','.join(row)
                 })
@@ -0,0 +1,111 @@
+"""This file contains VKRateLimiter to keep VK API requests within the
+allowed rate"""
+import logging
+from random import uniform
+from threading import Lock
+from time import monotonic
+from constants import (
+    VK_REQUESTS_PER_SECOND, VK_MIN_REQUESTS_PER_SECOND, VK_RATE_BACKOFF_FACTOR,
+    VK_RATE_RECOVERY_STEP, VK_RETRY_BASE_DELAY, VK_RETRY_MAX_DELAY)
+from metrics import metrics
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class VKRateLimiter:
+    """The VKRateLimiter class is a token bucket shared by all VK API
+    methods. The rate is decreased multiplicatively when VK API reports
+    throttling and increased additively after successful requests until it
+    reaches the maximum rate again. The limiter is thread safe so it can be
+    shared by requests sent from different threads and coroutines"""
+    def __init__(
+            self, max_rate: float = VK_REQUESTS_PER_SECOND,
+            min_rate: float = VK_MIN_REQUESTS_PER_SECOND,
+            backoff_factor: float = VK_RATE_BACKOFF_FACTOR,
+            recovery_step: float = VK_RATE_RECOVERY_STEP,
+            retry_base_delay: float = VK_RETRY_BASE_DELAY,
+            retry_max_delay: float = VK_RETRY_MAX_DELAY,
+            name: str = None) -> None:
+        """Initialize the VKRateLimiter class
+        :param max_rate: the maximum number of requests per second
+        :param min_rate: the minimum number of requests per second the rate
+        can be decreased to
+        :param backoff_factor: the factor to multiply the rate by when VK API
+        reports throttling
+        :param recovery_step: the number of requests per second to add to
+        the rate after each successful request
+        :param retry_base_delay: the base delay in seconds before the retry
+        :param retry_max_delay: the maximum delay in seconds before the retry
+        :param name: the name of the token the limiter belongs to (used in
+        logs and metrics when there are several tokens)
+        """
+        self._max_rate = max_rate
+        self._min_rate = min_rate
+        self._backoff_factor = backoff_factor
+        self._recovery_step = recovery_step
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+        self._rate = max_rate
+        self._tokens = 1.0
+        self._updated_at = monotonic()
+        self._lock = Lock()
+        self._name = name
+        self._labels = {'token': name} if name else {}
+
+    @property
+    def rate(self) -> float:
+        """This property returns the current number of requests per second"""
+        return self._rate
+
+    def get_wait(self) -> float:
+        """This method returns the number of seconds to wait before the next
+        request without reserving a token
+        :return: the number of seconds to wait
+        """
+        with self._lock:
+            tokens = min(1.0, self._tokens + (
+                monotonic() - self._updated_at) * self._rate)
+
+            return max(0.0, (1 - tokens) / self._rate)
+
+    def reserve(self) -> float:
+        """This method reserves a token for the next request
+        :return: the number of seconds to wait before sending the request
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                1.0, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            self._tokens -= 1
+
+            return max(0.0, -self._tokens / self._rate)
+
+    def on_success(self) -> None:
+        """This method increases the rate after the successful request"""
+        with self._lock:
+            self._rate = min(self._max_rate, self._rate + self._recovery_step)
+        metrics.set('vk_rate_limit', self._rate, **self._labels)
+
+    def on_throttle(self) -> None:
+        """This method decreases the rate and empties the bucket after VK API
+        reported too many requests"""
+        with self._lock:
+            self._rate = max(
+                self._min_rate, self._rate * self._backoff_factor)
+            self._tokens = min(self._tokens, 0.0)
+        metrics.set('vk_rate_limit', self._rate, **self._labels)
+        token = f' of {self._name}' if self._name else ''
+        logger.warning(
+            f'VK API throttled the requests{token}, the rate is decreased '
+            f'to {self._rate:.2f} requests per second')
+
+    def get_retry_delay(self, attempt: int) -> float:
+        """This method returns the delay before the next retry by using
+        exponential backoff with full jitter
+        :param attempt: the number of the failed attempt starting from 0
+        :return: the number of seconds to wait
+        """
+        return uniform(0, min(
+            self._retry_max_delay, self._retry_base_delay * 2 ** attempt))
@@ -0,0 +1,267 @@
+"""This file contains the metrics of the application. The metrics are
+collected in the shared registry and can be exposed as a Prometheus text
+endpoint or written to a JSON file periodically"""
+import json
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic, perf_counter
+from typing import Iterator
+from aiohttp import web
+from constants import METRICS_BUCKETS
+# ------------------------------------------------------------------------
+
+LABEL_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n'})
+
+
+class MetricsRegistry:
+    """The MetricsRegistry class keeps counters, gauges and histograms with
+    labels. It's thread safe so the metrics can be updated from the event
+    loop and from the threads running the blocking calls"""
+    def __init__(self, buckets: tuple[float, ...] = METRICS_BUCKETS) -> None:
+        """Initialization of the MetricsRegistry class
+        :param buckets: the upper bounds of the histogram buckets in seconds
+        """
+        self._buckets = buckets
+        self._counters: dict[tuple, float] = defaultdict(float)
+        self._gauges: dict[tuple, float] = {}
+        self._histograms: dict[tuple, list] = {}
+        self._lock = Lock()
+        self._started_at = monotonic()
+
+    @staticmethod
+    def _create_key(name: str, labels: dict) -> tuple:
+        """This method creates the key of the metric with its labels"""
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """This method increases the counter
+        :param name: the name of the counter
+        :param value: the value to add
+        :param labels: the labels of the counter
+        """
+        with self._lock:
+            self._counters[self._create_key(name, labels)] += value
+
+    def get_total(self, name: str, **labels) -> float:
+        """This method returns the sum of the counters with the name and
+        the provided labels (the other labels can have any values)
+        :param name: the name of the counter
+        :param labels: the labels the counters must have
+        :return: the sum of the counters
+        """
+        labels = set(labels.items())
+        with self._lock:
+            return sum(
+                value for (metric, metric_labels), value
+                in self._counters.items()
+                if metric == name and labels <= set(metric_labels))
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """This method sets the value of the gauge
+        :param name: the name of the gauge
+        :param value: the value to set
+        :param labels: the labels of the gauge
+        """
+        with self._lock:
+            self._gauges[self._create_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """This method adds the value to the histogram
+        :param name: the name of the histogram
+        :param value: the observed value
+        :param labels: the labels of the histogram
+        """
+        key = self._create_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                key, [[0] * (len(self._buckets) + 1), 0.0, 0])
+            histogram[0][bisect_left(self._buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def track_request(self, api: str, method: str) -> Iterator[dict]:
+        """This method measures a request to the external API. The request
+        is counted as failed if it raises an exception, the status can be
+        changed by the caller (for instance to 'throttled')
+        :param api: the name of the API (vk, openai or sheets)
+        :param method: the name of the API method
+        :return: a dictionary with the status of the request
+        """
+        result = {'status': 'ok'}
+        start = perf_counter()
+        try:
+            yield result
+
+        except BaseException:
+            if result['status'] == 'ok':
+                result['status'] = 'error'
+            raise
+
+        finally:
+            self.observe(
+                'api_request_seconds', perf_counter() - start,
+                api=api, method=method)
+            self.inc(
+                'api_requests_total', api=api, method=method,
+                status=result['status'])
+
+    def render_prometheus(self) -> str:
+        """This method renders the metrics in Prometheus text format
+        :return: string representing the metrics
+        """
+        lines = []
+        with self._lock:
+            for kind, metrics in (
+                    ('counter', self._counters), ('gauge', self._gauges)):
+                for name in sorted({key[0] for key in metrics}):
+                    lines.append(f'# TYPE {name} {kind}')
+                    lines.extend(
+                        f'{name}{self._render_labels(labels)} {value}'
+                        for (metric, labels), value in metrics.items()
+                        if metric == name)
+
+            for name in sorted({key[0] for key in self._histograms}):
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, labels), histogram in self._histograms.items():
+                    if metric == name:
+                        lines.extend(
+                            self._render_histogram(name, labels, histogram))
+
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(
+            self, name: str, labels: tuple, histogram: list) -> list[str]:
+        """This method renders a single histogram in Prometheus text format
+        :param name: the name of the histogram
+        :param labels: the labels of the histogram
+        :param histogram: a list with bucket counts, sum and count
+        :return: a list of lines
+        """
+        lines = []
+        total = 0
+        for bound, count in zip(
+                (*map(str, self._buckets), '+Inf'), histogram[0]):
+            total += count
+            bucket_labels = self._render_labels((*labels, ('le', bound)))
+            lines.append(f'{name}_bucket{bucket_labels} {total}')
+        lines.append(
+            f'{name}_sum{self._render_labels(labels)} {histogram[1]}')
+        lines.append(
+            f'{name}_count{self._render_labels(labels)} {histogram[2]}')
+
+        return lines
+
+    @staticmethod
+    def _render_labels(labels: tuple) -> str:
+        """This method renders the labels of the metric escaping the
+        values as the text format requires"""
+        if not labels:
+            return ''
+        rendered = ','.join(
+            f'{key}="{str(value).translate(LABEL_ESCAPES)}"'
+            for key, value in labels)
+
+        return f'{{{rendered}}}'
+
+    def to_dict(self) -> dict:
+        """This method returns the metrics as a dictionary. The counters of
+        the rows processed by the pipeline stages get their rates as well
+        :return: a dictionary with counters, gauges, histograms (count, sum
+        and p50/p95 estimated from the buckets, '+Inf' above the last one)
+        and stage rates
+        """
+        elapsed = monotonic() - self._started_at
+        with self._lock:
+            counters = {
+                self._format_key(key): value
+                for key, value in self._counters.items()}
+            gauges = {
+                self._format_key(key): value
+                for key, value in self._gauges.items()}
+            histograms = {
+                self._format_key(key): {
+                    'count': histogram[2],
+                    'sum': round(histogram[1], 4),
+                    'p50': self._format_bound(
+                        self._estimate_quantile(histogram, 0.5)),
+                    'p95': self._format_bound(
+                        self._estimate_quantile(histogram, 0.95))}
+                for key, histogram in self._histograms.items()}
+            rows_per_second = {
+                dict(labels)['stage']: round(value / elapsed, 2)
+                for (name, labels), value in self._counters.items()
+                if name == 'pipeline_rows_total'}
+
+        return {
+            'uptime_seconds': round(elapsed, 1),
+            'rows_per_second': rows_per_second,
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+        }
+
+    @staticmethod
+    def _format_key(key: tuple) -> str:
+        """This method creates a readable name of the metric with labels"""
+        name, labels = key
+        if not labels:
+            return name
+
+        return f"{name}{{{','.join(f'{k}={v}' for k, v in labels)}}}"
+
+    @staticmethod
+    def _format_bound(bound: float) -> float | str:
+        """This method replaces the infinite bucket bound by '+Inf', so the
+        metrics stay valid JSON"""
+        return '+Inf' if bound == float('inf') else bound
+
+    def _estimate_quantile(self, histogram: list, quantile: float) -> float:
+        """This method estimates the quantile by the upper bound of the
+        bucket containing it
+        :param histogram: a list with bucket counts, sum and count
+        :param quantile: the quantile from 0 to 1
+        :return: the upper bound of the bucket (inf for the last one)
+        """
+        rank = quantile * histogram[2]
+        total = 0
+        for bound, count in zip(
+                (*self._buckets, float('inf')), histogram[0]):
+            total += count
+            if total >= rank:
+                return bound
+
+        return float('inf')
+
+    def write_json(self, file_path: str) -> None:
+        """This method writes the metrics to the JSON file atomically
+        :param file_path: the path to the file
+        """
+        temp_file = f'{file_path}.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2, ensure_ascii=False)
+        os.replace(temp_file, file_path)
+
+    async def start_server(self, port: int) -> web.AppRunner:
+        """This method starts the HTTP server exposing the metrics in
+        Prometheus text format at /metrics
+        :param port: the port to listen on
+        :return: the runner of the server to clean it up when it's not needed
+        """
+        async def handle(_: web.Request) -> web.Response:
+            return web.Response(
+                text=self.render_prometheus(), content_type='text/plain')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, port=port).start()
+
+        return runner
+
+
+metrics = MetricsRegistry()
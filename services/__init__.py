@@ -1,10 +1,22 @@
 from .google_table_service import GoogleTableService
 from .gpt_chat_service import GPTChatVKGroupService
 from .vk_group_service import VKGroupService
+from .checkpoint_service import CheckpointService
+from .group_dedup_service import GroupDedupService
+from .group_snapshot_service import GroupSnapshotService
+from .group_classifier_service import GroupClassifierService
+from .group_similarity_service import GroupSimilarityService
+from .prompt_service import PromptService
 # ------------------------------------------------------------------------
 
 __all__ = [
     'VKGroupService',
     'GPTChatVKGroupService',
     'GoogleTableService',
+    'CheckpointService',
+    'GroupDedupService',
+    'GroupSnapshotService',
+    'GroupClassifierService',
+    'GroupSimilarityService',
+    'PromptService',
 ]
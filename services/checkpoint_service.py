@@ -0,0 +1,120 @@
+"""This file contains the CheckpointService class provides a business logic
+to resume the parsing from the last durably written row"""
+import logging
+from threading import Lock
+from typing import Iterable
+from managers import CheckpointManager
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointService:
+    """The CheckpointService class keeps track of the rows sent to the
+    parsing and the rows finished with them. The checkpoint is the last row
+    such that all the dispatched rows up to it are finished: written with
+    complete enrichment, skipped for good (for instance the deleted groups)
+    or failed. The failed rows are kept in the checkpoint to be processed
+    again after restart, so they don't hold the checkpoint back. The
+    checkpoint of another source is not applied"""
+    def __init__(
+            self, checkpoint_manager: CheckpointManager, source_key: str = ''
+    ) -> None:
+        """Initialization of the CheckpointService class
+        :param checkpoint_manager: an instance of CheckpointManager class
+        provides access to the checkpoint file
+        :param source_key: the key of the source the rows are read from (the
+        checkpoint saved for another key is ignored)
+        """
+        self._checkpoint_manager = checkpoint_manager
+        self._source_key = source_key
+        checkpoint = checkpoint_manager.load()
+        if checkpoint and checkpoint.get('source', '') != source_key:
+            logger.warning(
+                f'The checkpoint of the source {checkpoint.get("source")!r} '
+                f'is ignored, the rows are read from {source_key!r}')
+            checkpoint = {}
+
+        self._last_written_row = checkpoint.get('last_written_row', 0)
+        self._failed_rows = set(checkpoint.get('failed_rows', ()))
+        self._last_dispatched_row = self._last_written_row
+        self._pending_rows = set()
+        self._lock = Lock()
+
+    @property
+    def last_written_row(self) -> int:
+        """This property returns the last row such that all the rows up to
+        it are finished"""
+        return self._last_written_row
+
+    @property
+    def failed_rows(self) -> set[int]:
+        """This property returns the rows up to the checkpoint that have to
+        be processed again"""
+        with self._lock:
+            return set(self._failed_rows)
+
+    def mark_dispatched(self, rows: Iterable[int]) -> None:
+        """This method registers the rows sent to the parsing
+        :param rows: the numbers of the sheet rows
+        """
+        with self._lock:
+            for row in rows:
+                self._pending_rows.add(row)
+                self._last_dispatched_row = max(
+                    self._last_dispatched_row, row)
+
+    def mark_written(self, rows: Iterable[int]) -> None:
+        """This method registers the rows written with complete enrichment
+        and moves the checkpoint forward if it's possible
+        :param rows: the numbers of the sheet rows
+        """
+        self._finish_rows(rows)
+
+    def mark_skipped(self, rows: Iterable[int]) -> None:
+        """This method registers the rows that can't be processed at all
+        (the groups VK API doesn't return or with invalid data), they are not
+        processed again after restart
+        :param rows: the numbers of the sheet rows
+        """
+        self._finish_rows(rows)
+
+    def mark_failed(self, rows: Iterable[int]) -> None:
+        """This method registers the rows failed in the middle of the run
+        (the request or the writing failed, the enrichment is incomplete),
+        they are processed again after restart
+        :param rows: the numbers of the sheet rows
+        """
+        self._finish_rows(rows, is_failed=True)
+
+    def _finish_rows(self, rows: Iterable[int], is_failed: bool = False
+                     ) -> None:
+        """This method removes the finished rows from the pending ones and
+        saves the checkpoint if it has changed
+        :param rows: the numbers of the sheet rows
+        :param is_failed: whether the rows have to be processed again
+        """
+        rows = set(rows)
+        if not rows:
+            return
+
+        with self._lock:
+            self._pending_rows.difference_update(rows)
+            failed_rows = (
+                self._failed_rows | rows if is_failed
+                else self._failed_rows - rows)
+            if self._pending_rows:
+                last_written_row = min(self._pending_rows) - 1
+            else:
+                last_written_row = self._last_dispatched_row
+            last_written_row = max(last_written_row, self._last_written_row)
+
+            if (last_written_row == self._last_written_row and
+                    failed_rows == self._failed_rows):
+                return
+            self._last_written_row = last_written_row
+            self._failed_rows = failed_rows
+            self._checkpoint_manager.save({
+                'source': self._source_key,
+                'last_written_row': last_written_row,
+                'failed_rows': sorted(failed_rows)})
@@ -1,7 +1,10 @@
-from typing import Iterable
+from typing import Iterable, Iterator
 from classes.group_classes import Group
 from managers import GoogleTableManager
-from utils import get_ids_from_urls
+from constants import URL_COLUMN, SHEET_PAGE_SIZE
+from utils import (
+    get_ids_from_urls, split_groups_to_runs, get_column_letter,
+    get_columns_count)
 # --------------------------------------------------------------------------
 
 
@@ -24,16 +27,74 @@ class GoogleTableService:
 
         return ids
 
+    def iter_vk_ids(
+            self, start_row: int = 1, end_row: int = None,
+            page_size: int = SHEET_PAGE_SIZE, result_columns: str = None,
+            url_column: int = URL_COLUMN
+    ) -> Iterator[tuple[int, list[str], set[int]]]:
+        """This method downloads the sheet by pages and yields vk_ids
+        extracted from the urls of each page. If the result columns are
+        provided they are downloaded by the same request to find the rows
+        that already have all the result cells filled
+        :param start_row: the number of the first sheet row to download
+        :param end_row: the number of the last sheet row to download (the
+        last row of the sheet by default)
+        :param page_size: the number of rows to download per request
+        :param result_columns: the range of the result columns (for instance
+        'Q:S') or None if the completed rows are not needed
+        :param url_column: the number of the column with urls
+        :return: an iterator of tuples with the number of the first row of
+        the page, a list of vk_ids and a set of completed row numbers
+        """
+        row_count = self._table_manager.get_row_count()
+        if row_count is None:
+            return
+        last_row = min(end_row, row_count) if end_row else row_count
+
+        url_letter = get_column_letter(url_column)
+        if result_columns:
+            first_letter, last_letter = result_columns.split(':')
+            columns_count = get_columns_count(result_columns)
+
+        for page_start in range(start_row, last_row + 1, page_size):
+            page_end = min(page_start + page_size - 1, last_row)
+            ranges = [f'{url_letter}{page_start}:{url_letter}{page_end}']
+            if result_columns:
+                ranges.append(
+                    f'{first_letter}{page_start}:{last_letter}{page_end}')
+
+            columns = self._table_manager.get_ranges(ranges)
+            if columns is None:
+                return
+
+            ids = get_ids_from_urls(
+                [row[0] if row else '' for row in columns[0]])
+            completed_rows = set()
+            if result_columns:
+                completed_rows = {
+                    num for num, row in enumerate(columns[1], page_start)
+                    if len(row) == columns_count and all(
+                        str(cell).strip() for cell in row)}
+
+            yield page_start, ids, completed_rows
+
     def send_groups_to_sheet(
-            self, groups: list[Group], col_range: str, fields: Iterable[str]
-    ) -> None:
-        """This method serves to send provided group data to Google sheet
+            self, groups: list[Group], col_template: str, fields: Iterable[str]
+    ) -> bool:
+        """This method serves to send provided group data to Google sheet.
+        The groups can be in any order and have gaps between the rows, they
+        are coalesced into runs of contiguous rows and all the runs are sent
+        by a single request
         :param groups: a list of Group instances representing the group data
-        :param col_range: the range of columns to update data in (for
-        instance 'A3:B8')
+        :param col_template: the string representing the template of columns
+        to update data in (for instance 'A{0}:B{1}')
         :param fields: An iterable containing field names that should be sent
         to the Google sheet (the order is important)
+        :return: True if the groups were sent and False otherwise
         """
-        group_list = list(
-            map(lambda x: [getattr(x, key, None) for key in fields], groups))
-        self._table_manager.upload_to_sheet(col_range, group_list)
+        fields = list(fields)
+        data = [
+            (col_template.format(run[0].column_num, run[-1].column_num),
+             [[getattr(group, key, None) for key in fields] for group in run])
+            for run in split_groups_to_runs(groups)]
+        return self._table_manager.batch_upload_to_sheet(data)
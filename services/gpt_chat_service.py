@@ -1,9 +1,10 @@
 """This file contains the GPTChatVKGroupService class provides a business
 logic to work with GPT chat"""
 import json
+from typing import Iterable
 from classes.group_classes import Group
 from managers import ChatGPTManager
-from utils import clean_digits
+from utils import parse_score, parse_json_object, validate_score
 # --------------------------------------------------------------------------
 
 
@@ -19,13 +20,16 @@ class GPTChatVKGroupService:
 
     async def fill_group_tags_by_request(
             self, groups: list[Group], request: str,
-            additional_role: dict[str, str] = None) -> list[Group]:
+            additional_role: dict[str, str] = None,
+            deadline: float = None) -> list[Group]:
         """This method serves to generate tags by group data such as name,
         description, fixed post, etc. and add the tags to the provided group
         model
         :param groups: a list of Group instances containing VK group data
         :param additional_role: a dictionary with additional role of GPT such
         as system or assistant to change GPT chat behavior
+        :param deadline: the monotonic time the answer has to be received by
+        (None - there is no deadline)
         :param request: the string representing the request for GPT chat to
         generate tags
         :return: a list of Group instances containing VK group data with added
@@ -36,21 +40,38 @@ class GPTChatVKGroupService:
         ]
         if additional_role:
             messages.insert(0, additional_role)
-        response = await self._gpt_manager.get_completion(messages)
-        tags: list[list] = json.loads(response)
-        for group in groups:
-            group.tags = ', '.join(tags.pop(0)) if tags else None
+        response = await self._gpt_manager.get_completion(messages, deadline)
+        try:
+            tags: list[list] = json.loads(response)
+            if not isinstance(tags, list) or len(tags) != len(groups):
+                raise ValueError(
+                    f'Expected tags for {len(groups)} groups, got: {response}')
+            tags = [self._validate_tags(group_tags) for group_tags in tags]
+            if None in tags:
+                raise ValueError(
+                    f'Expected a list of tags for each group, got: '
+                    f'{response}')
+
+        except (ValueError, TypeError):
+            self._gpt_manager.discard_completion(messages)
+            raise
+
+        for group, group_tags in zip(groups, tags):
+            group.tags = group_tags
 
         return groups
 
     async def fill_field_by_request(
             self, group: Group, request: str, field: str,
-            additional_role: dict[str, str] = None) -> Group | None:
+            additional_role: dict[str, str] = None,
+            deadline: float = None) -> Group | None:
         """This method serves to generate and add to requested field data by
         group info such as name, description, status
         :param group: a Group instance containing VK group data
         :param additional_role: a dictionary with additional role of GPT such
         as system or assistant to change GPT chat behavior
+        :param deadline: the monotonic time the answer has to be received by
+        (None - there is no deadline)
         :param field: the name of the field in the Group instance to generate
         data for
         :param request: the string representing the request for GPT chat to
@@ -63,10 +84,121 @@ class GPTChatVKGroupService:
         ]
         if additional_role:
             messages.insert(0, additional_role)
-        response = await self._gpt_manager.get_completion(messages)
-        result = clean_digits(response)
-        if not result:
+        response = await self._gpt_manager.get_completion(
+            messages, deadline, is_score=True)
+        result = parse_score(response)
+        if result is None:
+            self._gpt_manager.discard_completion(messages, is_score=True)
             return None
         setattr(group, field, result)
 
         return group
+
+    async def fill_fields_by_request(
+            self, group: Group, request: str, fields: Iterable[str],
+            additional_role: dict[str, str] = None,
+            deadline: float = None) -> list[str]:
+        """This method serves to fill several fields of the group by a single
+        request. GPT chat has to answer with a JSON object where the keys are
+        the field names. The scores are checked to be in SCORE_RANGE and the
+        tags have to be a list of strings
+        :param group: a Group instance containing VK group data
+        :param request: the string representing the request for GPT chat to
+        generate fields' data
+        :param fields: the names of the fields in the Group instance to fill
+        :param additional_role: a dictionary with additional role of GPT such
+        as system or assistant to change GPT chat behavior
+        :param deadline: the monotonic time the answer has to be received by
+        (None - there is no deadline)
+        :return: a list of field names that failed validation and were not
+        filled
+        """
+        messages = [
+            {'role': 'user', 'content': request}
+        ]
+        if additional_role:
+            messages.insert(0, additional_role)
+        response = await self._gpt_manager.get_completion(messages, deadline)
+        answer = parse_json_object(response)
+        failed_fields = self._fill_fields_from_answer(group, answer, fields)
+        if failed_fields:
+            self._gpt_manager.discard_completion(messages)
+
+        return failed_fields
+
+    async def fill_groups_fields_by_request(
+            self, groups: list[Group], request: str, fields: Iterable[str],
+            additional_role: dict[str, str] = None,
+            deadline: float = None) -> list[Group]:
+        """This method serves to fill several fields of multiple groups by a
+        single request. GPT chat has to answer with a JSON object where the
+        keys are the group ids and the values are JSON objects with the field
+        names as keys so the answers never depend on the order of the groups
+        :param groups: a list of Group instances containing VK group data
+        :param request: the string representing the request for GPT chat to
+        generate fields' data
+        :param fields: the names of the fields in the Group instances to fill
+        :param additional_role: a dictionary with additional role of GPT such
+        as system or assistant to change GPT chat behavior
+        :param deadline: the monotonic time the answer has to be received by
+        (None - there is no deadline)
+        :return: a list of Group instances that are missing in the answer or
+        have any field failed validation
+        """
+        messages = [
+            {'role': 'user', 'content': request}
+        ]
+        if additional_role:
+            messages.insert(0, additional_role)
+        response = await self._gpt_manager.get_completion(messages, deadline)
+        answer = parse_json_object(response)
+
+        failed_groups = []
+        for group in groups:
+            group_answer = answer.get(str(group.id))
+            if not isinstance(group_answer, dict) or (
+                    self._fill_fields_from_answer(group, group_answer, fields)):
+                failed_groups.append(group)
+        if failed_groups:
+            self._gpt_manager.discard_completion(messages)
+
+        return failed_groups
+
+    def _fill_fields_from_answer(
+            self, group: Group, answer: dict, fields: Iterable[str]
+    ) -> list[str]:
+        """This method serves to validate the fields of GPT chat answer and to
+        fill the group with the valid ones
+        :param group: a Group instance to fill
+        :param answer: a dictionary with field names and generated values
+        :param fields: the names of the fields to fill
+        :return: a list of field names that failed validation
+        """
+        failed_fields = []
+        for field in fields:
+            value = answer.get(field)
+            if field == 'tags':
+                value = self._validate_tags(value)
+            else:
+                value = validate_score(value)
+
+            if value is None:
+                failed_fields.append(field)
+                continue
+            setattr(group, field, value)
+
+        return failed_fields
+
+    @staticmethod
+    def _validate_tags(tags: list[str] | None) -> str | None:
+        """This method checks tags generated by GPT chat and joins them into a
+        single string
+        :param tags: a list of strings representing the tags
+        :return: a string with tags separated by comma or None if the tags
+        are not valid
+        """
+        if (not isinstance(tags, list) or not tags or
+                not all(isinstance(tag, str) and tag for tag in tags)):
+            return None
+
+        return ', '.join(tags)
@@ -0,0 +1,309 @@
+"""This file contains the GroupClassifierService class provides a business
+logic to enrich the obvious VK groups locally without GPT chat"""
+import logging
+import re
+from typing import Iterable
+from zlib import crc32
+import numpy as np
+from classes.group_classes import Group
+from constants import (
+    FIELDS_TO_TEMPLATES, GPT_COMBINED_WITH_TAGS, GPT_TAGS_VOCABULARY,
+    SCORE_RANGE, SNAPSHOT_FIELDS, CLASSIFIER_FEATURES, CLASSIFIER_NGRAMS,
+    CLASSIFIER_MIN_SAMPLES, CLASSIFIER_MIN_CONFIDENCE,
+    CLASSIFIER_MIN_PRECISION, CLASSIFIER_TAG_MIN_PROBABILITY)
+from metrics import metrics
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+class NaiveBayesModel:
+    """The NaiveBayesModel class is a multinomial naive Bayes classifier
+    working with hashed features. A document is an array of its feature
+    indices, so it's scored by summing the rows of the log probability
+    matrix. A document can belong to several classes (for instance tags)"""
+    def __init__(
+            self, classes: list, n_features: int, alpha: float = 1.0
+    ) -> None:
+        """Initialization of the NaiveBayesModel class
+        :param classes: a list of the class values
+        :param n_features: the number of hashed features
+        :param alpha: the additive smoothing of the feature counts
+        """
+        self.classes = classes
+        self._n_features = n_features
+        self._alpha = alpha
+        self._log_probs: np.ndarray | None = None
+        self._log_priors: np.ndarray | None = None
+
+    def fit(self, docs: list[np.ndarray], labels: list[list[int]]) -> None:
+        """This method trains the model
+        :param docs: a list of arrays with the feature indices of documents
+        :param labels: a list with the class indices of each document
+        """
+        pairs = [
+            (doc, label)
+            for doc, doc_labels in zip(docs, labels) for label in doc_labels]
+        rows = np.concatenate([
+            np.full(len(doc), label, dtype=np.int64) for doc, label in pairs])
+        cols = np.concatenate([doc for doc, _ in pairs])
+
+        counts = np.full(
+            (self._n_features, len(self.classes)), self._alpha,
+            dtype=np.float32)
+        np.add.at(counts, (cols, rows), 1)
+        self._log_probs = np.log(counts / counts.sum(axis=0))
+
+        class_counts = np.bincount(
+            [label for _, label in pairs], minlength=len(self.classes))
+        self._log_priors = np.log(
+            (class_counts + 1) / (class_counts.sum() + len(self.classes)))
+
+    def predict_proba(self, docs: list[np.ndarray]) -> np.ndarray:
+        """This method returns the probabilities of the classes
+        :param docs: a list of arrays with the feature indices of documents
+        :return: an array of shape (documents, classes)
+        """
+        scores = np.stack([
+            self._log_probs[doc].sum(axis=0) for doc in docs]
+        ) + self._log_priors
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+class GroupClassifierService:
+    """The GroupClassifierService class scores and tags the VK groups by
+    naive Bayes models trained on the groups enriched by GPT chat before.
+    Each model is checked on a held-out part of the samples and is used
+    only if its confident answers are precise enough. The group gets the
+    local answers only when all of them are confident, the other groups
+    are left for GPT chat"""
+    def __init__(
+            self, score_fields: Iterable[str] = tuple(FIELDS_TO_TEMPLATES),
+            with_tags: bool = GPT_COMBINED_WITH_TAGS,
+            tags_vocabulary: str = GPT_TAGS_VOCABULARY,
+            text_fields: Iterable[str] = SNAPSHOT_FIELDS,
+            n_features: int = CLASSIFIER_FEATURES,
+            ngrams: tuple[int, ...] = CLASSIFIER_NGRAMS,
+            min_samples: int = CLASSIFIER_MIN_SAMPLES,
+            min_confidence: float = CLASSIFIER_MIN_CONFIDENCE,
+            min_precision: float = CLASSIFIER_MIN_PRECISION,
+            tag_min_probability: float = CLASSIFIER_TAG_MIN_PROBABILITY,
+            max_tags: int = 3
+    ) -> None:
+        """Initialization of the GroupClassifierService class
+        :param score_fields: the names of the score fields to fill
+        :param with_tags: whether the tags have to be filled as well
+        :param tags_vocabulary: the tags GPT chat can choose from separated
+        by commas (the other tags are ignored)
+        :param text_fields: the group fields the features are made of
+        :param n_features: the number of hashed features
+        :param ngrams: the sizes of the character n-grams of the words
+        :param min_samples: the minimum number of samples to train a model
+        :param min_confidence: the minimum probability of a local answer
+        :param min_precision: the minimum share of the right confident
+        answers on the held-out samples to use the model
+        :param tag_min_probability: the minimum probability of a tag to be
+        chosen
+        :param max_tags: the maximum number of tags of a group
+        """
+        self._score_fields = list(score_fields)
+        self._required_fields = [
+            *self._score_fields, *(['tags'] if with_tags else [])]
+        self._tags = list(dict.fromkeys(
+            tag.strip() for tag in tags_vocabulary.split(',') if tag.strip()))
+        self._text_fields = list(text_fields)
+        self._n_features = n_features
+        self._ngrams = ngrams
+        self._min_samples = min_samples
+        self._min_confidence = min_confidence
+        self._min_precision = min_precision
+        self._tag_min_probability = tag_min_probability
+        self._max_tags = max_tags
+        self._models: dict[str, NaiveBayesModel] = {}
+
+    @property
+    def is_ready(self) -> bool:
+        """This property checks if all the required fields have models"""
+        return all(field in self._models for field in self._required_fields)
+
+    def train(self, samples: Iterable[tuple[dict, dict]]) -> None:
+        """This method trains the models of the fields
+        :param samples: an iterable of tuples with the VK data of a group and
+        its enrichment generated by GPT chat
+        """
+        docs, enrichments = [], []
+        for data, enrichment in samples:
+            docs.append(self._create_features(
+                data.get(field) for field in self._text_fields))
+            enrichments.append(enrichment)
+
+        for field in self._required_fields:
+            classes = self._tags if field == 'tags' else list(SCORE_RANGE)
+            indices, labels = [], []
+            for num, enrichment in enumerate(enrichments):
+                label = self._create_label(field, enrichment.get(field))
+                if label:
+                    indices.append(num)
+                    labels.append(label)
+
+            if len(indices) < self._min_samples:
+                logger.info(
+                    f'The local classifier of {field} is not used: '
+                    f'{len(indices)} samples of {self._min_samples} needed')
+                continue
+
+            field_docs = [docs[num] for num in indices]
+            truth = [enrichments[num][field] for num in indices]
+            precision, coverage = self._validate(
+                field, classes, field_docs, labels, truth)
+            logger.info(
+                f'The local classifier of {field}: precision '
+                f'{precision:.2f}, coverage {coverage:.2f} on '
+                f'{len(indices)} samples')
+            if precision < self._min_precision:
+                continue
+
+            model = NaiveBayesModel(classes, self._n_features)
+            model.fit(field_docs, labels)
+            self._models[field] = model
+
+    def classify(self, groups: list[Group]) -> list[Group]:
+        """This method fills the groups the models are confident in
+        :param groups: a list of Group instances with VK data
+        :return: a list of Group instances that have to be enriched by GPT
+        """
+        if not groups or not self.is_ready:
+            return groups
+
+        docs = [
+            self._create_features(
+                getattr(group, field, None) for field in self._text_fields)
+            for group in groups]
+        predictions = {
+            field: self._predict(field, self._models[field], docs)
+            for field in self._required_fields}
+
+        uncertain_groups = []
+        for num, group in enumerate(groups):
+            values = {
+                field: values[num] for field, values in predictions.items()}
+            if any(value is None for value in values.values()):
+                uncertain_groups.append(group)
+                continue
+
+            for field, value in values.items():
+                setattr(group, field, value)
+
+        metrics.inc(
+            'classifier_groups_total', len(groups) - len(uncertain_groups),
+            result='classified')
+        metrics.inc(
+            'classifier_groups_total', len(uncertain_groups),
+            result='uncertain')
+
+        return uncertain_groups
+
+    def _create_features(self, texts: Iterable[str | None]) -> np.ndarray:
+        """This method creates the hashed features of the text: the words
+        and the character n-grams of the words
+        :param texts: the texts of the group fields
+        :return: an array of unique feature indices
+        """
+        grams = set()
+        text = ' '.join(text for text in texts if text).lower()
+        for token in TOKEN_PATTERN.findall(text):
+            grams.add(token)
+            token = f'<{token}>'
+            for size in self._ngrams:
+                grams.update(
+                    token[start:start + size]
+                    for start in range(len(token) - size + 1))
+
+        return np.unique(np.fromiter(
+            (crc32(gram.encode()) % self._n_features for gram in grams),
+            dtype=np.int64, count=len(grams)))
+
+    def _create_label(self, field: str, value) -> list[int]:
+        """This method converts the enriched value into the class indices
+        :param field: the name of the field
+        :param value: the value generated by GPT chat
+        :return: a list of class indices (empty if the value is not valid)
+        """
+        if field == 'tags':
+            return [
+                self._tags.index(tag) for tag in str(value or '').split(', ')
+                if tag in self._tags]
+
+        return [value - SCORE_RANGE.start] if value in SCORE_RANGE else []
+
+    def _predict(
+            self, field: str, model: NaiveBayesModel, docs: list[np.ndarray]
+    ) -> list:
+        """This method predicts the values of the field
+        :param field: the name of the field
+        :param model: the model of the field
+        :param docs: a list of arrays with the feature indices of documents
+        :return: a list with the values of the documents (None if the model
+        is not confident)
+        """
+        probabilities = model.predict_proba(docs)
+        if field != 'tags':
+            best = probabilities.argmax(axis=1)
+            return [
+                model.classes[num]
+                if probabilities[doc, num] >= self._min_confidence else None
+                for doc, num in enumerate(best)]
+
+        values = []
+        order = np.argsort(-probabilities, axis=1)[:, :self._max_tags]
+        for doc, nums in enumerate(order):
+            nums = [
+                num for num in nums
+                if probabilities[doc, num] >= self._tag_min_probability]
+            confidence = probabilities[doc, nums].sum()
+            values.append(
+                ', '.join(model.classes[num] for num in nums)
+                if nums and confidence >= self._min_confidence else None)
+
+        return values
+
+    def _validate(
+            self, field: str, classes: list, docs: list[np.ndarray],
+            labels: list[list[int]], truth: list
+    ) -> tuple[float, float]:
+        """This method trains the model on 90% of the samples and checks its
+        confident answers on the rest ones
+        :param field: the name of the field
+        :param classes: a list of the class values
+        :param docs: a list of arrays with the feature indices of documents
+        :param labels: a list with the class indices of each document
+        :param truth: a list with the values generated by GPT chat
+        :return: a tuple with the share of the right confident answers and
+        the share of the confident answers
+        """
+        held_out = range(0, len(docs), 10)
+        model = NaiveBayesModel(classes, self._n_features)
+        model.fit(
+            [doc for num, doc in enumerate(docs) if num % 10],
+            [label for num, label in enumerate(labels) if num % 10])
+        predictions = self._predict(
+            field, model, [docs[num] for num in held_out])
+
+        confident = right = 0
+        for num, value in zip(held_out, predictions):
+            if value is None:
+                continue
+            confident += 1
+            if field == 'tags':
+                right += set(value.split(', ')) <= set(
+                    str(truth[num]).split(', '))
+            else:
+                right += value == truth[num]
+
+        return (right / confident if confident else 0.0,
+                confident / len(held_out))
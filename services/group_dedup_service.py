@@ -0,0 +1,89 @@
+"""This file contains the GroupDedupService class provides a business logic
+to parse each VK group once even if it occurs in many sheet rows"""
+from typing import Iterable
+from classes.group_classes import Group
+from constants import FIELDS_TO_TEMPLATES
+# --------------------------------------------------------------------------
+
+
+class GroupDedupService:
+    """The GroupDedupService class keeps an index of group id -> sheet rows.
+    Only the first row of each group is sent to VK API and GPT chat, the
+    other rows get a copy of its data when the first row is enriched. Only
+    the enrichment written to the output is kept for the copies, so the
+    memory doesn't grow with the VK texts"""
+    def __init__(
+            self, model: type[Group] = Group,
+            fields: Iterable[str] = (*FIELDS_TO_TEMPLATES, 'tags')
+    ) -> None:
+        """Initialization of the GroupDedupService class
+        :param model: a class representing a model of VK group
+        :param fields: the group fields the copies get from the enriched
+        group, the fields written to the output (the id is always kept)
+        """
+        self._model = model
+        self._fields = {'id', *fields}
+        self._pending_rows: dict[str, list[int]] = {}
+        self._results: dict[str, dict] = {}
+
+    def register_groups(
+            self, groups: list[Group]) -> tuple[list[Group], list[Group]]:
+        """This method registers the groups read from the sheet
+        :param groups: a list of Group instances with ids and row numbers
+        :return: a tuple with a list of groups to parse (first occurrences)
+        and a list of duplicates of already enriched groups filled with
+        their data and ready to be sent to the sheet
+        """
+        unique_groups, ready_groups = [], []
+        for group in groups:
+            if not group.id:
+                unique_groups.append(group)
+
+            elif group.id in self._results:
+                ready_groups.append(
+                    self._copy_result(group.id, group.column_num))
+
+            elif group.id in self._pending_rows:
+                self._pending_rows[group.id].append(group.column_num)
+
+            else:
+                self._pending_rows[group.id] = []
+                unique_groups.append(group)
+
+        return unique_groups, ready_groups
+
+    def expand_groups(self, groups: list[Group]) -> list[Group]:
+        """This method saves the data of the enriched groups and adds their
+        copies for all the duplicate rows registered so far
+        :param groups: a list of enriched Group instances
+        :return: a list of the provided groups together with their copies
+        """
+        result = list(groups)
+        for group in groups:
+            if not group.id or group.id not in self._pending_rows:
+                continue
+
+            self._results[group.id] = {
+                field: getattr(group, field) for field in self._fields}
+            for row in self._pending_rows.pop(group.id):
+                result.append(self._copy_result(group.id, row))
+
+        return result
+
+    def release(self, group_ids: Iterable[str]) -> list[int]:
+        """This method forgets the groups failed to be parsed, so their next
+        rows are parsed again instead of waiting for the copy forever
+        :param group_ids: the ids of the failed groups
+        :return: a list of the duplicate rows dropped with the groups
+        """
+        return [
+            row for group_id in set(group_ids)
+            for row in self._pending_rows.pop(group_id, ())]
+
+    def _copy_result(self, group_id: str, row: int) -> Group:
+        """This method creates a copy of the enriched group for another row
+        :param group_id: the id of the enriched group
+        :param row: the sheet row number of the copy
+        :return: a Group instance with the data of the enriched group
+        """
+        return self._model(column_num=row, **self._results[group_id])
@@ -0,0 +1,252 @@
+"""This file contains the GroupSimilarityService class provides a business
+logic to reuse GPT enrichment across the near-duplicate VK groups"""
+import hashlib
+import re
+from typing import Iterable
+from zlib import crc32
+import numpy as np
+from classes.group_classes import Group
+from constants import (
+    SNAPSHOT_FIELDS, FIELDS_TO_TEMPLATES, NEAR_DUPLICATE_THRESHOLD,
+    MINHASH_PERMUTATIONS, MINHASH_BANDS, MINHASH_SHINGLE_SIZE,
+    MINHASH_MIN_SHINGLES)
+from managers import GroupSimilarityManager
+from metrics import metrics
+# --------------------------------------------------------------------------
+
+TOKEN_PATTERN = re.compile(r'\w+')
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class GroupSimilarityService:
+    """The GroupSimilarityService class finds the VK groups with nearly the
+    same content (reposting clones, mirrors with different ids) by MinHash
+    signatures of their text. The signatures are split into LSH bands, the
+    groups sharing a band are compared by the signatures and the group gets
+    the enrichment of the most similar group above the threshold. The
+    enriched groups are indexed on disk as they are enriched, so the index
+    is built in a streaming way"""
+    def __init__(
+            self, similarity_manager: GroupSimilarityManager,
+            threshold: float = NEAR_DUPLICATE_THRESHOLD,
+            num_perm: int = MINHASH_PERMUTATIONS, bands: int = MINHASH_BANDS,
+            shingle_size: int = MINHASH_SHINGLE_SIZE,
+            min_shingles: int = MINHASH_MIN_SHINGLES,
+            content_fields: list[str] = SNAPSHOT_FIELDS,
+            enrichment_fields: tuple[str, ...] = (*FIELDS_TO_TEMPLATES, 'tags')
+    ) -> None:
+        """Initialization of the GroupSimilarityService class
+        :param similarity_manager: an instance of GroupSimilarityManager
+        class provides access to the index
+        :param threshold: the minimum estimated Jaccard similarity of the
+        groups to reuse the enrichment
+        :param num_perm: the number of hash functions of the signature
+        :param bands: the number of LSH bands (num_perm must be divisible by
+        it)
+        :param shingle_size: the number of characters of a shingle
+        :param min_shingles: the minimum number of shingles of the group, the
+        groups with less text are never treated as duplicates
+        :param content_fields: the group fields the signature is made of
+        :param enrichment_fields: the group fields generated by GPT chat
+        """
+        if num_perm % bands:
+            raise ValueError(
+                f'The number of permutations {num_perm} is not divisible by '
+                f'the number of bands {bands}')
+
+        self._similarity_manager = similarity_manager
+        self._threshold = threshold
+        self._bands = bands
+        self._shingle_size = shingle_size
+        self._min_shingles = min_shingles
+        self._content_fields = content_fields
+        self._enrichment_fields = enrichment_fields
+        # the signatures are stored, so the hash functions must not change
+        # between runs
+        self._a, self._b = (
+            np.array([
+                self._hash_seed(f'{name}{num}') % (MERSENNE_PRIME - 1) + 1
+                for num in range(num_perm)], dtype=np.uint64)
+            for name in ('a', 'b'))
+
+    def create_signature(self, group: Group) -> np.ndarray | None:
+        """This method creates the MinHash signature of the group content
+        :param group: a Group instance with VK data
+        :return: an array of the minimum hashes or None if the group has too
+        little text
+        """
+        text = ' '.join(
+            str(getattr(group, field, '') or '')
+            for field in self._content_fields)
+        text = ' '.join(TOKEN_PATTERN.findall(text.lower()))
+        shingles = {
+            text[start:start + self._shingle_size]
+            for start in range(len(text) - self._shingle_size + 1)}
+        if len(shingles) < self._min_shingles:
+            return None
+
+        hashes = np.fromiter(
+            (crc32(shingle.encode()) for shingle in shingles),
+            dtype=np.uint64, count=len(shingles)) % MERSENNE_PRIME
+
+        return ((np.outer(self._a, hashes) + self._b[:, None]) %
+                MERSENNE_PRIME).min(axis=1).astype('<u4')
+
+    def fill_near_duplicates(
+            self, groups: list[Group]
+    ) -> tuple[list[Group], list[tuple[Group, Group]]]:
+        """This method fills the groups having a near duplicate in the index
+        with its enrichment and picks a single group of each set of near
+        duplicates in the provided groups
+        :param groups: a list of Group instances with VK data
+        :return: a tuple with a list of Group instances that have to be
+        enriched and a list of tuples with the near-duplicate groups and the
+        groups to copy the enrichment from after they are enriched
+        """
+        signatures = [self.create_signature(group) for group in groups]
+        band_keys = [
+            self._create_band_keys(signature) if signature is not None
+            else [] for signature in signatures]
+        candidates = self._similarity_manager.get_candidates(
+            key for keys in band_keys for key in keys)
+        stored = self._similarity_manager.get_signatures(
+            group_id for ids in candidates.values() for group_id in ids)
+        stored = {
+            group_id: (np.frombuffer(signature, dtype='<u4'), enrichment)
+            for group_id, (signature, enrichment) in stored.items()}
+
+        unique_groups, duplicates = [], []
+        representatives, batch_bands = [], {}
+        filled = 0
+        for group, signature, keys in zip(groups, signatures, band_keys):
+            if signature is None:
+                unique_groups.append(group)
+                continue
+
+            ids = sorted({
+                group_id for key in keys
+                for group_id in candidates.get(key, ())} - {group.id})
+            best = self._find_most_similar(
+                signature, [stored[group_id][0] for group_id in ids])
+            if best is not None:
+                for key, value in stored[ids[best]][1].items():
+                    setattr(group, key, value)
+                filled += 1
+                continue
+
+            nums = sorted({batch_bands[key] for key in keys
+                           if key in batch_bands})
+            best = self._find_most_similar(
+                signature, [representatives[num][1] for num in nums])
+            if best is not None:
+                duplicates.append((group, representatives[nums[best]][0]))
+                continue
+
+            for key in keys:
+                batch_bands.setdefault(key, len(representatives))
+            representatives.append((group, signature))
+            unique_groups.append(group)
+
+        metrics.inc('near_duplicate_groups_total', filled, source='index')
+        metrics.inc(
+            'near_duplicate_groups_total', len(duplicates), source='batch')
+
+        return unique_groups, duplicates
+
+    def copy_enrichment(
+            self, duplicates: list[tuple[Group, Group]]) -> None:
+        """This method copies the enrichment to the near-duplicate groups
+        :param duplicates: a list of tuples with the near-duplicate groups
+        and the enriched groups to copy the enrichment from
+        """
+        for group, representative in duplicates:
+            for field in self._enrichment_fields:
+                setattr(group, field, getattr(representative, field))
+
+    def save_groups(self, groups: Iterable[Group]) -> None:
+        """This method adds the enriched groups to the index. The groups with
+        any score missing or too little text are skipped
+        :param groups: enriched Group instances
+        """
+        signatures = []
+        for group in groups:
+            if not group.id or any(
+                    getattr(group, field) is None
+                    for field in self._enrichment_fields):
+                continue
+            signature = self.create_signature(group)
+            if signature is None:
+                continue
+
+            signatures.append((
+                group.id, signature.tobytes(),
+                {field: getattr(group, field)
+                 for field in self._enrichment_fields},
+                self._create_band_keys(signature)))
+
+        if signatures:
+            self._similarity_manager.save_signatures(signatures)
+
+    def build_index(
+            self, samples: Iterable[tuple[str, dict, dict]],
+            chunk_size: int = 1000) -> None:
+        """This method fills the empty index with the groups enriched before.
+        The samples are read and saved by chunks, so the memory doesn't
+        depend on their number
+        :param samples: an iterable of tuples with the group id, its VK data
+        and enrichment
+        :param chunk_size: the number of groups saved at once
+        """
+        if not self._similarity_manager.is_empty():
+            return
+
+        chunk = []
+        for group_id, data, enrichment in samples:
+            group = Group(id=group_id)
+            group.update(data)
+            group.update(enrichment)
+            chunk.append(group)
+            if len(chunk) >= chunk_size:
+                self.save_groups(chunk)
+                chunk = []
+        self.save_groups(chunk)
+
+    def _create_band_keys(self, signature: np.ndarray) -> list[int]:
+        """This method splits the signature into LSH bands and hashes them
+        :param signature: the MinHash signature of the group
+        :return: a list of the band keys (a key per band)
+        """
+        return [
+            self._hash_seed(num.to_bytes(2, 'big') + band.tobytes())
+            for num, band in enumerate(signature.reshape(self._bands, -1))]
+
+    def _find_most_similar(
+            self, signature: np.ndarray, candidates: list[np.ndarray]
+    ) -> int | None:
+        """This method finds the candidate with the highest estimated Jaccard
+        similarity not below the threshold
+        :param signature: the MinHash signature of the group
+        :param candidates: a list of the signatures to compare with
+        :return: the index of the most similar candidate or None if there is
+        no candidate similar enough
+        """
+        if not candidates:
+            return None
+
+        similarity = (np.stack(candidates) == signature).mean(axis=1)
+        best = int(similarity.argmax())
+
+        return best if similarity[best] >= self._threshold else None
+
+    @staticmethod
+    def _hash_seed(data: str | bytes) -> int:
+        """This method creates a stable 64-bit hash of the data
+        :param data: the string or bytes to hash
+        :return: a signed 64-bit integer (it fits SQLite INTEGER)
+        """
+        if isinstance(data, str):
+            data = data.encode()
+
+        return int.from_bytes(
+            hashlib.blake2b(data, digest_size=8).digest(), 'big',
+            signed=True)
@@ -0,0 +1,131 @@
+"""This file contains the GroupSnapshotService class provides a business
+logic to skip fetching and enriching the VK groups that haven't changed"""
+import hashlib
+from time import time
+from typing import Iterator
+from classes.group_classes import Group
+from constants import (
+    SNAPSHOT_TTL, SNAPSHOT_FIELDS, FIELDS_TO_TEMPLATES)
+from managers import GroupSnapshotManager
+# --------------------------------------------------------------------------
+
+
+class GroupSnapshotService:
+    """The GroupSnapshotService class compares the VK groups with their local
+    snapshots. The groups fetched within the TTL are taken from the store,
+    and GPT enrichment is reused while the content hash of the group stays
+    the same"""
+    def __init__(
+            self, snapshot_manager: GroupSnapshotManager,
+            ttl: float = SNAPSHOT_TTL,
+            content_fields: list[str] = SNAPSHOT_FIELDS,
+            enrichment_fields: tuple[str, ...] = (*FIELDS_TO_TEMPLATES, 'tags')
+    ) -> None:
+        """Initialization of the GroupSnapshotService class
+        :param snapshot_manager: an instance of GroupSnapshotManager class
+        provides access to the snapshot store
+        :param ttl: the number of seconds the snapshot is fresh for
+        :param content_fields: the group fields the content hash is made of
+        :param enrichment_fields: the group fields generated by GPT chat
+        """
+        self._snapshot_manager = snapshot_manager
+        self._ttl = ttl
+        self._content_fields = content_fields
+        self._enrichment_fields = enrichment_fields
+
+    def create_content_hash(self, group: Group) -> str:
+        """This method creates a hash of the group content
+        :param group: a Group instance with VK data
+        :return: a string representing the SHA-256 hash of the content
+        """
+        content = '\x1f'.join(
+            str(getattr(group, field, '') or '')
+            for field in self._content_fields)
+
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def fill_fresh_groups(
+            self, groups: list[Group], get_post_text: bool) -> list[Group]:
+        """This method fills the groups having fresh snapshots with the
+        stored VK data
+        :param groups: a list of Group instances with ids
+        :param get_post_text: a boolean indicating if the fixed post text is
+        needed (the snapshots without the text are not fresh then)
+        :return: a list of Group instances that have to be fetched from VK
+        """
+        snapshots = self._snapshot_manager.get_snapshots(
+            group.id for group in groups)
+        now = time()
+
+        stale_groups = []
+        for group in groups:
+            snapshot = snapshots.get(group.id)
+            if (not snapshot or now - snapshot['fetched_at'] > self._ttl or
+                    get_post_text and not snapshot['with_post_text']):
+                stale_groups.append(group)
+                continue
+
+            for key, value in snapshot['data'].items():
+                setattr(group, key, value)
+
+        return stale_groups
+
+    def save_groups(self, groups: list[Group], get_post_text: bool) -> None:
+        """This method saves the VK data of the fetched groups
+        :param groups: a list of Group instances with VK data
+        :param get_post_text: a boolean indicating if the fixed post contains
+        the post text
+        """
+        now = time()
+        self._snapshot_manager.save_snapshots([
+            (group.id,
+             {field: getattr(group, field) for field in self._content_fields},
+             self.create_content_hash(group), now, get_post_text)
+            for group in groups if group.id])
+
+    def fill_enrichment(self, groups: list[Group]) -> list[Group]:
+        """This method fills the groups with the stored GPT enrichment if it
+        was made for the same content
+        :param groups: a list of Group instances with VK data
+        :return: a list of Group instances that have to be enriched by GPT
+        """
+        snapshots = self._snapshot_manager.get_snapshots(
+            group.id for group in groups)
+
+        changed_groups = []
+        for group in groups:
+            snapshot = snapshots.get(group.id)
+            if (not snapshot or not snapshot['enrichment'] or
+                    snapshot['enriched_hash'] !=
+                    self.create_content_hash(group)):
+                changed_groups.append(group)
+                continue
+
+            for key, value in snapshot['enrichment'].items():
+                setattr(group, key, value)
+
+        return changed_groups
+
+    def save_enrichment(self, groups: list[Group]) -> None:
+        """This method saves the GPT enrichment of the groups. The groups
+        with any score missing are not saved so they are enriched next time
+        :param groups: a list of enriched Group instances
+        """
+        self._snapshot_manager.save_enrichments([
+            (group.id,
+             {field: getattr(group, field)
+              for field in self._enrichment_fields},
+             self.create_content_hash(group))
+            for group in groups
+            if group.id and all(
+                getattr(group, field) is not None
+                for field in self._enrichment_fields)])
+
+    def iter_enriched_groups(self) -> Iterator[tuple[str, dict, dict]]:
+        """This method iterates over the stored groups with the enrichment
+        made for their current content, they serve as samples to train the
+        local classifier and to build the near-duplicate index
+        :return: an iterator of tuples with the group id, its data and
+        enrichment
+        """
+        return self._snapshot_manager.iter_enrichments()
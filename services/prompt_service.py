@@ -0,0 +1,113 @@
+"""This file contains the PromptService class provides a business logic to
+render VK group data for GPT chat requests"""
+from collections import OrderedDict
+from math import ceil
+from classes.group_classes import Group
+from constants import (
+    GPT_GROUP_TOKEN_BUDGET, CHARS_PER_TOKEN, NON_ASCII_CHARS_PER_TOKEN,
+    PROMPT_CACHE_SIZE)
+from utils import truncate_text
+# --------------------------------------------------------------------------
+
+
+class PromptService:
+    """The PromptService class renders the data of each group once and keeps
+    the result for the other requests about the same group. The text fields
+    are cut to fit the token budget of the group"""
+    def __init__(
+            self, token_budget: int = GPT_GROUP_TOKEN_BUDGET,
+            chars_per_token: float = CHARS_PER_TOKEN,
+            non_ascii_chars_per_token: float = NON_ASCII_CHARS_PER_TOKEN,
+            cache_size: int = PROMPT_CACHE_SIZE
+    ) -> None:
+        """Initialization of the PromptService class
+        :param token_budget: the maximum number of tokens the fields of a
+        single group can take
+        :param chars_per_token: the average number of ASCII characters per
+        token
+        :param non_ascii_chars_per_token: the average number of non-ASCII
+        characters (for instance cyrillic) per token
+        :param cache_size: the maximum number of rendered groups to keep
+        """
+        self._token_budget = token_budget
+        self._chars_per_token = chars_per_token
+        self._non_ascii_chars_per_token = non_ascii_chars_per_token
+        self._cache_size = cache_size
+        self._cache: OrderedDict[tuple, str] = OrderedDict()
+
+    def estimate_tokens(self, text: str) -> int:
+        """This method estimates the number of tokens in the text without
+        the tokenizer of the model
+        :param text: string representing the text
+        :return: the estimated number of tokens
+        """
+        non_ascii = 0 if text.isascii() else (
+            len(text) - len(text.encode('ascii', 'ignore')))
+
+        return ceil((len(text) - non_ascii) / self._chars_per_token +
+                    non_ascii / self._non_ascii_chars_per_token)
+
+    def create_group_info(
+            self, groups: list[Group], template: str, fields: list[str]
+    ) -> str:
+        """This method creates a string representing the group information
+        from provided template and group fields
+        :param groups: list of Group instances
+        :param template: string representing the template to render
+        :param fields: list of fields to be included in the template
+        :return: string representing the data of all the groups
+        """
+        return ''.join([
+            self._render_group(num, group, template, fields)
+            for num, group in enumerate(groups, 1)])
+
+    def _render_group(
+            self, num: int, group: Group, template: str, fields: list[str]
+    ) -> str:
+        """This method renders the data of a single group or takes it from
+        the cache if the same data was already rendered
+        :param num: the number of the group in the request
+        :param group: a Group instance
+        :param template: string representing the template to render
+        :param fields: list of fields to be included in the template
+        :return: string representing the group data
+        """
+        values = tuple(getattr(group, field, None) for field in fields)
+        key = (num, template, values)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            return result
+
+        result = template.format(num, *self._trim_values(values))
+        self._cache[key] = result
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return result
+
+    def _trim_values(self, values: tuple) -> list:
+        """This method cuts the text values to fit the token budget. The
+        values smaller than their equal share of the budget are kept as is
+        and the budget left is shared between the longer ones
+        :param values: a tuple with the values of the group fields
+        :return: a list with the values fitting the budget
+        """
+        result = list(values)
+        texts = sorted(
+            ((self.estimate_tokens(value), index)
+             for index, value in enumerate(values)
+             if isinstance(value, str) and value),
+            key=lambda item: item[0])
+
+        budget = self._token_budget
+        for position, (tokens, index) in enumerate(texts):
+            share = budget // (len(texts) - position)
+            if tokens > share:
+                text = result[index]
+                result[index] = truncate_text(
+                    text, len(text) * share // tokens)
+                tokens = share
+            budget -= tokens
+
+        return result
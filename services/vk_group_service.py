@@ -1,73 +1,179 @@
 """This file contains a VKGroupService provides a business logic to work with
 VK groups"""
+import logging
+from asyncio import to_thread
+from inspect import iscoroutinefunction
+from typing import Any, Callable
+from pydantic import ValidationError
 from classes.group_classes import Group
-from managers import VKGroupManager
+from metrics import metrics
+from managers import VKGroupManager, AsyncVKGroupManager
+from constants import POST_TEXT_LIMIT
+from utils import truncate_text
 # -------------------------------------------------------------------------
 
+logger = logging.getLogger(__name__)
+
 
 class VKGroupService:
     """VKGroupService class has all necessary methods to get VK groups data"""
-    def __init__(self, vk_manager: VKGroupManager) -> None:
+    def __init__(
+            self, vk_manager: VKGroupManager | AsyncVKGroupManager) -> None:
         """Initialization of the class
-        :param vk_manager: an instance of VKGroupManager class provides group
-        data from VK API
+        :param vk_manager: an instance of VKGroupManager or
+        AsyncVKGroupManager class provides group data from VK API
         """
         self._vk_manager = vk_manager
 
-    def get_groups_by_ids(
-            self, groups: list[Group], get_post_text: bool = True) -> list[Group]:
+    @staticmethod
+    async def _call_manager(method: Callable, *args, **kwargs) -> Any:
+        """This method calls the VK manager method without blocking the event
+        loop. The coroutine methods are awaited and the blocking ones are run
+        in a separate thread
+        :param method: the bound method of the VK manager to call
+        :return: the result of the method
+        """
+        if iscoroutinefunction(method):
+            return await method(*args, **kwargs)
+
+        return await to_thread(method, *args, **kwargs)
+
+    async def resolve_screen_names(self, groups: list[Group]) -> list[Group]:
+        """This method replaces the screen names in the group ids with the
+        numeric ids. All the screen names are resolved by bulk requests
+        :param groups: a list of Group instances with ids or screen names
+        :return: a list of Group instances with numeric ids (the screen names
+        that were not resolved are left as is)
+        """
+        screen_names = list({
+            group.id for group in groups
+            if group.id and not group.id.isdigit()})
+        if not screen_names:
+            return groups
+
+        try:
+            result = await self._call_manager(
+                self._vk_manager.get_groups_by_ids, screen_names, fields=[])
+
+        except Exception as e:
+            logger.warning(f'Failed to resolve VK screen names, error: {e}')
+            return groups
+
+        ids = {
+            str(group.get('screen_name', '')).lower(): str(group['id'])
+            for group in result}
+        if len(result) == len(screen_names):
+            for screen_name, group in zip(screen_names, result):
+                ids.setdefault(screen_name, str(group['id']))
+
+        for group in groups:
+            group.id = ids.get(group.id, group.id)
+
+        return groups
+
+    async def get_groups_by_ids(
+            self, groups: list[Group], get_post_text: bool = True
+    ) -> list[Group] | None:
         """This method serves to get VK groups from official VK API by
-        the provided ids
+        the provided ids. The group with invalid data is skipped, the rest
+        of the batch is kept
         :param groups: a list of Group instances with their ids
         :param get_post_text: a boolean indicating if you need to turn VK
         post ids into its text
-        :return: a list of models representing VK groups
+        :return: a list of models representing VK groups or None if the
+        request failed
+        """
+        result = await self.fetch_groups(groups, get_post_text)
+
+        return result[0] if result is not None else None
+
+    async def fetch_groups(
+            self, groups: list[Group], get_post_text: bool = True
+    ) -> tuple[list[Group], list[Group]] | None:
+        """This method serves to get VK groups from official VK API by
+        the provided ids and tells the groups VK API returned from the
+        missing ones (deleted, banned or unresolved). The group with invalid
+        data is skipped, the rest of the batch is kept
+        :param groups: a list of Group instances with their ids
+        :param get_post_text: a boolean indicating if you need to turn VK
+        post ids into its text
+        :return: a tuple with a list of the valid groups (the missing ones
+        are kept without VK data) and a list of the groups filled with VK
+        data or None if the request failed
         """
         try:
             ids = [group.id for group in groups]
-            result = self._vk_manager.get_groups_by_ids(ids)
+            result = await self._call_manager(
+                self._vk_manager.get_groups_by_ids, ids)
             if get_post_text:
-                result = self._change_fixed_post_ids_to_text(result)
-
-            for group in groups:
-                if result and group.id == str(result[0].get('id')):
-                    [setattr(group, key, value)
-                     for key, value in result.pop(0).items()
-                     if key in group.__dict__]
+                result = await self._change_fixed_post_ids_to_text(result)
 
         except Exception as e:
-            print(f'Failed to load VK groups, error: {e}')
-            groups = None
+            logger.warning(f'Failed to load VK groups, error: {e}')
+            return None
 
-        return groups
+        valid_groups, found_groups = [], []
+        for group in groups:
+            if result and group.id == str(result[0].get('id')):
+                group.update(result.pop(0))
+                try:
+                    group.validate()
+
+                except ValidationError as e:
+                    logger.warning(
+                        f'Invalid VK data of the group {group.id}, the '
+                        f'error: {e}')
+                    metrics.inc(
+                        'pipeline_failed_rows_total', stage='validation')
+                    continue
+
+                found_groups.append(group)
+            valid_groups.append(group)
 
-    def _change_fixed_post_ids_to_text(self, groups: list[dict]) -> list[dict]:
+        return valid_groups, found_groups
+
+    async def _change_fixed_post_ids_to_text(
+            self, groups: list[dict]) -> list[dict]:
         """This method serves to change the fixed post ids into its text.
         If there is not a fixed post or fixed post was deleted then the fixed
         post field will be created and filled by the text of first post on
-        the group's wall
+        the group's wall (the first posts of all such groups are requested
+        in bulk)
         :param groups: a list of dicts representing the VK groups
         :return: a list of dicts representing the groups with the post texts
         """
         post_ids = self._create_fixed_post_ids_list(groups)
-        fixed_posts = self._vk_manager.get_fixed_posts(post_ids)
+        fixed_posts = await self._call_manager(
+            self._vk_manager.get_fixed_posts, post_ids)
 
         for group in groups:
-            try:
-                if fixed_posts and group.get('id') == -fixed_posts[0].get(
-                        'owner_id'):
-                    group['fixed_post'] = fixed_posts.pop(0)['text'][:500]
+            if fixed_posts and group.get('id') == -fixed_posts[0].get(
+                    'owner_id'):
+                group['fixed_post'] = truncate_text(
+                    fixed_posts.pop(0)['text'], POST_TEXT_LIMIT)
+
+        groups_without_post = [
+            group for group in groups
+            if not isinstance(group.get('fixed_post'), str) or
+            not group['fixed_post'] or
+            group['fixed_post'].strip() == 'Post deleted']
+        if not groups_without_post:
+            return groups
 
-                if (not group.get('fixed_post') or
-                        str(group.get('fixed_post')).strip() == 'Post deleted'):
+        try:
+            first_posts = await self._call_manager(
+                self._vk_manager.get_first_posts_by_group_ids,
+                [group.get('id') for group in groups_without_post])
 
-                    group['fixed_post'] = (
-                        self._vk_manager.get_post_text_by_group_id(
-                            group.get('id'))[0]['text'][:500]
-                    )
+        except Exception as e:
+            logger.warning(
+                f'Failed to get post data from VK API, error: {e}')
+            first_posts = {}
 
-            except Exception as e:
-                print(f'Failed to get post data from VK API, error: {e}')
+        for group in groups_without_post:
+            posts = first_posts.get(group.get('id'))
+            group['fixed_post'] = truncate_text(
+                posts[0]['text'], POST_TEXT_LIMIT) if posts else ''
 
         return groups
 
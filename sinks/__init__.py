@@ -0,0 +1,12 @@
+from .group_sink import GroupSink
+from .jsonl_sink import JSONLGroupSink
+from .csv_sink import CSVGroupSink
+from .parquet_sink import ParquetGroupSink
+# ------------------------------------------------------------------------
+
+__all__ = [
+    'GroupSink',
+    'JSONLGroupSink',
+    'CSVGroupSink',
+    'ParquetGroupSink',
+]
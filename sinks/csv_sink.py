@@ -0,0 +1,52 @@
+"""This file contains CSVGroupSink to append the enriched VK groups to a
+local CSV file"""
+import csv
+import os
+from constants import SINK_BUFFER_SIZE, SINK_FILE_BUFFERING
+from sinks.group_sink import GroupSink
+# --------------------------------------------------------------------------
+
+
+class CSVGroupSink(GroupSink):
+    """The CSVGroupSink class appends the rows to the CSV file. The header is
+    written only if the file is new, the buffered rows are written by a
+    single call and synced to the disk before they are reported as
+    written"""
+    name = 'csv'
+
+    def __init__(
+            self, file_path: str, buffer_size: int = SINK_BUFFER_SIZE,
+            file_buffering: int = SINK_FILE_BUFFERING) -> None:
+        """Initialize the CSVGroupSink class
+        :param file_path: the path to the file to append the rows to
+        :param buffer_size: the number of rows to collect before writing
+        :param file_buffering: the size of the file buffer in bytes
+        """
+        super().__init__(buffer_size)
+        self._file_path = file_path
+        self._file_buffering = file_buffering
+        self._file = None
+        self._writer: csv.DictWriter | None = None
+
+    def _write_rows(self, rows: list[dict]) -> None:
+        """This method appends the rows to the file
+        :param rows: a list of dictionaries with the column names as keys
+        """
+        if self._file is None:
+            self._file = open(
+                self._file_path, 'a', encoding='utf-8', newline='',
+                buffering=self._file_buffering)
+            self._writer = csv.DictWriter(
+                self._file, self._columns, extrasaction='ignore')
+            if not self._file.tell():
+                self._writer.writeheader()
+
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _close(self) -> None:
+        """This method closes the file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,100 @@
+"""This file contains GroupSink, the base class of the outputs the enriched
+VK groups are written to"""
+import logging
+from abc import ABC, abstractmethod
+from typing import Iterable
+from classes.group_classes import Group
+from constants import SINK_BUFFER_SIZE
+from metrics import metrics
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class GroupSink(ABC):
+    """The GroupSink class buffers the rows of the enriched groups and writes
+    them in bulk. Each row keeps the number of the sheet row the group was
+    read from. The rows are reported as written only after they are flushed,
+    so the checkpoint never moves past the rows kept in the buffer. The
+    subclasses implement _write_rows and may override _close"""
+    name = 'sink'
+
+    def __init__(self, buffer_size: int = SINK_BUFFER_SIZE) -> None:
+        """Initialize the GroupSink class
+        :param buffer_size: the number of rows to collect before writing
+        """
+        self._buffer_size = buffer_size
+        self._buffer: list[dict] = []
+        self._columns: list[str] | None = None
+
+    def write_groups(
+            self, groups: list[Group], fields: Iterable[str]
+    ) -> list[int] | None:
+        """This method adds the groups to the buffer and writes the buffer if
+        it's full. The columns are fixed by the first call
+        :param groups: a list of Group instances representing the group data
+        :param fields: the group fields to write after the row number and id
+        :return: a list of the row numbers written by this call (empty if
+        the groups are kept in the buffer) or None if the writing failed
+        """
+        if self._columns is None:
+            self._columns = list(dict.fromkeys(('row', 'id', *fields)))
+
+        self._buffer.extend(
+            {'row': group.column_num,
+             **{column: getattr(group, column, None)
+                for column in self._columns[1:]}}
+            for group in groups)
+        if len(self._buffer) < self._buffer_size:
+            return []
+
+        return self.flush()
+
+    def flush(self) -> list[int] | None:
+        """This method writes all the buffered rows
+        :return: a list of the written row numbers or None if the writing
+        failed (the rows are dropped then)
+        """
+        if not self._buffer:
+            return []
+
+        rows, self._buffer = self._buffer, []
+        try:
+            self._write_rows(rows)
+
+        except (OSError, ValueError) as e:
+            logger.error(
+                f'Unable to write {len(rows)} rows to the {self.name} sink, '
+                f'the error: {e}')
+            metrics.inc(
+                'sink_rows_total', len(rows), sink=self.name, result='failed')
+            return None
+
+        metrics.inc(
+            'sink_rows_total', len(rows), sink=self.name, result='written')
+        return [row['row'] for row in rows]
+
+    def close(self) -> list[int] | None:
+        """This method writes the rest of the buffer and closes the output
+        :return: a list of the written row numbers or None if the writing
+        failed
+        """
+        rows = self.flush()
+        try:
+            self._close()
+
+        except OSError as e:
+            logger.error(
+                f'Unable to close the {self.name} sink, the error: {e}')
+            return None
+
+        return rows
+
+    @abstractmethod
+    def _write_rows(self, rows: list[dict]) -> None:
+        """This method writes the rows to the output
+        :param rows: a list of dictionaries with the column names as keys
+        """
+
+    def _close(self) -> None:
+        """This method closes the output"""
@@ -0,0 +1,105 @@
+"""This file contains ParquetGroupSink to write the enriched VK groups to a
+local Parquet file. It needs the optional pyarrow package"""
+import os
+from dataclasses import fields
+from classes.group_classes import Group
+from constants import PARQUET_ROW_GROUP_SIZE
+from sinks.group_sink import GroupSink
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+# --------------------------------------------------------------------------
+
+
+class ParquetGroupSink(GroupSink):
+    """The ParquetGroupSink class writes each flushed buffer as a row group
+    of the Parquet file. A Parquet file is readable only after it's closed,
+    so the rows are reported as written when the sink is closed. The file
+    is never overwritten: if it exists the rows are written to the next
+    free numbered file (for instance groups.1.parquet)"""
+    name = 'parquet'
+
+    def __init__(
+            self, file_path: str,
+            row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> None:
+        """Initialize the ParquetGroupSink class
+        :param file_path: the path to the file to write the rows to
+        :param row_group_size: the number of rows of a single row group
+        :raises ImportError: if pyarrow is not installed
+        """
+        if pyarrow is None:
+            raise ImportError(
+                'The Parquet sink needs pyarrow, install it by pip install '
+                'pyarrow')
+
+        super().__init__(row_group_size)
+        self._file_path = file_path
+        self._writer = None
+        self._written_rows: list[int] = []
+
+    def flush(self) -> list[int] | None:
+        """This method writes the buffered rows as a row group
+        :return: an empty list (the rows are reported when the sink is
+        closed) or None if the writing failed
+        """
+        rows = super().flush()
+        if rows is None:
+            return None
+
+        self._written_rows.extend(rows)
+        return []
+
+    def close(self) -> list[int] | None:
+        """This method writes the rest of the buffer and closes the file
+        :return: a list of all the written row numbers or None if the file
+        is not complete
+        """
+        if super().close() is None:
+            return None
+
+        rows, self._written_rows = self._written_rows, []
+        return rows
+
+    def _write_rows(self, rows: list[dict]) -> None:
+        """This method writes the rows as a row group
+        :param rows: a list of dictionaries with the column names as keys
+        """
+        table = pyarrow.Table.from_pylist(rows, schema=self._create_schema())
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(
+                self._get_free_path(), table.schema)
+        self._writer.write_table(table)
+
+    def _close(self) -> None:
+        """This method writes the footer and closes the file"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _create_schema(self) -> 'pyarrow.Schema':
+        """This method creates the schema of the columns, the integer group
+        fields are stored as integers and the rest ones as strings
+        :return: an instance of pyarrow.Schema
+        """
+        types = {field.name: field.type for field in fields(Group)}
+        types['row'] = int
+
+        return pyarrow.schema([
+            (column, pyarrow.int64() if int in getattr(
+                types.get(column), '__args__', (types.get(column), ))
+             else pyarrow.string())
+            for column in self._columns])
+
+    def _get_free_path(self) -> str:
+        """This method returns the path of the file that doesn't exist yet
+        :return: the provided path or the numbered one if it exists
+        """
+        root, extension = os.path.splitext(self._file_path)
+        path, num = self._file_path, 0
+        while os.path.exists(path):
+            num += 1
+            path = f'{root}.{num}{extension}'
+
+        return path
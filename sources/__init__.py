@@ -0,0 +1,15 @@
+from .group_source import GroupSource, FileGroupSource
+from .sheet_source import SheetGroupSource
+from .text_source import TextGroupSource
+from .csv_source import CSVGroupSource
+from .jsonl_source import JSONLGroupSource
+# ------------------------------------------------------------------------
+
+__all__ = [
+    'GroupSource',
+    'FileGroupSource',
+    'SheetGroupSource',
+    'TextGroupSource',
+    'CSVGroupSource',
+    'JSONLGroupSource',
+]
@@ -0,0 +1,35 @@
+"""This file contains CSVGroupSource to read the VK group URLs from a local
+CSV file"""
+import csv
+from typing import Iterator
+from constants import URL_COLUMN
+from sources.group_source import FileGroupSource
+# --------------------------------------------------------------------------
+
+
+class CSVGroupSource(FileGroupSource):
+    """The CSVGroupSource class reads the URL column of the CSV file (for
+    instance the sheet exported as CSV). The row number is the number of the
+    record, so it's the same as the number of the sheet row even if the
+    quoted cells contain line breaks"""
+    name = 'csv'
+
+    def __init__(self, file_path: str, url_column: int = URL_COLUMN) -> None:
+        """Initialize the CSVGroupSource class
+        :param file_path: the path to the file to read the URLs from
+        :param url_column: the number of the column with urls
+        """
+        super().__init__(file_path)
+        self._url_column = url_column
+
+    def _iter_rows(self) -> Iterator[tuple[int, str]]:
+        """This method yields the URLs of the file
+        :return: an iterator of tuples with the row number and the URL
+        """
+        records = csv.reader(
+            line.decode('utf-8', errors='replace')
+            for line in self._iter_lines())
+        for row, record in enumerate(records, 1):
+            yield row, (
+                record[self._url_column - 1]
+                if len(record) >= self._url_column else '')
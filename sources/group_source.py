@@ -0,0 +1,116 @@
+"""This file contains GroupSource, the base class of the inputs the VK group
+URLs are read from, and FileGroupSource, the base class of the local files"""
+import codecs
+import mmap
+import os
+from abc import ABC, abstractmethod
+from typing import Iterator
+from constants import SHEET_PAGE_SIZE
+from utils import get_ids_from_urls
+# --------------------------------------------------------------------------
+
+
+class GroupSource(ABC):
+    """The GroupSource class yields the VK group ids lazily by pages, each id
+    with the number of the row it was read from. Only a single page is kept
+    in memory, so the memory doesn't depend on the size of the input. The
+    subclasses implement key and iter_pages"""
+    name = 'source'
+
+    @property
+    @abstractmethod
+    def key(self) -> str:
+        """This property returns the string identifying the input, the
+        checkpoint is tied to it"""
+
+    @abstractmethod
+    def iter_pages(
+            self, start_row: int = 1, end_row: int = None,
+            page_size: int = SHEET_PAGE_SIZE, result_columns: str = None
+    ) -> Iterator[list[tuple[int, str]]]:
+        """This method yields the group ids of the requested rows by pages
+        :param start_row: the number of the first row to read
+        :param end_row: the number of the last row to read (the last row of
+        the input by default)
+        :param page_size: the number of rows of a single page
+        :param result_columns: the range of the result columns (for instance
+        'Q:S') to skip the rows having all of them filled or None if the
+        completed rows are not skipped (the inputs without result columns
+        ignore it)
+        :return: an iterator of lists of tuples with the row number and the
+        group id
+        """
+
+
+class FileGroupSource(GroupSource):
+    """The FileGroupSource class reads the URLs from a local file line by
+    line. The file is memory-mapped, so the large files are read by the
+    operating system page by page without copying them to the memory. The
+    subclasses implement _iter_rows"""
+    is_ordered = True
+
+    def __init__(self, file_path: str) -> None:
+        """Initialize the FileGroupSource class
+        :param file_path: the path to the file to read the URLs from
+        """
+        self._file_path = file_path
+
+    @property
+    def key(self) -> str:
+        """This property returns the kind and the absolute path of the
+        file"""
+        return f'{self.name}:{os.path.abspath(self._file_path)}'
+
+    def iter_pages(
+            self, start_row: int = 1, end_row: int = None,
+            page_size: int = SHEET_PAGE_SIZE, result_columns: str = None
+    ) -> Iterator[list[tuple[int, str]]]:
+        """This method yields the group ids of the requested rows by pages.
+        The reading stops after the last requested row if the rows of the
+        file are ordered
+        :param start_row: the number of the first row to read
+        :param end_row: the number of the last row to read (the last row of
+        the file by default)
+        :param page_size: the number of rows of a single page
+        :param result_columns: ignored, the files have no result columns
+        :return: an iterator of lists of tuples with the row number and the
+        group id
+        """
+        rows, urls = [], []
+        for row, url in self._iter_rows():
+            if row < start_row:
+                continue
+            if end_row and row > end_row:
+                if self.is_ordered:
+                    break
+                continue
+
+            rows.append(row)
+            urls.append(url)
+            if len(rows) >= page_size:
+                yield list(zip(rows, get_ids_from_urls(urls)))
+                rows, urls = [], []
+
+        if rows:
+            yield list(zip(rows, get_ids_from_urls(urls)))
+
+    @abstractmethod
+    def _iter_rows(self) -> Iterator[tuple[int, str]]:
+        """This method yields the URLs of the file
+        :return: an iterator of tuples with the row number and the URL
+        """
+
+    def _iter_lines(self) -> Iterator[bytes]:
+        """This method yields the lines of the memory-mapped file with the
+        line endings (the UTF-8 byte order mark is removed)
+        :return: an iterator of the lines as bytes
+        """
+        if not os.path.getsize(self._file_path):
+            return
+
+        with (open(self._file_path, 'rb') as file,
+              mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data):
+            lines = iter(data.readline, b'')
+            first_line = next(lines)
+            yield first_line.removeprefix(codecs.BOM_UTF8)
+            yield from lines
@@ -0,0 +1,49 @@
+"""This file contains JSONLGroupSource to read the VK group URLs from a local
+JSON Lines file"""
+import json
+import logging
+from typing import Iterator
+from constants import JSONL_URL_FIELD
+from sources.group_source import FileGroupSource
+# --------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+
+class JSONLGroupSource(FileGroupSource):
+    """The JSONLGroupSource class reads a JSON object per line of the file.
+    The row number is taken from the 'row' key (for instance the file
+    written by JSONLGroupSink) or it's the number of the line. The rows may
+    come in any order, so the whole file is read"""
+    name = 'jsonl'
+    is_ordered = False
+
+    def __init__(
+            self, file_path: str, url_field: str = JSONL_URL_FIELD) -> None:
+        """Initialize the JSONLGroupSource class
+        :param file_path: the path to the file to read the URLs from
+        :param url_field: the key of the URL in the objects (the 'id' key is
+        used if there is no URL)
+        """
+        super().__init__(file_path)
+        self._url_field = url_field
+
+    def _iter_rows(self) -> Iterator[tuple[int, str]]:
+        """This method yields the URLs of the file
+        :return: an iterator of tuples with the row number and the URL
+        """
+        for num, line in enumerate(self._iter_lines(), 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                row = data.get('row')
+                url = data.get(self._url_field) or data.get('id') or ''
+
+            except (ValueError, AttributeError) as e:
+                logger.warning(
+                    f'Unable to read the line {num} of {self._file_path}, '
+                    f'the error: {e}')
+                continue
+
+            yield row if isinstance(row, int) else num, str(url)
@@ -0,0 +1,61 @@
+"""This file contains SheetGroupSource to read the VK group URLs from the
+Google sheet"""
+from typing import Iterator
+from constants import SHEET_PAGE_SIZE, URL_COLUMN, TABLE_NAME, PARSE_SHEET
+from services.google_table_service import GoogleTableService
+from sources.group_source import GroupSource
+# --------------------------------------------------------------------------
+
+
+class SheetGroupSource(GroupSource):
+    """The SheetGroupSource class downloads the URL column of the Google
+    sheet page by page. The result columns of each page are downloaded by
+    the same request to skip the completed rows"""
+    name = 'sheet'
+
+    def __init__(
+            self, table_service: GoogleTableService,
+            url_column: int = URL_COLUMN, table_name: str = TABLE_NAME,
+            sheet_name: str = PARSE_SHEET) -> None:
+        """Initialize the SheetGroupSource class
+        :param table_service: an instance of GoogleTableService class
+        :param url_column: the number of the column with urls
+        :param table_name: the name of the Google table (it identifies the
+        source only, the table is opened by the table service)
+        :param sheet_name: the name of the sheet with urls
+        """
+        self._table_service = table_service
+        self._url_column = url_column
+        self._table_name = table_name
+        self._sheet_name = sheet_name
+
+    @property
+    def key(self) -> str:
+        """This property returns the table, the sheet and the URL column
+        the rows are read from"""
+        return (f'{self.name}:{self._table_name}/{self._sheet_name}/'
+                f'{self._url_column}')
+
+    def iter_pages(
+            self, start_row: int = 1, end_row: int = None,
+            page_size: int = SHEET_PAGE_SIZE, result_columns: str = None
+    ) -> Iterator[list[tuple[int, str]]]:
+        """This method yields the group ids of the requested sheet rows by
+        pages, the rows having all the result cells filled are skipped
+        :param start_row: the number of the first sheet row to download
+        :param end_row: the number of the last sheet row to download (the
+        last row of the sheet by default)
+        :param page_size: the number of rows to download per request
+        :param result_columns: the range of the result columns (for instance
+        'Q:S') or None if the completed rows are not skipped
+        :return: an iterator of lists of tuples with the row number and the
+        group id
+        """
+        pages = self._table_service.iter_vk_ids(
+            start_row, end_row, page_size, result_columns, self._url_column)
+
+        for first_row, ids, completed_rows in pages:
+            yield [
+                (num, group_id)
+                for num, group_id in enumerate(ids, first_row)
+                if num not in completed_rows]
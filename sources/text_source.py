@@ -0,0 +1,18 @@
+"""This file contains TextGroupSource to read the VK group URLs from a local
+text file"""
+from typing import Iterator
+from sources.group_source import FileGroupSource
+# --------------------------------------------------------------------------
+
+
+class TextGroupSource(FileGroupSource):
+    """The TextGroupSource class reads a URL per line of the text file, the
+    row number is the number of the line"""
+    name = 'text'
+
+    def _iter_rows(self) -> Iterator[tuple[int, str]]:
+        """This method yields the URLs of the file
+        :return: an iterator of tuples with the row number and the URL
+        """
+        for row, line in enumerate(self._iter_lines(), 1):
+            yield row, line.decode('utf-8', errors='replace').strip()
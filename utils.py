@@ -1,20 +1,81 @@
 """This file contains utility functions"""
+import json
 import re
 from classes.group_classes import Group
+from constants import SCORE_RANGE
 # ------------------------------------------------------------------------
 
 
+VK_HOST_PATTERN = re.compile(
+    r'^(?:https?://)?(?:[\w-]+\.)*vk\.(?:com|ru|me)/', re.IGNORECASE)
+VK_GROUP_ID_PATTERN = re.compile(r'^(?:club|public|event)(\d+)$')
+VK_OWNER_PATTERN = re.compile(
+    r'^(?:wall|topic|album|photo|video)-(\d+)(?:_\d+)?$')
+VK_URL_PATH_PATTERN = re.compile(r'[/?#]')
+INTEGER_PATTERN = re.compile(r'-?[0-9]+')
+SCORE_PATTERN = re.compile(r'(?<![\w-])-?\d+(?!\w)')
+SCORE_ANSWER_PATTERN = re.compile(r'\s*-?\d+\D')
+MINUS_SIGNS = str.maketrans({'\u2212': '-', '\u2013': '-', '\u2014': '-'})
+
+
+def normalize_vk_url(url: str) -> str:
+    """This function converts any form of VK group URL into its canonical id.
+    It handles the protocols, subdomains (m.vk.com), club/public/event
+    prefixes, links to the group posts, query strings, trailing slashes and
+    the letter case
+    :param url: string representing the VK group URL, screen name or id
+    :return: string representing the numeric group id or the lowercase
+    screen name if the URL doesn't contain the numeric id
+    """
+    value = VK_HOST_PATTERN.sub('', str(url or '').strip())
+    value = VK_URL_PATH_PATTERN.split(value.lstrip('/'), 1)[0]
+    value = value.strip().lower().lstrip('@')
+
+    match = VK_GROUP_ID_PATTERN.match(value) or VK_OWNER_PATTERN.match(value)
+    if match:
+        return match.group(1)
+    if value.lstrip('-').isdigit():
+        return value.lstrip('-')
+
+    return value
+
+
 def get_ids_from_urls(urls: list[str]) -> list[str]:
     """This function serves to extract the group ids from the URLs
     :param urls: list of strings representing the URLs
-    :return: list of strings representing the group ids
+    :return: list of strings representing the group ids or screen names
     """
-    result = []
-    for url in urls:
-        uid = url.split('/')[-1].replace('club', '')
-        result.append(uid)
+    return [normalize_vk_url(url) for url in urls]
 
-    return result
+
+def get_column_letter(col_num: int) -> str:
+    """This function converts the column number into its letter designation
+    :param col_num: the column number starting from 1
+    :return: string representing the column letters (for instance 'AB')
+    """
+    letters = ''
+    while col_num:
+        col_num, remainder = divmod(col_num - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+
+    return letters
+
+
+def get_columns_count(col_range: str) -> int:
+    """This function returns the number of columns in the range
+    :param col_range: the range of columns (for instance 'Q:S' or 'Q2:S10')
+    :return: the number of columns
+    """
+    def to_number(letters: str) -> int:
+        number = 0
+        for letter in letters:
+            number = number * 26 + ord(letter) - ord('A') + 1
+        return number
+
+    first, last = (
+        re.sub(r'[^A-Z]', '', part.upper()) for part in col_range.split(':'))
+
+    return to_number(last) - to_number(first) + 1
 
 
 def split_data_list(data_list: list, count: int) -> list[list]:
@@ -23,35 +84,118 @@ def split_data_list(data_list: list, count: int) -> list[list]:
     :param count: number of elements in each nested list to split
     :return: list of lists of objects
     """
+    return [
+        data_list[start:start + count]
+        for start in range(0, len(data_list), count)]
+
+
+def split_groups_to_runs(groups: list[Group]) -> list[list[Group]]:
+    """This function sorts the groups by their row numbers and splits them
+    into runs of groups with contiguous row numbers
+    :param groups: list of Group instances with column_num filled
+    :return: list of lists of groups with contiguous row numbers
+    """
     result = []
-    while data_list:
-        part = data_list[:count]
-        result.append(part)
-        del data_list[:count]
+    for group in sorted(groups, key=lambda x: x.column_num):
+        if result and result[-1][-1].column_num + 1 == group.column_num:
+            result[-1].append(group)
+        else:
+            result.append([group])
+
     return result
 
 
-def create_group_info(
-        groups: list[Group], template: str, fields: list[str]) -> str:
-    """This function creates a string representing the group information from
-    provided template and group fields
-    :param groups: list of Group instances
-    :param template: string representing the template to render
-    :param fields: list of fields to be included in the template
+def create_vk_execute_code(method: str, values_list: list[dict]) -> str:
+    """This function creates a VKScript code for the VK API execute method
+    calling the same method with different parameters and returning the list
+    of their results
+    :param method: the name of the VK API method (for instance wall.get)
+    :param values_list: list of dictionaries with parameters of each call
+    :return: string representing the VKScript code
     """
-    result = ''
-    for num, item in enumerate(groups, 1):
-        result += template.format(
-            num, *[getattr(item, field, None) for field in fields])
+    calls = ','.join(
+        f'API.{method}({json.dumps(values, ensure_ascii=False)})'
+        for values in values_list)
 
-    return result
+    return f'return [{calls}];'
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """This function cuts the text to the provided number of characters at
+    the word boundary if it's possible
+    :param text: string representing the text to cut
+    :param limit: the maximum number of characters to keep
+    :return: string representing the cut text
+    """
+    if len(text) <= limit:
+        return text
+
+    result = text[:limit]
+    space = result.rfind(' ')
+    if space > limit // 2:
+        result = result[:space]
+
+    return result.rstrip()
+
+
+def parse_score(data: str | None, score_range: range = SCORE_RANGE
+                ) -> int | None:
+    """This function extracts the score from the GPT chat answer. The answer
+    has to contain a single number (it can be repeated or surrounded by
+    words), the answers like "от -3 до 3" are rejected instead of being
+    glued into a wrong number
+    :param data: string representing the GPT chat answer
+    :param score_range: the range of valid scores
+    :return: the score or None if the answer is not a valid score
+    """
+    if not data:
+        return None
+
+    numbers = set(SCORE_PATTERN.findall(data.translate(MINUS_SIGNS)))
+    if len(numbers) != 1:
+        return None
+    score = int(numbers.pop())
 
+    return score if score in score_range else None
 
-def clean_digits(data: str) -> str:
+
+def is_score_answered(data: str) -> bool:
+    """This function checks if the beginning of the streamed GPT chat answer
+    is already a complete number so the rest of the answer can be skipped
+    :param data: string representing the beginning of the answer
+    :return: True if the answer starts with a complete number
+    """
+    return SCORE_ANSWER_PATTERN.match(data.translate(MINUS_SIGNS)) is not None
+
+
+def parse_json_object(data: str) -> dict:
+    """This function extracts a JSON object from the GPT chat answer that
+    can be surrounded by some additional text or markdown
+    :param data: string representing the GPT chat answer
+    :return: a dictionary parsed from the answer or an empty dictionary if
+    there is no valid JSON object in the answer
+    """
     try:
-        pattern = re.compile(r'[^-0-9]*')
-        result = pattern.sub('', data)
-    except (ValueError, TypeError):
-        result = data
+        start, end = data.index('{'), data.rindex('}')
+        result = json.loads(data[start:end + 1])
+    except (ValueError, TypeError, AttributeError):
+        return {}
 
-    return result
+    return result if isinstance(result, dict) else {}
+
+
+def validate_score(value: int | str | None) -> int | None:
+    """This function checks if the provided value is a valid score. Only an
+    integer or a string of an integer is accepted, the floats, booleans and
+    padded strings are rejected instead of being coerced
+    :param value: an integer or a string representing the score
+    :return: the score as an integer or None if the value is not valid
+    """
+    if type(value) is int:
+        score = value
+    elif isinstance(value, str) and INTEGER_PATTERN.fullmatch(value):
+        score = int(value)
+    else:
+        return None
+
+    return score if score in SCORE_RANGE else None